@@ -12,23 +12,33 @@ import time
 import uuid
 import datetime
 import json
+import file_storage
+import compress
 
-from azure.storage.blob import AppendBlobService
-from azure.storage.blob import ContentSettings
+def create(imu, user):
+    '''storage backend factory, compression and compressionLevel are taken from the startLog request
+    '''
+    logger = LogIMU380Data(user.get('compression'), user.get('compressionLevel'))
+    logger.user = user
+    if user.get('fileName', '') == '':
+        user['fileName'] = logger.name
+    return logger
 
 class LogIMU380Data:    
-    def __init__(self):
-        '''Initialize and create a blob with CSV extension
+    def __init__(self, compression=None, level=None):
+        '''Initialize and create a local CSV spool file that is streamed to an Azure blob of the same name,
+           optionally compressed with a codec from compress.py
         '''
-        self.name = 'data-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '.csv'
-        self.append_blob_service = AppendBlobService(account_name='navview', account_key='+roYuNmQbtLvq2Tn227ELmb6s1hzavh0qVQwhLORkUpM0DN7gxFc4j+DF/rEla1EsTN2goHEA1J92moOM/lfxg==', protocol='http')
-        self.append_blob_service.create_blob(container_name='data', blob_name=self.name,  content_settings=ContentSettings(content_type='text/plain'))
+        self.name = 'data-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '.csv' + compress.EXTENSIONS.get(compression, '')
+        self.path = 'data/' + self.name
+        self.file = compress.open_writer(self.path, compression, level)
+        self.compressed = bool(compression)
+        self.uploader = file_storage.get_uploader()
         self.first_row = 0
-        self.write_str = ''
 
     def log(self,data,odr_setting): 
-        '''Buffers and then stores stream based on ODR.  Must buffer due to cloud write time.  
-            Uses dictionary keys for column titles
+        '''Spools rows to disk and hands the file to the upload queue every 100 rows, so no cloud 
+            write happens in the sample path.  Uses dictionary keys for column titles
         '''
         odr_rates = { 0: 0, 1 : 100, 2 : 50, 5 : 25, 10 : 20, 20 : 10, 25 : 5, 50 : 2 };
         delta_t = 1.0 / odr_rates[odr_setting]
@@ -54,20 +64,23 @@ class LogIMU380Data:
         str = str[:-1]
         str = '{0:5.2f},'.format(delta_t * (self.first_row - 1)) + str
         str = str + '\r\n'
-        self.write_str = self.write_str + header + str
+        self.file.write(header + str)
 
         if (self.first_row % 100 == 0):
             self.write_to_azure()
 
     def write_to_azure(self):
-        '''Appends buffered CSV string to current Azure blob
+        '''Queues rows spooled since the last call for append to the Azure blob.  Compressed spools
+           are not flushed here, their worker thread writes whole blocks as they fill
         '''
-        self.append_blob_service.append_blob_from_text('data',self.name, self.write_str)
-        self.write_str = ''
+        if not self.compressed:
+            self.file.flush()
+        self.uploader.submit(self.path, self.name, False)
 
 
     def close(self):
-        '''Closes blob
+        '''Closes spool file and queues the final upload pass
         '''
-        self.write_to_azure()
+        self.file.close()
+        self.uploader.submit(self.path, self.name, True)
         self.name = ''
@@ -0,0 +1,271 @@
+"""
+Time alignment of several devices' samples on the host clock, resampled to a common rate
+Created on 2026-10-19
+"""
+
+"""
+ClockFit        - per device fit of host time against device time (elapsed_time_sec), offset and drift
+Aligner         - merges live devices: tap(imu) is a pipeline stage buffering a device's samples,
+                  flush resamples every device onto one host time grid and tells the listeners
+segment_clock   - ClockFit of a finalized log segment from its manifest entry
+align_logs      - the same merge for logs, see log_reader.read_columns
+write_csv       - merged columns written as a CSV log in chunks
+
+Every device counts its own time from 0 at connect and its oscillator drifts from the host's.  A
+sample reaches the host some time after it was taken, never before, so the smallest host - device
+time over a block of samples is the transport offset with the least delay.  ClockFit keeps one such
+minimum per block seconds and fits host = offset + scale * time to the last blocks of them, the
+device clock running 1 / scale - 1 fast.  For a log the segment's manifest has the host times of its first and last
+samples (start, end) next to their device times (firstTime, lastTime), which give the fit directly.
+
+Merged rows have time, host epoch seconds on a grid of 1 / rate, and <serial number>.<field> for
+every field of every device, linearly interpolated.  Fields of a device with no samples around a
+grid time are NaN.
+"""
+
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+CHANNELS = ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate']
+BUFFER = 4096       # samples buffered per device between flushes
+# host epoch seconds = WALL + time.perf_counter(), the clock of imu.frame_time
+WALL = time.time() - time.perf_counter()
+
+class ClockFit:
+    def __init__(self, block=1.0, blocks=60):
+        '''Fits over the last blocks minima of block seconds each
+        '''
+        self.block = block
+        self.points = collections.deque(maxlen=blocks)     # (device time, minimum host - device time)
+        self.reset()
+
+    def reset(self):
+        self.points.clear()
+        self.block_start = None
+        self.minimum = None
+        self.last = None
+        self.coefficients = None    # (offset, scale)
+
+    def add(self, t, host):
+        if self.last is not None and t < self.last:
+            # device time restarted
+            self.reset()
+        self.last = t
+        difference = host - t
+        if self.minimum is None or difference < self.minimum[1]:
+            self.minimum = (t, difference)
+        if self.block_start is None:
+            self.block_start = t
+        if t - self.block_start >= self.block:
+            self.points.append(self.minimum)
+            self.block_start = t
+            self.minimum = None
+            self.fit()
+        elif len(self.points) < 2 and self.minimum[0] == t:
+            self.fit()
+
+    def fit(self):
+        '''Least squares line through the block minima, only the smallest offset until there are two
+        '''
+        points = list(self.points)
+        if len(points) < 2:
+            self.coefficients = (min(p[1] for p in points + ([self.minimum] if self.minimum else [])), 1.0)
+            return
+        n = len(points)
+        tm = sum(p[0] for p in points) / n
+        dm = sum(p[1] for p in points) / n
+        stt = sum((p[0] - tm) ** 2 for p in points)
+        slope = sum((p[0] - tm) * (p[1] - dm) for p in points) / stt if stt > 0 else 0.0
+        self.coefficients = (dm - slope * tm, 1.0 + slope)
+
+    def host(self, t):
+        '''Host epoch seconds of device time t, a number or a numpy array
+        '''
+        offset, scale = self.coefficients
+        return offset + scale * t
+
+    def status(self):
+        if self.coefficients is None:
+            return None
+        return { 'offset' : self.coefficients[0], 'driftPpm' : (1.0 / self.coefficients[1] - 1.0) * 1e6, 'blocks' : len(self.points) }
+
+class Tap:
+    name = 'alignment'
+
+    def __init__(self, imu, fields):
+        '''Pipeline stage buffering the fields of imu's samples with their device times
+        '''
+        import numpy as np
+        self.imu = imu
+        self.fields = fields
+        self.clock = ClockFit()
+        self.lock = threading.Lock()
+        self.buffer = np.zeros((BUFFER, len(fields) + 1))
+        self.count = 0
+        self.overflow = 0
+        self.received = 0.0         # host time of the newest sample
+
+    def __call__(self, data):
+        if self.fields[0] not in data:
+            return
+        host = WALL + self.imu.frame_time if self.imu.frame_time else time.time()
+        t = data['time']
+        with self.lock:
+            if self.count and t < self.buffer[self.count - 1, 0]:
+                self.count = 0
+            elif self.count == BUFFER:
+                # not flushed for a while, keep the newer half
+                self.buffer[:BUFFER // 2] = self.buffer[BUFFER // 2:]
+                self.count = BUFFER // 2
+                self.overflow += BUFFER // 2
+            self.clock.add(t, host)
+            self.buffer[self.count] = [t] + [data[k] for k in self.fields]
+            self.count += 1
+            self.received = host
+
+    def take(self):
+        '''Copy of the buffered samples with their times mapped to host time
+        '''
+        with self.lock:
+            if not self.count:
+                return None
+            samples = self.buffer[:self.count].copy()
+            samples[:, 0] = self.clock.host(samples[:, 0])
+            return samples
+
+    def keep(self, host):
+        '''Drops the samples before the last one at or before host
+        '''
+        with self.lock:
+            if not self.count:
+                return
+            times = self.clock.host(self.buffer[:self.count, 0])
+            first = max(0, int((times <= host).sum()) - 1)
+            if first:
+                self.buffer[:self.count - first] = self.buffer[first:self.count]
+                self.count -= first
+
+class Aligner:
+    def __init__(self, rate=100.0, fields=None, timeout=1.0):
+        '''rate is the merged rows per second, devices without samples for timeout seconds are left out
+        '''
+        self.rate = rate
+        self.fields = fields or CHANNELS
+        self.timeout = timeout
+        self.taps = collections.OrderedDict()      # serial number -> Tap
+        self.next = None                            # grid index of the next row
+        self.listeners = []
+
+    def tap(self, imu):
+        '''The pipeline stage of imu, one per serial number so a reconnected device keeps its stage
+        '''
+        key = str(imu.device_id).split(' ')[0]
+        tap = self.taps.get(key)
+        if tap is None or tap.imu is not imu:
+            tap = Tap(imu, self.fields)
+            self.taps[key] = tap
+        return tap
+
+    def flush(self, now=None):
+        '''Resamples every current device onto the grid rows not emitted yet, up to the newest time all of
+           them have reached.  Called periodically, e.g. from a PeriodicCallback
+            :returns:
+                OrderedDict of time and <serial number>.<field> arrays, None when there is no new row
+        '''
+        import numpy as np
+        now = time.time() if now is None else now
+        current = [(key, tap) for key, tap in list(self.taps.items()) if tap.count and now - tap.received < self.timeout]
+        samples = [(key, tap, tap.take()) for key, tap in current]
+        samples = [s for s in samples if s[2] is not None]
+        if not samples:
+            return None
+        end = min(s[-1, 0] for key, tap, s in samples)
+        start = int(math.ceil(max(s[0, 0] for key, tap, s in samples) * self.rate))
+        if self.next is None or start - self.next > self.timeout * self.rate:
+            # first rows, or every device stopped for a while
+            self.next = start
+        last = int(math.floor(end * self.rate))
+        if last < self.next:
+            return None
+        grid = np.arange(self.next, last + 1) / self.rate
+        self.next = last + 1
+        columns = collections.OrderedDict(time=grid)
+        for key, tap, s in samples:
+            for i, field in enumerate(tap.fields):
+                columns[key + '.' + field] = np.interp(grid, s[:, 0], s[:, i + 1], left=np.nan, right=np.nan)
+            tap.keep(grid[-1])
+        for listener in self.listeners:
+            try:
+                listener(columns)
+            except Exception as err:
+                print('alignment listener failed: ' + str(err))
+        return columns
+
+    def status(self):
+        return { key : { 'clock' : tap.clock.status(), 'buffered' : tap.count, 'overflow' : tap.overflow } for key, tap in self.taps.items() }
+
+def segment_clock(segment):
+    '''ClockFit of a log segment from its manifest entry (start, end, firstTime, lastTime)
+    '''
+    clock = ClockFit()
+    if segment['lastTime'] > segment['firstTime']:
+        scale = (segment['end'] - segment['start']) / (segment['lastTime'] - segment['firstTime'])
+    else:
+        scale = 1.0
+    clock.coefficients = (segment['start'] - scale * segment['firstTime'], scale)
+    return clock
+
+def manifest_segment(path):
+    '''Manifest entry of a log segment, None if its session has no manifest
+    '''
+    directory, name = os.path.split(path)
+    try:
+        with open(os.path.join(directory, name.rsplit('_', 1)[0] + '.manifest.json')) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    return next((s for s in manifest.get('segments', []) if s['name'] == name), None)
+
+def align_logs(paths, rate=100.0, fields=None):
+    '''Merges logs of different devices over the host time they have in common
+        :returns:
+            OrderedDict of time and <serial number>.<field> arrays, as Aligner.flush
+    '''
+    import numpy as np
+    import log_reader
+    fields = fields or CHANNELS
+    logs = []
+    for path in paths:
+        segment = manifest_segment(path)
+        if segment is None or segment.get('firstTime') is None:
+            raise ValueError(os.path.basename(path) + ' has no manifest entry, its host times are unknown')
+        columns = log_reader.read_columns(path, ['time'] + fields)
+        key = str(segment.get('deviceId', os.path.basename(path))).split(' ')[0]
+        logs.append((key, segment_clock(segment).host(columns['time']), columns))
+    start = max(host[0] for key, host, columns in logs)
+    end = min(host[-1] for key, host, columns in logs)
+    if end < start:
+        raise ValueError('the logs do not overlap in time')
+    grid = np.arange(int(math.ceil(start * rate)), int(math.floor(end * rate)) + 1) / rate
+    merged = collections.OrderedDict(time=grid)
+    for key, host, columns in logs:
+        for field in fields:
+            merged[key + '.' + field] = np.interp(grid, host, columns[field], left=np.nan, right=np.nan)
+    return merged
+
+def write_csv(path, columns, chunk=65536):
+    '''Writes merged columns as CSV, chunk rows formatted at a time
+    '''
+    import numpy as np
+    names = list(columns)
+    values = np.stack([columns[k] for k in names], axis=1)
+    formats = ','.join(['%.6f'] + ['%.5f'] * (len(names) - 1))
+    with open(path + '.part', 'w') as f:
+        f.write(','.join(names) + '\n')
+        for start in range(0, len(values), chunk):
+            np.savetxt(f, values[start:start + chunk], fmt=formats)
+    os.replace(path + '.part', path)
@@ -0,0 +1,84 @@
+"""
+Benchmark alignment.Aligner on simulated devices sampling one shared signal at 200 Hz, each with its
+own clock offset, a drift of up to +-100 ppm and random transport delays.  Reports the tap CPU per
+sample, the flush CPU per merged row, the fitted drift against the true one and how far the merged
+channels of different devices disagree
+
+python benchmarks/alignment.py [seconds] [devices]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import alignment
+
+RATE = 200.0
+FREQUENCY = 2.0     # Hz of the shared signal, amplitude 1
+
+class FakeIMU:
+    def __init__(self, serial_number):
+        self.device_id = str(serial_number) + ' 5020-0001-01'
+        self.frame_time = 0.0
+
+def make_devices(seconds, count):
+    '''Per device (imu, true drift ppm, arrival host times, samples) with samples taken on the device
+       clock, the signal evaluated at the true host time of each sample
+    '''
+    rng = np.random.default_rng(0)
+    epoch = time.time()
+    devices = []
+    for i in range(count):
+        ppm = rng.uniform(-100, 100)
+        t = np.arange(int(seconds * RATE)) / RATE
+        host = epoch + rng.uniform(0, 0.5) + t / (1.0 + ppm * 1e-6)
+        # a serial stream keeps its order, a late sample holds up the ones behind it
+        arrival = np.maximum.accumulate(host + 0.0005 + rng.exponential(0.002, len(t)))
+        value = np.sin(2 * np.pi * FREQUENCY * host)
+        samples = [{ 'time' : a, 'xAccel' : b } for a, b in zip(t.tolist(), value.tolist())]
+        devices.append((FakeIMU(1808400000 + i), ppm, arrival, samples))
+    return devices
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 300
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    devices = make_devices(seconds, count)
+    aligner = alignment.Aligner(RATE, ['xAccel'])
+    taps = [aligner.tap(imu) for imu, ppm, arrival, samples in devices]
+    # every sample in arrival order, a flush each 0.1 s of host time
+    order = sorted((a, i, k) for i, (imu, ppm, arrival, samples) in enumerate(devices) for k, a in enumerate(arrival.tolist()))
+    merged = []
+    tap_s = flush_s = 0.0
+    next_flush = order[0][0] + 0.1
+    for a, i, k in order:
+        imu = devices[i][0]
+        imu.frame_time = a - alignment.WALL
+        start = time.perf_counter()
+        taps[i](devices[i][3][k])
+        tap_s += time.perf_counter() - start
+        if a >= next_flush:
+            start = time.perf_counter()
+            columns = aligner.flush(a)
+            flush_s += time.perf_counter() - start
+            if columns is not None:
+                merged.append(columns)
+            next_flush = a + 0.1
+    rows = sum(len(c['time']) for c in merged)
+    print('{0:d} devices, {1:d} samples each ({2:.0f} s at {3:.0f} Hz)'.format(count, len(order) // count, seconds, RATE))
+    print('{0:>24s} {1:9.2f} us/sample'.format('tap', tap_s / len(order) * 1e6))
+    print('{0:>24s} {1:9.2f} us/row {2:9d} rows'.format('flush', flush_s / rows * 1e6, rows))
+    for (imu, ppm, arrival, samples), tap in zip(devices, taps):
+        print('{0:>24s} drift {1:8.2f} ppm, fitted {2:8.2f} ppm'.format(imu.device_id.split(' ')[0], ppm, tap.clock.status()['driftPpm']))
+    # skip the first minute, the fits start from offsets only
+    keys = [k for k in merged[0] if k != 'time']
+    t = np.concatenate([c['time'] for c in merged])
+    values = np.stack([np.concatenate([c[k] for c in merged]) for k in keys], axis=1)
+    settled = (t > t[0] + 60) & ~np.isnan(values).any(axis=1)
+    spread = values[settled].max(axis=1) - values[settled].min(axis=1)
+    truth = np.sin(2 * np.pi * FREQUENCY * t[settled])
+    slope = 2 * np.pi * FREQUENCY
+    print('{0:>24s} {1:9.3f} ms rms, {2:9.3f} ms max (as time, devices against each other)'.format('alignment spread', np.sqrt(np.mean(spread ** 2)) / slope * 1e3, spread.max() / slope * 1e3))
+    print('{0:>24s} {1:9.3f} ms rms (as time, against the true host time)'.format('host time error', np.sqrt(np.mean((values[settled] - truth[:, None]) ** 2)) / slope * 1e3))
@@ -0,0 +1,141 @@
+"""
+Benchmark server CPU for 1, 10 and 100 websocket clients, per client ticks versus one broadcaster,
+and a broadcaster whose clients all subscribe to zRate at 10 Hz
+Clients run in a separate process so only server work is measured
+
+python benchmarks/broadcast.py [seconds]
+"""
+
+import asyncio
+import collections
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import tornado.web
+import tornado.websocket
+from tornado.ioloop import IOLoop, PeriodicCallback
+import broadcast
+import encoding
+
+PORT = 8765
+
+class FakeIMU:
+    '''Stands in for a streaming GrabIMU380Data producing S1 samples at rate Hz
+    '''
+    connected = 1
+    stream_mode = 1
+    packet_type = 'S1'
+
+    def __init__(self, rate=100):
+        self.rate = rate
+        self.start = time.time()
+        self.samples = collections.deque(maxlen=1000)
+        self.seq = 0
+
+    def catch_up(self):
+        keys = ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate', 'xRateTemp', 'yRateTemp', 'zRateTemp', 'boardTemp']
+        while self.seq < int((time.time() - self.start) * self.rate):
+            self.seq += 1
+            data = collections.OrderedDict([('time', self.seq / float(self.rate))] + [(k, random.gauss(0, 1)) for k in keys])
+            data['counter'] = self.seq % 65536
+            data['BITstatus'] = 0
+            self.samples.append((self.seq, data))
+
+    @property
+    def sample_seq(self):
+        self.catch_up()
+        return self.seq
+
+    def get_latest(self):
+        self.catch_up()
+        return self.samples[-1][1] if self.samples else {}
+
+    def get_since(self, cursor):
+        self.catch_up()
+        return [s for s in self.samples if s[0] > cursor], 0
+
+class PerClientHandler(tornado.websocket.WebSocketHandler):
+    '''Previous server behavior, every connection runs its own tick and encoding
+    '''
+    def open(self):
+        self.callback = PeriodicCallback(self.send_data, 50)
+        self.callback.start()
+
+    def send_data(self):
+        d = imu.get_latest()
+        self.write_message(json.dumps({ 'messageType' : 'event',  'data' : { 'newOutput' : d }}))
+
+    def on_close(self):
+        self.callback.stop()
+
+class BroadcastHandler(tornado.websocket.WebSocketHandler):
+    def open(self):
+        self.streaming = True
+        self.encoding = encoding.get_encoding('json')
+        self.schemas = {}
+        self.mode = 'latest'
+        self.cursor = imu.sample_seq
+        self.subscription = None
+        broadcaster.add(self)
+
+    def send(self, message, binary=False, keep=False):
+        try:
+            self.write_message(message, binary)
+        except tornado.websocket.WebSocketClosedError:
+            broadcaster.remove(self)
+
+    def on_close(self):
+        broadcaster.remove(self)
+
+class SubscribedHandler(BroadcastHandler):
+    def open(self):
+        BroadcastHandler.open(self)
+        broadcaster.subscribe(self, ['time', 'zRate'], 10, 'average')
+
+def run_clients(n, seconds, counts, sizes):
+    async def client(i):
+        c = await tornado.websocket.websocket_connect('ws://localhost:{0:d}/'.format(PORT))
+        end = time.time() + seconds
+        while time.time() < end:
+            message = await c.read_message()
+            if message is None:
+                break
+            counts[i] += 1
+            sizes[i] += len(message)
+        c.close()
+    async def main():
+        await asyncio.gather(*[client(i) for i in range(n)])
+    asyncio.run(main())
+
+async def measure(n, seconds):
+    counts = multiprocessing.Array('i', n)
+    sizes = multiprocessing.Array('d', n)
+    p = multiprocessing.Process(target=run_clients, args=(n, seconds, counts, sizes))
+    p.start()
+    await asyncio.sleep(1.0)        # let clients connect
+    start_cpu = time.process_time()
+    start = time.time()
+    await asyncio.sleep(seconds - 1.5)
+    cpu = time.process_time() - start_cpu
+    wall = time.time() - start
+    while p.is_alive():
+        await asyncio.sleep(0.1)
+    return 100.0 * cpu / wall, sum(counts) / float(seconds) / n, sum(sizes) / float(seconds) / n
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 6.0
+    imu = FakeIMU()
+    broadcaster = broadcast.Broadcaster(imu, 50)
+    print('{0:>10s} {1:>8s} {2:>10s} {3:>12s} {4:>14s}'.format('mode', 'clients', '% cpu', 'msg/s/client', 'bytes/s/client'))
+    for mode, handler in [('perclient', PerClientHandler), ('broadcast', BroadcastHandler), ('subscribed', SubscribedHandler)]:
+        server = tornado.web.Application([(r'/', handler)]).listen(PORT)
+        for n in [1, 10, 100]:
+            cpu, rate, size = IOLoop.current().run_sync(lambda: measure(n, seconds))
+            print('{0:>10s} {1:8d} {2:10.1f} {3:12.1f} {4:14.0f}'.format(mode, n, cpu, rate, size))
+        server.stop()
@@ -0,0 +1,44 @@
+"""
+Benchmark calibration and temperature compensation, calibration.Calibration as a pipeline stage on
+one sample at a time versus calibration.apply over whole columns
+
+python benchmarks/calibration.py [samples]
+"""
+
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import calibration
+
+PARAMETERS = { 'rate' : { 'bias' : [0.1, -0.05, 0.02], 'scale' : [1.01, 0.99, 1.0], 'misalignment' : [[1, 0.01, -0.02], [0.005, 1, 0.003], [0.01, -0.004, 1]],
+                          'temperature' : { 'reference' : 25.0, 'bias' : [[0.004, 0.003, -0.002], [1e-4, 0, 2e-5]], 'scale' : [[1e-4, -2e-4, 0]] }},
+               'accel' : { 'bias' : [0.02, 0.01, -0.03], 'scale' : [1.002, 0.998, 1.001], 'temperature' : { 'bias' : [[0.001, 0.001, 0.001]] }}}
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = np.random.default_rng(0)
+    columns = collections.OrderedDict(time=np.arange(n) * 0.01)
+    for f in ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate']:
+        columns[f] = rng.normal(0, 1, n)
+    for f in ['xRateTemp', 'yRateTemp', 'zRateTemp', 'boardTemp']:
+        columns[f] = 30.0 + rng.normal(0, 5, n)
+    rows = [collections.OrderedDict(zip(columns, values)) for values in zip(*[c[:100000].tolist() for c in columns.values()])]
+
+    stage = calibration.Calibration(PARAMETERS)
+    start = time.perf_counter()
+    for data in rows:
+        stage(data)
+    stage_us = (time.perf_counter() - start) / len(rows) * 1e6
+    print('{0:>24s} {1:9.2f} us/sample'.format('Calibration stage', stage_us))
+
+    start = time.perf_counter()
+    corrected = calibration.apply(columns, PARAMETERS)
+    batch_us = (time.perf_counter() - start) / n * 1e6
+    print('{0:>24s} {1:9.2f} us/sample  {2:.0f}x  ({3:d} samples)'.format('apply', batch_us, stage_us / batch_us, n))
+    difference = max(np.abs(corrected[f][:len(rows)] - np.array([r[f] for r in rows])).max() for f in ['xRate', 'yRate', 'zRate', 'xAccel', 'yAccel', 'zAccel'])
+    print('{0:>24s} {1:12.2e}'.format('max difference', difference))
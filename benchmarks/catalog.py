@@ -0,0 +1,58 @@
+"""
+Benchmark listFiles over a directory of segmented sessions, the old os.listdir + isfile scan
+versus catalog.LogCatalog rescans and page requests
+
+python benchmarks/catalog.py [files]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import catalog
+
+SEGMENTS = 100      # segments per session manifest
+
+def make_directory(n):
+    '''Writes n small segments grouped in sessions with manifests like file_storage.LogIMU380Data
+    '''
+    directory = tempfile.mkdtemp()
+    for s in range(0, n, SEGMENTS):
+        session = 'data-2026_01_01_00_{0:05d}'.format(s // SEGMENTS)
+        manifest = { 'session' : session, 'deviceId' : '1234 5020-0001', 'packetType' : ['S1', 'A1'][s // SEGMENTS % 2],
+                     'sampleRate' : '100Hz', 'compression' : None, 'closed' : True, 'segments' : [] }
+        for i in range(min(SEGMENTS, n - s)):
+            name = '{0}_{1:03d}.csv'.format(session, i)
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write('time,xRate\n0.0,0.0\n')
+            manifest['segments'].append({ 'name' : name, 'deviceId' : manifest['deviceId'], 'start' : s + i, 'end' : s + i + 60,
+                                          'firstTime' : 0.0, 'lastTime' : 60.0, 'samples' : 6000, 'bytes' : 20, 'fileBytes' : 20 })
+        with open(os.path.join(directory, session + '.manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+    return directory
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    directory = make_directory(n)
+    ms, names = timed(lambda: [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)) and f.endswith('.csv')], 5)
+    print('{0:>32s} {1:10.1f} ms  ({2:d} names only)'.format('listdir + isfile', ms, len(names)))
+    c = catalog.LogCatalog(directory)
+    ms, r = timed(c.rescan)
+    print('{0:>32s} {1:10.1f} ms'.format('first rescan', ms))
+    ms, r = timed(c.rescan, 5)
+    print('{0:>32s} {1:10.1f} ms'.format('rescan, nothing changed', ms))
+    ms, r = timed(lambda: catalog.LogCatalog(directory), 5)
+    print('{0:>32s} {1:10.1f} ms'.format('load saved catalog', ms))
+    ms, r = timed(lambda: c.list(0, 100, 'start'), 20)
+    print('{0:>32s} {1:10.1f} ms'.format('page of 100 by start (cached)', ms))
+    ms, r = timed(lambda: c.list(5000, 100, 'samples', filters={ 'packetType' : 'A1' }, match='_05'), 20)
+    print('{0:>32s} {1:10.1f} ms  ({2:d} matches)'.format('filtered page', ms, r['total']))
@@ -0,0 +1,61 @@
+"""
+Benchmark CPU cost versus bytes saved of the log sink compression codecs
+Writes synthetic S1 rows formatted like file_storage.LogIMU380Data at 100 and 200 Hz
+
+python benchmarks/compression.py [minutes]
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import compress
+
+def make_rows(rate, seconds):
+    '''Returns CSV rows of a slowly varying S1 stream with sensor noise
+    '''
+    keys = ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate', 'xRateTemp', 'yRateTemp', 'zRateTemp', 'boardTemp']
+    rows = []
+    for n in range(int(rate * seconds)):
+        t = n / float(rate)
+        values = [0.1 * math.sin(0.3 * t) + random.gauss(0, 0.02), random.gauss(0, 0.02), -9.80665 + random.gauss(0, 0.02),
+                  random.gauss(0, 0.1), random.gauss(0, 0.1), 5 * math.sin(0.1 * t) + random.gauss(0, 0.1),
+                  30 + 0.001 * t, 30.2 + 0.001 * t, 29.9 + 0.001 * t, 31 + 0.001 * t]
+        row = '{0:3.5f},'.format(t) + ''.join('{0:3.5f},'.format(v) for v in values) + '{0:d},{1:d}\n'.format(n % 65536, 0)
+        rows.append(row)
+    return rows
+
+def run(rows, codec, level):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.csv')
+    start = time.process_time()
+    f = compress.open_writer(path, codec, level)
+    for row in rows:
+        f.write(row)
+    f.close()
+    cpu = time.process_time() - start
+    size = os.path.getsize(path)
+    os.remove(path)
+    return cpu, size
+
+if __name__ == "__main__":
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    configs = [(None, None)]
+    for codec in compress.available_codecs():
+        for level in { 'gzip' : [1, 6, 9], 'zstd' : [1, 3, 9], 'lz4' : [0, 9] }[codec]:
+            configs.append((codec, level))
+
+    for rate in [100, 200]:
+        rows = make_rows(rate, minutes * 60)
+        print('{0:d} Hz, {1:.0f} minutes, {2:d} rows'.format(rate, minutes, len(rows)))
+        print('{0:>8s} {1:>5s} {2:>12s} {3:>8s} {4:>14s} {5:>12s}'.format('codec', 'level', 'cpu s/hour', '% core', 'MB/hour', 'saved MB/h'))
+        base_cpu, base_size = run(rows, None, None)
+        hours = minutes / 60.0
+        for codec, level in configs:
+            cpu, size = run(rows, codec, level)
+            print('{0:>8s} {1:>5s} {2:12.2f} {3:8.3f} {4:14.1f} {5:12.1f}'.format(codec or 'none', str(level) if level is not None else '-',
+                  cpu / hours, 100.0 * cpu / (minutes * 60), size / hours / 1e6, (base_size - size) / hours / 1e6))
+        print('')
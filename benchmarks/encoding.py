@@ -0,0 +1,62 @@
+"""
+Benchmark payload size and encode/decode time per sample of the websocket sample encodings,
+the json row is the previous send_data path
+
+python benchmarks/encoding.py [samples]
+"""
+
+import collections
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import encoding
+
+def make_samples(n):
+    '''S1 samples shaped like GrabIMU380Data.parse_packet output
+    '''
+    keys = ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate', 'xRateTemp', 'yRateTemp', 'zRateTemp', 'boardTemp']
+    samples = []
+    for i in range(n):
+        data = collections.OrderedDict([('time', i * 0.01)] + [(k, random.gauss(0, 1)) for k in keys])
+        data['counter'] = i % 65536
+        data['BITstatus'] = 0
+        samples.append(data)
+    return samples
+
+def decoder(name):
+    if name == 'packed':
+        import struct
+        schemas = {}
+        def decode(message):
+            if message[0] not in schemas:
+                schemas[message[0]] = struct.Struct(schema['format'])
+            return schemas[message[0]].unpack(message)
+        return decode
+    if name == 'msgpack':
+        import msgpack
+        return msgpack.unpackb
+    return json.loads
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    samples = make_samples(n)
+    print('{0:>8s} {1:>10s} {2:>14s} {3:>14s}'.format('encoding', 'bytes', 'encode us', 'decode us'))
+    for name in encoding.available_encodings():
+        enc = encoding.get_encoding(name)
+        schema = enc.schema(samples[0])
+        if schema is not None:
+            schema = json.loads(schema[1].decode())['data']
+        start = time.perf_counter()
+        messages = [enc.encode(d) for d in samples]
+        encode_time = (time.perf_counter() - start) / n
+        decode = decoder(name)
+        start = time.perf_counter()
+        for m in messages:
+            decode(m)
+        decode_time = (time.perf_counter() - start) / n
+        size = sum(len(m) for m in messages) / float(n)
+        print('{0:>8s} {1:10.1f} {2:14.2f} {3:14.2f}'.format(name, size, encode_time * 1e6, decode_time * 1e6))
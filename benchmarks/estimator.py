@@ -0,0 +1,87 @@
+"""
+Benchmark the attitude estimator, estimator.Estimator run as a pipeline stage on one sample at a time
+versus estimator.estimate over whole columns (the same filter loop, references vectorized), on synthetic S0 data or a log, then the attitude error
+of a level unit at rest with a 0.5 deg/s bias on each gyro in turn
+
+python benchmarks/estimator.py [seconds | log.csv | log.log.bin]
+"""
+
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import estimator
+import log_reader
+
+def make_columns(n, rate=100):
+    '''S0 like columns, a unit swinging in roll and pitch while turning about z
+    '''
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / float(rate)
+    roll, pitch, yaw = 0.3 * np.sin(0.2 * t), 0.2 * np.sin(0.13 * t), 0.5 * np.sin(0.01 * t)
+    columns = collections.OrderedDict(time=t)
+    columns['xAccel'] = estimator.G * np.sin(pitch) + rng.normal(0, 0.02, n)
+    columns['yAccel'] = -estimator.G * np.sin(roll) * np.cos(pitch) + rng.normal(0, 0.02, n)
+    columns['zAccel'] = -estimator.G * np.cos(roll) * np.cos(pitch) + rng.normal(0, 0.02, n)
+    # Euler angle rates to body rates
+    droll, dpitch, dyaw = [np.gradient(angle, t) for angle in [roll, pitch, yaw]]
+    sr, cr, sp, cp = np.sin(roll), np.cos(roll), np.sin(pitch), np.cos(pitch)
+    rates = [droll - dyaw * sp, dpitch * cr + dyaw * sr * cp, -dpitch * sr + dyaw * cr * cp]
+    for axis, body_rate in zip('xyz', rates):
+        columns[axis + 'Rate'] = np.degrees(body_rate) + rng.normal(0, 0.05, n)
+    # field of 0.25 G north, 0.4 G down rotated into the body by yaw, pitch, roll
+    north, east, down = 0.25 * np.cos(yaw), -0.25 * np.sin(yaw), 0.4
+    north, down = cp * north - sp * down, sp * north + cp * down
+    columns['xMag'] = north + rng.normal(0, 0.001, n)
+    columns['yMag'] = cr * east + sr * down + rng.normal(0, 0.001, n)
+    columns['zMag'] = -sr * east + cr * down + rng.normal(0, 0.001, n)
+    return columns
+
+def make_biased(n, axis, bias, rate=100):
+    '''S1 like columns of a level unit at rest, the axis gyro reading bias deg/s
+    '''
+    rng = np.random.default_rng(1)
+    columns = collections.OrderedDict(time=np.arange(n) / float(rate))
+    for k, value in [('xAccel', 0.0), ('yAccel', 0.0), ('zAccel', -estimator.G)]:
+        columns[k] = value + rng.normal(0, 0.02, n)
+    for a in 'xyz':
+        columns[a + 'Rate'] = (bias if a == axis else 0.0) + rng.normal(0, 0.05, n)
+    return columns
+
+if __name__ == "__main__":
+    arg = sys.argv[1] if len(sys.argv) > 1 else '600'
+    if os.path.exists(arg):
+        columns = log_reader.read_columns(arg)
+        print('{0:s}: {1:d} samples'.format(arg, len(columns['time'])))
+    else:
+        columns = make_columns(int(float(arg) * 100))
+        print('{0:d} synthetic S0 samples ({1:s} s at 100 Hz)'.format(len(columns['time']), arg))
+    names = list(columns)
+    rows = [collections.OrderedDict(zip(names, values)) for values in zip(*[columns[k].tolist() for k in names])]
+
+    stage = estimator.Estimator()
+    start = time.perf_counter()
+    for data in rows:
+        stage(data)
+    stage_s = time.perf_counter() - start
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample'.format('Estimator stage', stage_s, stage_s / len(rows) * 1e6))
+
+    start = time.perf_counter()
+    angles = estimator.estimate(columns)
+    batch_s = time.perf_counter() - start
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample  {3:.1f}x'.format('estimate', batch_s, batch_s / len(rows) * 1e6, stage_s / batch_s))
+    difference = max(np.abs((angles[k] - np.array([r[k] for r in rows]) + 180) % 360 - 180).max() for k in estimator.FIELDS)
+    print('{0:>24s} {1:12.2e} deg'.format('max difference', difference))
+
+    # a stationary level unit, roll and pitch should stay near 0, off by about bias * tau
+    n = len(columns['time'])
+    for axis in 'xyz':
+        angles = estimator.estimate(make_biased(n, axis, 0.5))
+        settled = slice(1000, None)
+        error = max(np.abs(angles[k][settled]).max() for k in ['rollAngle', 'pitchAngle'])
+        label = '{0:s}Rate bias 0.5 deg/s'.format(axis)
+        print('{0:>24s} {1:9.3f} deg max roll/pitch error after 10 s, yaw {2:.1f} deg at the end'.format(label, error, angles['yawAngle'][-1]))
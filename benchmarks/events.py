@@ -0,0 +1,61 @@
+"""
+Benchmark the events.EventDetector stage: CPU per sample with no events and with a shock every few
+seconds, and the trigger latency from frame arrival, on synthetic 200 Hz S1 samples
+
+python benchmarks/events.py [seconds] [rate]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import events
+
+class FakeIMU:
+    device_id = '1808400123 5020-0001-01'
+    packet_type = 'S1'
+    frame_time = 0.0
+
+def make_samples(n, rate, shock_every):
+    '''Level device with accel noise, a 5 g shock every shock_every seconds (none when 0)
+    '''
+    rng = np.random.default_rng(0)
+    z = -9.80665 + rng.normal(0, 0.02, n)
+    if shock_every:
+        z[int(shock_every * rate)::int(shock_every * rate)] = -49.0
+    fields = ['time', 'xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate', 'counter', 'BITstatus']
+    columns = [np.arange(n) / float(rate), rng.normal(0, 0.02, n), rng.normal(0, 0.02, n), z,
+               rng.normal(0, 0.1, n), rng.normal(0, 0.1, n), rng.normal(0, 0.1, n)]
+    rows = zip(*[c.tolist() for c in columns], range(n), [0] * n)
+    return [dict(zip(fields, row)) for row in rows]
+
+def run(samples, directory):
+    imu = FakeIMU()
+    detector = events.EventDetector(imu, events.predicates({ 'predicates' : [
+        { 'name' : 'shock', 'fields' : ['xAccel', 'yAccel', 'zAccel'], 'above' : 3 * 9.80665 },
+        { 'name' : 'spin', 'fields' : ['zRate'], 'above' : 200, 'below' : -200 } ] }), 2.0, 1.0, directory)
+    saved = []
+    detector.listeners.append(lambda event: saved.append(event) if event['state'] == 'saved' else None)
+    start = time.perf_counter()
+    for data in samples:
+        imu.frame_time = time.perf_counter()
+        detector(data)
+    elapsed = time.perf_counter() - start
+    while len(saved) < detector.count - (1 if detector.event else 0):
+        time.sleep(0.01)
+    return elapsed, detector.status()
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    n = int(seconds * rate)
+    print('{0:d} samples ({1:.0f} s at {2:d} Hz), 2 predicates, 2 s pre and 1 s post'.format(n, seconds, rate))
+    with tempfile.TemporaryDirectory() as directory:
+        for label, shock_every in [('no events', 0), ('shock every 10 s', 10)]:
+            elapsed, status = run(make_samples(n, rate, shock_every), directory)
+            latency = '' if not status['events'] else '  trigger latency mean {0:.1f} us, max {1:.1f} us'.format(status['meanLatencyUs'], status['maxLatencyUs'])
+            print('{0:>24s} {1:9.2f} us/sample {2:6d} events{3}'.format(label, elapsed / n * 1e6, status['events'], latency))
@@ -0,0 +1,57 @@
+"""
+Benchmark module import time of the driver, the server and each storage backend with python -X importtime,
+every target is imported in a fresh interpreter
+
+python benchmarks/importtime.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+TARGETS = [('driver', 'import imu380'),
+           ('server', 'import server'),
+           ('csv backend', 'import storage; storage.get_factory("csv")'),
+           ('binary backend', 'import storage; storage.get_factory("binary")'),
+           ('cloud backend', 'import storage; storage.get_factory("cloud")'),
+           ('cloud upload', 'import requests, azure.storage.blob'),
+           ('cffi', 'import cffi')]
+
+def importtime(code):
+    '''Runs code with -X importtime, interpreter startup imports (site, encodings) are left out
+        :returns:
+            total microseconds, dict of top level package -> microseconds spent in its own modules, error or None
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    packages = {}
+    total = 0
+    startup = True
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        if startup:
+            # the interpreter's own imports end with site
+            startup = name.strip() != 'site'
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        total += int(self_us)
+    error = result.stderr.decode().strip().splitlines()[-1] if result.returncode else None
+    return total, packages, error
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, code in TARGETS:
+        totals = []
+        for i in range(runs):
+            total, packages, error = importtime(code)
+            totals.append(total)
+        if error:
+            print('{0:>16s}   not measured, {1}'.format(label, error))
+            continue
+        heaviest = sorted(packages.items(), key=lambda m: -m[1])[:6]
+        print('{0:>16s} {1:9.1f} ms   {2}'.format(label, sorted(totals)[len(totals) // 2] / 1000.0,
+                                                  ', '.join('{0} {1:.1f}'.format(name, us / 1000.0) for name, us in heaviest)))
@@ -0,0 +1,248 @@
+"""
+Websocket load test of server.py against a simulated (or replayed) device, entirely on localhost
+
+Starts server.py --simulate in a scratch directory holding a copy of imu.json and a synthetic log,
+then opens N clients, spread round robin over the simulated devices, for a fixed time:
+  viewers       - stream only
+  commanders    - serverStatus, then getFields or setFields (ODR unchanged) followed by startStream,
+                  every few seconds.  These pause streaming for every client, like ANS does
+  loaders       - loadFile of the synthetic log, alternating full CSV transfers and 500 point envelopes
+
+Reported: stream latency percentiles, per request type round trip percentiles, messages and bytes
+per second, and server CPU and RSS sampled each second (needs psutil).  Sample times are device time,
+which restarts whenever the ODR is restored, so stream latency is measured against the fastest sample
+of each restart and shows queueing delay above the best case rather than absolute latency.
+
+python benchmarks/loadtest.py [--clients 50] [--commanders 2] [--loaders 2] [--devices 1] [--seconds 30] [--replay capture.bin]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import urllib.parse
+import tornado.websocket
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def percentiles(values, points=(50, 90, 99, 99.9)):
+    if not values:
+        return [float('nan')] * len(points)
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(len(values) * p / 100.0))] for p in points]
+
+def make_scratch(rows):
+    '''Scratch server directory with imu.json and a data/loadtest.csv of rows S1 samples
+    '''
+    directory = tempfile.mkdtemp()
+    os.makedirs(os.path.join(directory, 'data'))
+    shutil.copy(os.path.join(ROOT, 'imu.json'), directory)
+    with open(os.path.join(directory, 'data', 'loadtest.csv'), 'w') as f:
+        f.write('time,xAccel,yAccel,zAccel,xRate,yRate,zRate,counter,BITstatus\n')
+        for n in range(rows):
+            f.write('{0:3.5f},{1:3.5f},{2:3.5f},{3:3.5f},{4:3.5f},{5:3.5f},{6:3.5f},{7:d},0\n'.format(
+                n * 0.01, random.gauss(0, 0.02), random.gauss(0, 0.02), -9.8 + random.gauss(0, 0.02),
+                random.gauss(0, 0.1), random.gauss(0, 0.1), random.gauss(0, 0.1), n % 65536))
+    return directory
+
+class Stats:
+    def __init__(self):
+        self.offsets = []           # ((client, restart epoch), receive time - sample time) of stream samples
+        self.epochs = {}            # client -> (restart epoch, last sample time)
+        self.requests = {}          # request type -> round trip seconds
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def sample(self, client, received, t):
+        epoch, last_time = self.epochs.get(client, (0, t))
+        if t < last_time:
+            epoch += 1
+        self.epochs[client] = (epoch, t)
+        self.offsets.append(((client, epoch), received - t))
+
+    def request(self, kind, seconds):
+        self.requests.setdefault(kind, []).append(seconds)
+
+    def latencies(self):
+        best = {}
+        for epoch, offset in self.offsets:
+            best[epoch] = min(offset, best.get(epoch, offset))
+        return [offset - best[epoch] for epoch, offset in self.offsets]
+
+class Client:
+    def __init__(self, url, stats):
+        self.url = url
+        self.stats = stats
+        self.connection = None
+
+    async def connect(self):
+        self.connection = await tornado.websocket.websocket_connect(self.url, max_message_size=256 * 1024 * 1024)
+
+    async def read(self):
+        '''Next non stream message, stream samples on the way are timed.  None once the server closes
+        '''
+        while True:
+            message = await self.connection.read_message()
+            received = time.time()
+            if message is None:
+                return None
+            self.stats.messages += 1
+            self.stats.bytes += len(message)
+            message = json.loads(message)
+            output = message.get('data', {}).get('newOutput') if message.get('messageType') == 'event' else None
+            if output is None:
+                return message
+            if 'time' in output:
+                self.stats.sample(self, received, output['time'])
+
+    async def request(self, kind, message, done):
+        '''Sends message and reads until done(response) is true, recording the round trip
+        '''
+        start = time.time()
+        self.connection.write_message(json.dumps(message))
+        while True:
+            response = await self.read()
+            if response is None:
+                self.stats.errors += 1
+                return None
+            if 'error' in response.get('data', {}):
+                self.stats.errors += 1
+            if done(response):
+                self.stats.request(kind, time.time() - start)
+                return response
+
+    async def view(self, end):
+        while time.time() < end:
+            try:
+                await asyncio.wait_for(self.read(), end - time.time())
+            except asyncio.TimeoutError:
+                break
+
+    async def command(self, end, interval):
+        action = lambda r, k: r.get('messageType') == 'requestAction' and k in r.get('data', {})
+        while time.time() < end:
+            await self.request('serverStatus', { 'messageType' : 'serverStatus', 'data' : {} }, lambda r: r.get('messageType') == 'serverStatus')
+            if random.random() < 0.7:
+                await self.request('getFields', { 'messageType' : 'requestAction', 'data' : { 'getFields' : { '1' : '', '3' : '' }}},
+                                   lambda r: action(r, 'getFields'))
+            else:
+                await self.request('setFields', { 'messageType' : 'requestAction', 'data' : { 'setFields' : { '1' : odr }}},
+                                   lambda r: action(r, 'setFields'))
+            self.connection.write_message(json.dumps({ 'messageType' : 'requestAction', 'data' : { 'startStream' : {} }}))
+            await self.view(min(end, time.time() + interval * random.uniform(0.5, 1.5)))
+
+    async def load(self, end, interval):
+        envelope = False
+        while time.time() < end:
+            request = { 'graph_id' : 'loadtest.csv' }
+            if envelope:
+                request['points'] = 500
+                await self.request('loadFile envelope', { 'messageType' : 'requestAction', 'data' : { 'loadFile' : request }},
+                                   lambda r: 'envelope' in r.get('data', {}).get('loadFile', {}) or 'error' in r.get('data', {}))
+            else:
+                await self.request('loadFile csv', { 'messageType' : 'requestAction', 'data' : { 'loadFile' : request }},
+                                   lambda r: r.get('data', {}).get('loadFileChunk', {}).get('done') or 'error' in r.get('data', {}))
+            envelope = not envelope
+            self.connection.write_message(json.dumps({ 'messageType' : 'requestAction', 'data' : { 'startStream' : {} }}))
+            await self.view(min(end, time.time() + interval * random.uniform(0.5, 1.5)))
+
+async def monitor(pid, end, samples):
+    '''Samples server CPU percent and RSS once a second
+    '''
+    try:
+        import psutil
+    except ImportError:
+        print('psutil is not installed, server CPU and RSS are not reported')
+        return
+    process = psutil.Process(pid)
+    process.cpu_percent()
+    while time.time() < end:
+        await asyncio.sleep(1.0)
+        samples.append((process.cpu_percent(), process.memory_info().rss))
+
+async def device_ids(url):
+    '''Device ids the server has found
+    '''
+    connection = await tornado.websocket.websocket_connect(url)
+    connection.write_message(json.dumps({ 'messageType' : 'requestAction', 'data' : { 'listDevices' : {} }}))
+    while True:
+        message = json.loads(await connection.read_message())
+        if 'listDevices' in message.get('data', {}):
+            connection.close()
+            return [d['deviceId'] for d in message['data']['listDevices']]
+
+async def main(args):
+    url = 'ws://localhost:{0:d}/'.format(args.port)
+    ids = await device_ids(url)
+    while len(ids) < args.devices:
+        await asyncio.sleep(0.5)
+        ids = await device_ids(url)
+    stats = Stats()
+    clients = [Client(url + '?deviceId=' + urllib.parse.quote(ids[i % len(ids)]), stats) for i in range(args.clients)]
+    for client in clients:
+        await client.connect()
+    start = time.time()
+    end = start + args.seconds
+    usage = []
+    tasks = [monitor(server.pid, end, usage)]
+    for i, client in enumerate(clients):
+        if i < args.commanders:
+            tasks.append(client.command(end, args.interval))
+        elif i < args.commanders + args.loaders:
+            tasks.append(client.load(end, args.interval))
+        else:
+            tasks.append(client.view(end))
+    await asyncio.gather(*tasks)
+    elapsed = time.time() - start
+    for client in clients:
+        client.connection.close()
+
+    print('{0:d} clients ({1:d} commanders, {2:d} loaders) on {3:d} devices for {4:.0f}s'.format(args.clients, args.commanders, args.loaders, len(ids), elapsed))
+    print('{0:>20s} {1:>8s} {2:>9s} {3:>9s} {4:>9s} {5:>9s}'.format('', 'count', 'p50 ms', 'p90 ms', 'p99 ms', 'p99.9 ms'))
+    rows = [('stream latency', stats.latencies())] + sorted(stats.requests.items())
+    for name, values in rows:
+        print('{0:>20s} {1:8d} '.format(name, len(values)) + ' '.join('{0:9.1f}'.format(p * 1000) for p in percentiles(values)))
+    print('{0:>20s} {1:10.0f} msg/s {2:10.0f} kB/s  {3:d} errors'.format('received', stats.messages / elapsed, stats.bytes / elapsed / 1024, stats.errors))
+    if usage:
+        cpu = [c for c, rss in usage]
+        rss = [rss for c, rss in usage]
+        print('{0:>20s} {1:9.1f} % mean {2:9.1f} % max'.format('server cpu', sum(cpu) / len(cpu), max(cpu)))
+        print('{0:>20s} {1:9.1f} MB mean {2:9.1f} MB max'.format('server rss', sum(rss) / len(rss) / 2**20, max(rss) / 2**20))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--commanders', type=int, default=2)
+    parser.add_argument('--loaders', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--interval', type=float, default=5, help='mean seconds between requests of a commander or loader')
+    parser.add_argument('--port', type=int, default=8010)
+    parser.add_argument('--packet', default='S1', choices=['S0', 'S1'])
+    parser.add_argument('--odr', type=int, default=1)
+    parser.add_argument('--devices', type=int, default=1, help='number of simulated devices')
+    parser.add_argument('--rows', type=int, default=100000, help='rows of the synthetic log served by loadFile')
+    parser.add_argument('--replay', help='replay this capture file instead of simulating a device')
+    parser.add_argument('--verbose', action='store_true', help='show server output')
+    args = parser.parse_args()
+    odr = args.odr
+
+    directory = make_scratch(args.rows)
+    device = ['--replay', os.path.abspath(args.replay)] if args.replay else ['--simulate', args.packet, '--odr', str(args.odr), '--devices', str(args.devices)]
+    output = None if args.verbose else subprocess.DEVNULL
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--port', str(args.port)] + device,
+                              cwd=directory, stdout=output, stderr=output)
+    try:
+        time.sleep(3)       # server start, device sync
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(directory, ignore_errors=True)
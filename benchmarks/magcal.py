@@ -0,0 +1,62 @@
+"""
+Benchmark magcal on a simulated rotation session: an earth field of 0.5 gauss seen through a known
+hard iron offset and soft iron distortion, with the device dwelling at each orientation.  Reports the
+collector CPU per sample, bins kept, fit time and the recovered calibration against the truth
+
+python benchmarks/magcal.py [seconds] [rate]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import magcal
+import quat
+
+HARD_IRON = np.array([0.12, -0.07, 0.2])
+# distortion D, raw = D . field + HARD_IRON, so the ideal soft iron matrix is D^-1 up to a rotation
+DISTORTION = np.array([[1.15, 0.05, -0.02], [0.05, 0.9, 0.03], [-0.02, 0.03, 1.02]])
+
+def make_mags(n, rate):
+    '''Rotation through random orientations, 2 s at each, with 2 mgauss noise
+    '''
+    rng = np.random.default_rng(0)
+    inclination = np.radians(60.0)
+    earth = 0.5 * np.array([np.cos(inclination), 0.0, np.sin(inclination)])
+    dwell = int(2 * rate)
+    orientations = rng.normal(size=(n // dwell + 1, 4))
+    orientations /= np.linalg.norm(orientations, axis=1)[:, None]
+    dcm = quat.to_dcm(np.repeat(orientations, dwell, axis=0)[:n])
+    # body field, the earth field in body axes
+    body = np.einsum('nji,j->ni', dcm, earth)
+    return body @ DISTORTION.T + HARD_IRON + rng.normal(0, 0.002, (n, 3))
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    mags = make_mags(int(seconds * rate), rate)
+    samples = [{ 'xMag' : x, 'yMag' : y, 'zMag' : z } for x, y, z in mags.tolist()]
+    print('{0:d} samples ({1:.0f} s at {2:d} Hz), {3:d} orientations'.format(len(samples), seconds, rate, len(samples) // (2 * rate) + 1))
+    collector = magcal.MagCollector()
+    start = time.perf_counter()
+    for data in samples:
+        collector(data)
+    collect_s = time.perf_counter() - start
+    print('{0:>24s} {1:9.2f} us/sample {2:9d} bins'.format('MagCollector', collect_s / len(samples) * 1e6, collector.status()['bins']))
+    start = time.perf_counter()
+    points = magcal.bin_samples(mags)
+    print('{0:>24s} {1:9.3f} ms {2:12d} bins'.format('bin_samples', (time.perf_counter() - start) * 1e3, len(points)))
+    points = collector.points()
+    start = time.perf_counter()
+    result = magcal.fit(points)
+    print('{0:>24s} {1:9.3f} ms'.format('fit', (time.perf_counter() - start) * 1e3))
+    print('{0:>24s} {1} truth {2}'.format('hard iron', np.round(result['hardIron'], 4), HARD_IRON))
+    # corrected = W (raw - c) should be the true field up to a rotation, so W D is a scaled rotation
+    WD = np.asarray(result['softIron']) @ DISTORTION / result['fieldStrength'] * 0.5
+    print('{0:>24s} {1:9.2e}'.format('W D - rotation', np.abs(WD @ WD.T - np.eye(3)).max()))
+    print('{0:>24s} {1:9.4f} gauss, residual rms {2:.2e} max {3:.2e}, coverage {4:.2f}'.format('field strength', result['fieldStrength'],
+          result['residualRms'], result['residualMax'], result['coverage']))
+    print('{0:>24s} {1}'.format('device fields', [('{0:#06x}'.format(f), v) for f, v in magcal.device_fields(result)]))
@@ -0,0 +1,105 @@
+"""
+Benchmark navexport on a simulated drive streamed as N1 packets at 100 Hz: roads of straight runs,
+turns and stops around a start point with 5 cm position noise, written as a raw capture.  Reports
+the time to decode the capture against parse_packet, to convert and simplify the track, and to write
+each format, with the file sizes
+
+python benchmarks/navexport.py [hours] [tolerance]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import capture
+import imu380
+import navexport
+
+RATE = 100
+ORIGIN = (45.07, 7.68, 240.0)
+
+def make_payloads(n):
+    '''N1 payloads of a drive: 1 to 60 s legs at 0 to 30 m/s, heading changing by up to 90 degrees
+    '''
+    rng = np.random.default_rng(0)
+    legs = n // (30 * RATE) + 1
+    duration = rng.integers(1 * RATE, 60 * RATE, legs)
+    speed = np.where(rng.random(legs) < 0.1, 0.0, rng.uniform(3, 30, legs))
+    heading = np.cumsum(rng.uniform(-np.pi / 2, np.pi / 2, legs))
+    leg = np.repeat(np.arange(legs), duration)[:n]
+    # smooth the turns over 2 s
+    kernel = np.ones(2 * RATE) / (2 * RATE)
+    north_v = np.convolve(speed[leg] * np.cos(heading[leg]), kernel, 'same')
+    east_v = np.convolve(speed[leg] * np.sin(heading[leg]), kernel, 'same')
+    north = np.cumsum(north_v) / RATE + rng.normal(0, 0.05, n)
+    east = np.cumsum(east_v) / RATE + rng.normal(0, 0.05, n)
+    up = 20 * np.sin(np.arange(n) / (600.0 * RATE)) + rng.normal(0, 0.05, n)
+    latitude = ORIGIN[0] + np.degrees(north / 6378137.0)
+    longitude = ORIGIN[1] + np.degrees(east / (6378137.0 * np.cos(np.radians(ORIGIN[0]))))
+    layout = navexport.LAYOUTS['N1']
+    dtype = np.dtype({ 'names' : [f[0] for f in layout], 'offsets' : [f[1] for f in layout],
+                       'formats' : [f[2] for f in layout], 'itemsize' : navexport.PAYLOAD_LENGTHS['N1'] })
+    records = np.zeros(n, dtype)
+    scale = { f[0] : f[3] for f in layout }
+    for name, values in [('latitude', latitude), ('longitude', longitude), ('altitude', ORIGIN[2] + up),
+                         ('nVel', north_v), ('eVel', east_v), ('xRateTemp', np.full(n, 30.0))]:
+        records[name] = np.round(values / scale[name])
+    records['iTOW'] = (np.arange(n) * (1000 // RATE)) % 65536
+    return records.view(np.uint8).reshape(n, -1)
+
+def write_capture(path, payloads):
+    '''Frames of payloads as 4 KiB serial reads in a capture
+    '''
+    imu = imu380.GrabIMU380Data()
+    crcs = navexport.crc(np.concatenate([np.tile(np.frombuffer(b'N1\x26', np.uint8), (len(payloads), 1)), payloads], axis=1))
+    frames = np.concatenate([np.tile(np.frombuffer(b'UUN1\x26', np.uint8), (len(payloads), 1)), payloads,
+                             (crcs >> 8).astype(np.uint8)[:, None], (crcs & 0xff).astype(np.uint8)[:, None]], axis=1).tobytes()
+    assert imu.calc_crc(frames[2:43]) == 256 * frames[43] + frames[44]
+    writer = capture.RawCapture(path, { 'packetType' : 'N1', 'packetSize' : 38 })
+    for start in range(0, len(frames), 4096):
+        writer.record(frames[start:start + 4096])
+    writer.close()
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print('{0:>24s} {1:9.3f} s'.format(label, time.perf_counter() - start))
+    return result
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    n = int(hours * 3600 * RATE)
+    payloads = make_payloads(n)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'drive.bin')
+        write_capture(path, payloads)
+        print('{0:d} N1 samples ({1:.1f} h at {2:d} Hz), capture {3:.1f} MB, tolerance {4:.1f} m'.format(n, hours, RATE, os.path.getsize(path) / 1e6, tolerance))
+        imu = imu380.GrabIMU380Data()
+        imu.packet_type = 'N1'
+        sample = [bytearray(p.tobytes()) for p in payloads[:100000]]
+        start = time.perf_counter()
+        for p in sample:
+            imu.data = imu.parse_packet(p)
+        print('{0:>24s} {1:9.3f} s (extrapolated from {2:d} packets)'.format('parse_packet', (time.perf_counter() - start) * n / len(sample), len(sample)))
+        columns = timed('read_capture', navexport.read_capture, path)
+        full, fixes = timed('track', navexport.track, columns)
+        simplified, fixes = timed('track simplified', navexport.track, columns, tolerance)
+        print('{0:>24s} {1:9d} of {2:d} points'.format('kept', len(simplified['time']), fixes))
+        # how far the simplified line strays from the full track, sampled
+        enu = np.stack([simplified['east'], simplified['north'], simplified['up']], axis=1)
+        probe = np.stack([full['east'], full['north'], full['up']], axis=1)[::97]
+        segment = np.clip(np.searchsorted(simplified['time'], full['time'][::97]), 1, len(enu) - 1)
+        error = navexport.segment_distance(probe, enu[segment - 1], enu[segment])
+        print('{0:>24s} {1:9.3f} m max (tolerance {2:.1f} m)'.format('simplification error', error.max(), tolerance))
+        for extension in ['geojson', 'kml', 'csv']:
+            out = os.path.join(directory, 'track.' + extension)
+            timed('export .' + extension, navexport.export, columns, out, tolerance)
+            print('{0:>24s} {1:9.3f} MB'.format('', os.path.getsize(out) / 1e6))
+        out = os.path.join(directory, 'full.csv')
+        timed('export .csv unsimplified', navexport.export, columns, out)
+        print('{0:>24s} {1:9.3f} MB'.format('', os.path.getsize(out) / 1e6))
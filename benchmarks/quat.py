@@ -0,0 +1,49 @@
+"""
+Benchmark reprocessing a log's gyro rates into attitude, Quat.update_quat once per sample versus
+quat.integrate over the whole array, on an hour of synthetic 200 Hz rates by default
+
+python benchmarks/quat.py [seconds] [rate]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import quat
+
+def make_rates(n, rate):
+    '''Slow turning about every axis plus gyro noise, rad/s, and per sample intervals with jitter
+    '''
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / float(rate)
+    rates = np.stack([0.3 * np.sin(0.05 * t), 0.2 * np.cos(0.03 * t), 0.5 * np.sin(0.01 * t)], axis=1)
+    rates += rng.normal(0, 0.01, rates.shape)
+    dt = np.full(n, 1.0 / rate) + rng.normal(0, 1e-5, n)
+    return rates, dt
+
+def loop(rates, dt):
+    q = quat.Quat()
+    history = []
+    for (wx, wy, wz), t in zip(rates.tolist(), dt.tolist()):
+        q.update_quat({ 'wx' : wx, 'wy' : wy, 'wz' : wz }, t)
+        history.append(list(q.q))
+    return np.array(history)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rates, dt = make_rates(int(seconds * rate), rate)
+    print('{0:d} samples ({1:.0f} s at {2:d} Hz)'.format(len(rates), seconds, rate))
+    loop_s, reference = timed(lambda: loop(rates, dt))
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample'.format('update_quat loop', loop_s, loop_s / len(rates) * 1e6))
+    batch_s, history = timed(lambda: quat.integrate(rates, dt))
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample  {3:.1f}x'.format('quat.integrate', batch_s, batch_s / len(rates) * 1e6, loop_s / batch_s))
+    print('{0:>24s} {1:12.2e}'.format('max difference', np.abs(history - reference).max()))
@@ -0,0 +1,73 @@
+"""
+Benchmark the spectrum.Spectrum stage against spectrum.welch on synthetic 200 Hz vibration: the
+reader side cost per sample, the worker's periodogram cost per window, and the stage's averaged PSD
+compared with welch over the same windows
+
+python benchmarks/spectrum.py [seconds] [rate]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import spectrum
+
+def make_columns(n, rate):
+    '''Sinusoidal vibration at 12 Hz (accels) and 31 Hz (rates) on white noise
+    '''
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / float(rate)
+    columns = { 'time' : t }
+    for i, k in enumerate(spectrum.CHANNELS):
+        frequency = 12.0 if 'Accel' in k else 31.0
+        columns[k] = (i + 1) * 0.1 * np.sin(2 * np.pi * frequency * t) + rng.normal(0, 0.01, n)
+    return columns
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    columns = make_columns(int(seconds * rate), rate)
+    n = len(columns['time'])
+    samples = [dict(zip(columns, row)) for row in zip(*[columns[k].tolist() for k in columns])]
+    print('{0:d} samples ({1:.0f} s at {2:d} Hz)'.format(n, seconds, rate))
+
+    # a tight loop outruns the worker (it only gets the GIL every switch interval), windows are dropped
+    stage = spectrum.Spectrum()
+    start = time.perf_counter()
+    for data in samples:
+        stage(data)
+    reader_s = time.perf_counter() - start
+    stage.close()
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample  {3:d} dropped windows'.format('stage reader side', reader_s, reader_s / n * 1e6, stage.dropped))
+
+    # paced like a device, averaging every window, for the comparison with welch
+    stage = spectrum.Spectrum(averages=10 ** 9, cadence=0.0)
+    results = []
+    stage.listeners.append(results.append)
+    for data in samples:
+        while stage.free.empty():
+            time.sleep(0.001)
+        stage(data)
+    stage.close()
+
+    segments = np.zeros((1, stage.window, len(spectrum.CHANNELS)))
+    start = time.perf_counter()
+    for i in range(1000):
+        spectrum.periodograms(segments, rate, stage.window)
+    window_s = (time.perf_counter() - start) / 1000
+    print('{0:>24s} {1:9.3f} ms/window {2:9.2f} us/sample'.format('worker periodogram', window_s * 1e3, window_s / stage.hop * 1e6))
+
+    start = time.perf_counter()
+    result = spectrum.welch(columns, rate=rate)
+    welch_s = time.perf_counter() - start
+    print('{0:>24s} {1:9.3f} s {2:9.2f} us/sample  {3:d} windows'.format('spectrum.welch', welch_s, welch_s / n * 1e6, result['windows']))
+
+    if stage.dropped == 0 and results:
+        last = results[-1]
+        difference = max(np.abs(np.array(last['psd'][k]) - result['psd'][k]).max() / result['psd'][k].max() for k in spectrum.CHANNELS)
+        print('{0:>24s} {1:12.2e} ({2:d} windows)'.format('relative difference', difference, last['windows']))
+        peak = np.argmax(result['psd']['xAccel']) * result['frequencyStep']
+        print('{0:>24s} {1:9.2f} Hz, band rms {2}'.format('xAccel peak', peak, ['{0:.4f}'.format(b) for b in last['bandRms']['xAccel']]))
@@ -0,0 +1,39 @@
+"""
+Benchmark the noise statistics: stats.RunningStats cost per sample as a pipeline stage, and
+stats.allan_deviation over tens of millions of samples (a day of 100 Hz data is 8.6 million)
+
+python benchmarks/stats.py [samples]
+"""
+
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import stats
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000000
+    rng = np.random.default_rng(0)
+
+    names = ['time', 'xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate', 'xRateTemp', 'yRateTemp', 'zRateTemp', 'boardTemp', 'counter', 'BITstatus']
+    rows = [collections.OrderedDict(zip(names, [i * 0.01] + rng.normal(0, 1, 10).tolist() + [i % 65536, 0])) for i in range(20000)]
+    stage = stats.RunningStats()
+    start = time.perf_counter()
+    for data in rows:
+        stage(data)
+    elapsed = time.perf_counter() - start
+    print('{0:>28s} {1:9.2f} us/sample ({2:d} channels)'.format('RunningStats stage', elapsed / len(rows) * 1e6, len(stage.snapshot())))
+
+    # white rate noise plus a bias random walk, the classic -1/2 then +1/2 slopes
+    rate = 100.0
+    values = rng.normal(0, 0.1, n) + np.cumsum(rng.normal(0, 1e-4, n))
+    start = time.perf_counter()
+    result = stats.allan_deviation(values, rate)
+    elapsed = time.perf_counter() - start
+    print('{0:>28s} {1:9.2f} s for {2:d} samples, {3:d} averaging times'.format('allan_deviation', elapsed, n, len(result['tau'])))
+    for tau, adev in list(zip(result['tau'], result['adev']))[::10]:
+        print('{0:>28s} {1:12.2f} s {2:12.3e}'.format('', tau, adev))
@@ -0,0 +1,115 @@
+"""
+Packed binary logger for Aceinna 380/381 Series Products, the binary storage backend
+Created on 2026-10-19
+"""
+
+"""
+File format
+MAGIC                   - b'IMU380LOG1'
+records                 - 1 byte kind, U4 little endian length, then the record bytes
+                          S  JSON schema { schemaId, fields, format } as sent by encoding.PackedEncoding
+                          H  JSON session header { deviceId, packetType, sampleRate, user fileName }
+                          D  one sample packed by encoding.PackedEncoding, U1 schema id first
+
+A sample takes 4 bytes per field (8 for time) instead of the ~10 characters per field of CSV and
+needs no float formatting.  read_log yields the samples back as OrderedDicts.
+"""
+
+import collections
+import datetime
+import json
+import struct
+import threading
+import time
+import encoding
+import storage
+
+MAGIC = b'IMU380LOG1'
+RECORD = struct.Struct('<cI')
+ODR_RATES = { 0: 'Quiet', 1 : '100Hz', 2 : '50Hz', 4 : '25Hz' }
+
+class LogIMU380Data:
+    def __init__(self, imu, user):
+        '''Creates data/<session>.log.bin, session is data-<timestamp>-<serial number>
+        '''
+        self.session = 'data-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '-' + imu.device_id.split(" ")[0]
+        self.name = self.session + '.log.bin'
+        self.user = user
+        self.lock = threading.Lock()
+        self.encoding = encoding.PackedEncoding()
+        self.schemas = {}           # schema id -> schema message last written
+        self.samples = 0
+        self.info = { 'session' : self.session, 'deviceId' : imu.device_id, 'packetType' : imu.packet_type, 'sampleRate' : ODR_RATES.get(imu.odr_setting, str(imu.odr_setting)),
+                      'start' : time.time(), 'samples' : 0, 'firstTime' : None, 'lastTime' : None }
+        self.file = open('data/' + self.name, 'wb')
+        self.file.write(MAGIC)
+        self.write(b'H', json.dumps(dict(self.info, fileName=user.get('fileName', ''))).encode())
+        if self.user.get('fileName', '') == '':
+            self.user['fileName'] = self.name
+        storage.notify('open', self.name, self.info)
+
+    def write(self, kind, record):
+        self.file.write(RECORD.pack(kind, len(record)) + record)
+
+    def log(self, data, odr_setting):
+        '''Appends one sample, preceded by its schema the first time its field set is seen.  data that
+           is not a dict of fields (unknown packet type, F1 reply) is not logged
+        '''
+        if not isinstance(data, dict):
+            return
+        schema_id, schema = self.encoding.schema(data)
+        frame = self.encoding.encode(data)
+        with self.lock:
+            if self.file is None:
+                return
+            if self.schemas.get(schema_id) != schema:
+                self.schemas[schema_id] = schema
+                self.write(b'S', schema)
+            self.write(b'D', frame)
+            self.samples += 1
+            if self.info['firstTime'] is None:
+                self.info['firstTime'] = data.get('time')
+            self.info['lastTime'] = data.get('time')
+
+    def close(self):
+        '''Closes the log, calling it again does nothing
+        '''
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+        self.info['samples'] = self.samples
+        storage.notify('close', self.name, self.info)
+        self.name = ''
+
+def read_log(path):
+    '''Reads a binary log
+        :returns:
+            session header dict and a generator of samples as OrderedDicts
+    '''
+    f = open(path, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError('not an imu380 binary log: ' + path)
+    kind, length = RECORD.unpack(f.read(RECORD.size))
+    header = json.loads(f.read(length).decode())
+
+    def samples():
+        layouts = {}
+        with f:
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                kind, length = RECORD.unpack(head)
+                record = f.read(length)
+                if len(record) < length:
+                    return          # log still being written
+                if kind == b'S':
+                    schema = json.loads(record.decode())['data']
+                    layouts[schema['schemaId']] = (schema['fields'], struct.Struct(schema['format']))
+                elif kind == b'D':
+                    fields, packer = layouts[record[0]]
+                    yield collections.OrderedDict(zip(fields, packer.unpack(record)[1:]))
+    return header, samples()
@@ -0,0 +1,303 @@
+"""
+Websocket fan-out for imu380 sample streams
+Created on 2026-10-19
+"""
+
+"""
+Broadcaster     - one periodic tick per device, each update is encoded once and the same bytes
+                  are written to every subscribed connection using the same encoding
+add / remove    - client registry, the tick only runs while clients are registered
+SendQueue       - bounded per connection outbound queue, at most one write in flight per client
+Subscription    - field subset and output rate shared by every client that asked for the same ones,
+                  decimating (first sample of each interval) or averaging (mean of each interval)
+
+Clients either get the latest sample when a new one arrived since the previous tick (mode latest),
+or every sample since their sequence number cursor as one batch per tick (mode all).  Clients in
+mode all with the same cursor and encoding share one encoded batch.  Subscribed clients get the
+output of their subscription instead, computed once per tick however many clients share it.
+
+A client is any object with streaming, mode, cursor, encoding (see encoding.py), schemas (schema
+id to the schema message last sent with it) and subscription (None for every field of every sample) attributes and a
+send(bytes, binary, keep) method, see server.WSHandler
+"""
+
+import collections
+import time
+from tornado.ioloop import PeriodicCallback
+from encoding import INT_FIELDS
+
+POLICIES = ['drop_oldest', 'coalesce', 'disconnect']
+REDUCTIONS = ['decimate', 'average']
+
+class SendQueue:
+    def __init__(self, write, close, depth=32, policy='drop_oldest'):
+        '''Queue in front of write(message, binary), which must return a future resolved once the
+           message is handed to the socket.  When depth messages are waiting behind an unfinished
+           write, policy decides: drop_oldest discards the oldest waiting sample message, coalesce
+           keeps only the newest sample message, disconnect calls close().  Messages sent with
+           keep=True (schemas) are never dropped
+        '''
+        if policy not in POLICIES:
+            raise ValueError('unknown send queue policy ' + str(policy))
+        self.write = write
+        self.close = close
+        self.depth = depth
+        self.policy = policy
+        self.queue = collections.deque()
+        self.in_flight = False
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.closed = False
+
+    def put(self, message, binary=False, keep=False):
+        if self.closed:
+            return
+        if not self.in_flight:
+            self.start(message, binary)
+            return
+        if self.policy == 'coalesce' and not keep:
+            self.drop(len(self.queue))
+        elif len(self.queue) >= self.depth:
+            if self.policy == 'disconnect':
+                self.closed = True
+                self.dropped += len(self.queue) + 1
+                self.queue.clear()
+                self.close()
+                return
+            self.drop(1)
+        self.queue.append((message, binary, keep))
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+    def drop(self, n):
+        '''Discards up to n of the oldest droppable messages
+        '''
+        kept = collections.deque()
+        while self.queue and n:
+            item = self.queue.popleft()
+            if item[2]:
+                kept.append(item)
+            else:
+                self.dropped += 1
+                n -= 1
+        kept.extend(self.queue)
+        self.queue = kept
+
+    def start(self, message, binary):
+        self.in_flight = True
+        self.sent += 1
+        try:
+            future = self.write(message, binary)
+        except Exception:
+            self.in_flight = False
+            self.closed = True
+            self.queue.clear()
+            raise
+        future.add_done_callback(self.done)
+
+    def done(self, future):
+        self.in_flight = False
+        if future.exception() is not None:
+            self.closed = True
+            self.queue.clear()
+            return
+        if self.queue:
+            message, binary, keep = self.queue.popleft()
+            self.start(message, binary)
+
+    def metrics(self):
+        return { 'policy' : self.policy, 'depth' : len(self.queue), 'maxDepth' : self.max_depth,
+                 'sent' : self.sent, 'dropped' : self.dropped }
+
+class Subscription:
+    def __init__(self, fields, rate, reduce, cursor):
+        '''Selects fields (None for all) of the samples after sequence number cursor, at most rate per
+           second (0 for every sample) measured on the sample time column, reduced by decimate or average
+        '''
+        self.fields = fields
+        self.wanted = frozenset(fields or ())
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0.0
+        self.reduce = reduce
+        self.cursor = cursor
+        self.clients = 0
+        self.next = None            # time the current interval ends
+        self.sums = None
+        self.count = 0
+
+    def select(self, data):
+        '''The subscribed fields of data, in the order of data whatever order they were asked in
+        '''
+        if self.fields is None:
+            return data
+        wanted = self.wanted
+        return collections.OrderedDict((k, v) for k, v in data.items() if k in wanted)
+
+    def update(self, imu):
+        '''Consumes the samples that arrived since the previous call
+            :returns:
+                list of (sequence number, data) outputs and count of samples missed from the ring
+        '''
+        samples, missed = imu.get_since(self.cursor)
+        if not samples:
+            return [], 0
+        self.cursor = samples[-1][0]
+        if not self.interval:
+            return [(seq, self.select(d)) for seq, d in samples], missed
+        outputs = []
+        now = time.time()
+        for seq, data in samples:
+            t = data.get('time', now)
+            if self.next is None or t < self.next - 2 * self.interval:
+                self.next = t       # first sample or the device time restarted
+            if t >= self.next - 1e-6 * self.interval:       # tolerate rounding of the accumulated interval
+                if self.reduce == 'average' and self.count:
+                    outputs.append((seq, self.mean()))
+                elif self.reduce == 'decimate':
+                    outputs.append((seq, self.select(data)))
+                self.next = self.next + self.interval if t < self.next + self.interval else t + self.interval
+            if self.reduce == 'average':
+                self.add(self.select(data))
+        return outputs, missed
+
+    def add(self, data):
+        if self.sums is None:
+            self.sums = collections.OrderedDict((k, 0.0) for k in data)
+        for k, v in data.items():
+            if k in INT_FIELDS:
+                self.sums[k] = v        # counters and status bits are not averaged, the latest is kept
+            else:
+                self.sums[k] = self.sums.get(k, 0.0) + v
+        self.count += 1
+
+    def mean(self):
+        data = collections.OrderedDict((k, v if k in INT_FIELDS else v / self.count) for k, v in self.sums.items())
+        self.sums = None
+        self.count = 0
+        return data
+
+class Broadcaster:
+    def __init__(self, imu, rate=50):
+        '''Create broadcaster for imu, ticking every rate milliseconds
+        '''
+        self.imu = imu
+        self.rate = rate
+        self.clients = set()
+        self.subscriptions = {}     # (fields, rate, reduce) -> Subscription
+        self.latest_seq = 0
+        self.callback = PeriodicCallback(self.tick, rate)
+
+    def add(self, client):
+        self.clients.add(client)
+        if not self.callback.is_running():
+            self.callback.start()
+
+    def remove(self, client):
+        self.unsubscribe(client)
+        self.clients.discard(client)
+        if not self.clients:
+            self.callback.stop()
+
+    def subscribe(self, client, fields=None, rate=0, reduce='decimate'):
+        '''Sends client only fields, at most rate outputs per second.  Clients asking for the same
+           fields, in any order, rate and reduction share one Subscription.  No fields and no rate unsubscribes
+        '''
+        if reduce not in REDUCTIONS:
+            raise ValueError('unknown reduction ' + str(reduce))
+        rate = float(rate or 0)
+        if rate < 0:
+            raise ValueError('rate must not be negative')
+        self.unsubscribe(client)
+        if not fields and not rate:
+            return None
+        # samples keep their own field order, so the order asked for must not make a separate
+        # subscription or packed schema
+        key = (tuple(sorted(set(fields))) if fields else None, rate, reduce)
+        subscription = self.subscriptions.get(key)
+        if subscription is None:
+            subscription = Subscription(key[0], rate, reduce, self.imu.sample_seq)
+            self.subscriptions[key] = subscription
+        subscription.clients += 1
+        client.subscription = subscription
+        return subscription
+
+    def unsubscribe(self, client):
+        subscription = getattr(client, 'subscription', None)
+        if subscription is None:
+            return
+        client.subscription = None
+        subscription.clients -= 1
+        if not subscription.clients:
+            del self.subscriptions[(subscription.fields, subscription.rate, subscription.reduce)]
+
+    def metrics(self):
+        '''Send queue metrics of every registered client
+        '''
+        return [client.queue.metrics() for client in self.clients]
+
+    def tick(self):
+        '''Encodes new samples once per encoding and cursor in use and writes them to every streaming client
+        '''
+        if not (self.imu.connected and self.imu.stream_mode):
+            return
+        latest = {}
+        batched = {}
+        subscribed = {}
+        for client in self.clients:
+            if not client.streaming:
+                continue
+            if client.subscription is not None:
+                subscribed.setdefault(client.subscription, {}).setdefault((client.encoding, client.mode), []).append(client)
+            elif client.mode == 'all':
+                batched.setdefault((client.encoding, client.cursor), []).append(client)
+            else:
+                latest.setdefault(client.encoding, []).append(client)
+
+        seq = self.imu.sample_seq
+        if latest and seq != self.latest_seq:
+            self.latest_seq = seq
+            d = self.imu.get_latest()
+            # imu.data is None or an int after an unknown packet type or a reply
+            if isinstance(d, dict):
+                for encoding, clients in latest.items():
+                    self.send(clients, encoding, [d], encoding.encode(d))
+
+        for (encoding, cursor), clients in batched.items():
+            samples, missed = self.imu.get_since(cursor)
+            if not samples:
+                continue
+            self.send(clients, encoding, [d for n, d in samples], encoding.encode_batch(samples, missed))
+            for client in clients:
+                client.cursor = samples[-1][0]
+
+        for subscription, groups in subscribed.items():
+            outputs, missed = subscription.update(self.imu)
+            if not outputs:
+                continue
+            for (encoding, mode), clients in groups.items():
+                if mode == 'all':
+                    self.send(clients, encoding, [d for n, d in outputs], encoding.encode_batch(outputs, missed))
+                else:
+                    self.send(clients, encoding, [outputs[-1][1]], encoding.encode(outputs[-1][1]))
+                for client in clients:
+                    client.cursor = outputs[-1][0]
+
+    def send(self, clients, encoding, samples, message):
+        '''Writes message to clients, preceded by any schema of samples a client has not received yet
+        '''
+        schemas = []
+        if encoding.binary:
+            fields = set()
+            for d in samples:
+                if tuple(d) not in fields:
+                    fields.add(tuple(d))
+                    schema = encoding.schema(d)
+                    if schema is not None:
+                        schemas.append(schema)
+        for client in clients:
+            for schema_id, schema in schemas:
+                # an id is given to another field set once the encoding has MAX_SCHEMAS
+                if client.schemas.get(schema_id) != schema:
+                    client.schemas[schema_id] = schema
+                    client.send(schema, False, True)
+            client.send(message, encoding.binary)
@@ -0,0 +1,118 @@
+"""
+Sensor calibration and temperature compensation of decoded S0/S1 samples
+Created on 2026-10-19
+"""
+
+"""
+load            - calibration file, JSON of device -> sensor -> parameters
+for_device      - parameters of a device_id from a loaded file, by full id, serial number or "default"
+Calibration     - pipeline stage (imu.add_stage(stage, 0)) correcting rates, accels and mags in place
+apply           - the same correction over whole columns at once
+
+Per sensor (rate, accel, mag) parameters, all optional, in the units parse_packet decodes to
+(deg/s, m/s^2, Gauss):
+    bias                3 offsets
+    scale               3 scale factors
+    misalignment        3 x 3 matrix, identity when absent
+    temperature         { reference, bias : [[k1 x, y, z], [k2 ...], ...], scale : [[...], ...] }
+                        polynomial coefficients in powers of (T - reference), first power first
+    temperatureFields   fields holding each axis' temperature, default x/y/zRateTemp
+
+    corrected = misalignment . ((raw - bias(T)) * scale(T))
+    bias(T)   = bias + k1 dT + k2 dT^2 + ...
+    scale(T)  = scale * (1 + s1 dT + s2 dT^2 + ...)
+
+{ "1808400123" : { "rate" : { "bias" : [0.1, -0.05, 0.02], "temperature" : { "reference" : 25.0, "bias" : [[0.004, 0.003, -0.002]] }}}}
+"""
+
+import json
+
+SENSORS = { 'rate' : ['xRate', 'yRate', 'zRate'], 'accel' : ['xAccel', 'yAccel', 'zAccel'], 'mag' : ['xMag', 'yMag', 'zMag'] }
+TEMPERATURE_FIELDS = ['xRateTemp', 'yRateTemp', 'zRateTemp']
+IDENTITY = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def for_device(calibrations, device_id):
+    '''Parameters for device_id ("<serial number> <part number>"), None if the file has none
+    '''
+    device_id = str(device_id)
+    for key in [device_id, device_id.split(' ')[0], 'default']:
+        if key in calibrations:
+            return calibrations[key]
+    return None
+
+def polynomial(coefficients, dt):
+    '''Per axis sum of coefficients[k][axis] dt[axis]^(k + 1), Horner's rule
+    '''
+    result = [0.0, 0.0, 0.0]
+    for k in reversed(coefficients):
+        result = [(result[i] + k[i]) * dt[i] for i in range(3)]
+    return result
+
+class Calibration:
+    name = 'calibration'
+
+    def __init__(self, parameters):
+        '''parameters are one device's entry of a calibration file, see for_device
+        '''
+        self.sensors = []
+        for sensor, fields in SENSORS.items():
+            p = parameters.get(sensor)
+            if not p:
+                continue
+            temperature = p.get('temperature', {})
+            self.sensors.append((fields, p.get('temperatureFields', TEMPERATURE_FIELDS), p.get('bias', [0.0, 0.0, 0.0]),
+                                 p.get('scale', [1.0, 1.0, 1.0]), p.get('misalignment', IDENTITY),
+                                 temperature.get('reference', 25.0), temperature.get('bias', []), temperature.get('scale', [])))
+
+    def __call__(self, data):
+        for fields, temperature_fields, bias, scale, misalignment, reference, bias_t, scale_t in self.sensors:
+            if fields[0] not in data:
+                continue
+            b, s = bias, scale
+            if (bias_t or scale_t) and temperature_fields[0] in data:
+                dt = [data[f] - reference for f in temperature_fields]
+                if bias_t:
+                    b = [x + y for x, y in zip(bias, polynomial(bias_t, dt))]
+                if scale_t:
+                    s = [x * (1.0 + y) for x, y in zip(scale, polynomial(scale_t, dt))]
+            v = [(data[fields[i]] - b[i]) * s[i] for i in range(3)]
+            for i in range(3):
+                m = misalignment[i]
+                data[fields[i]] = m[0] * v[0] + m[1] * v[1] + m[2] * v[2]
+
+def apply(columns, parameters):
+    '''Calibration over whole columns, returns a dict with the corrected columns replaced.  Each
+       sensor is one (N x 3) array expression and one matrix product
+    '''
+    import numpy as np
+    result = dict(columns)
+    for fields, temperature_fields, bias, scale, misalignment, reference, bias_t, scale_t in Calibration(parameters).sensors:
+        if fields[0] not in columns:
+            continue
+        raw = np.stack([np.asarray(columns[f], dtype=float) for f in fields], axis=1)
+        b = np.asarray(bias, dtype=float)
+        s = np.asarray(scale, dtype=float)
+        if (bias_t or scale_t) and temperature_fields[0] in columns:
+            dt = np.stack([np.asarray(columns[f], dtype=float) for f in temperature_fields], axis=1) - reference
+            if bias_t:
+                b = b + polynomial_arrays(bias_t, dt)
+            if scale_t:
+                s = s * (1.0 + polynomial_arrays(scale_t, dt))
+        corrected = ((raw - b) * s) @ np.asarray(misalignment, dtype=float).T
+        for i, f in enumerate(fields):
+            result[f] = corrected[:, i]
+    return result
+
+def polynomial_arrays(coefficients, dt):
+    '''polynomial for an N x 3 array of temperature differences
+    '''
+    import numpy as np
+    result = np.zeros_like(dt)
+    for k in reversed(coefficients):
+        result += np.asarray(k, dtype=float)
+        result *= dt
+    return result
@@ -0,0 +1,137 @@
+"""
+Raw serial capture and replay for Aceinna 380/381 Series Products
+Created on 2026-10-19
+"""
+
+"""
+File format
+MAGIC                   - b'IMU380CAP1'
+U4 little endian        - length of JSON metadata (driver state when capture started)
+JSON metadata
+records                 - F8 monotonic host time, 1 byte direction (R/W), U4 length, then the raw bytes
+
+Every read() made by the driver is recorded, including empty reads on timeout, so replaying the
+read records in order reproduces the bytes and chunk boundaries the driver originally saw.
+"""
+
+import json
+import struct
+import threading
+import time
+
+MAGIC = b'IMU380CAP1'
+RECORD = struct.Struct('<dcI')
+
+class RawCapture:
+    def __init__(self, path, state=None, flush_bytes=64 * 1024, flush_interval=1.0):
+        '''Create capture file.  Records are buffered and written once flush_bytes are pending
+           or flush_interval seconds have passed, to keep per read overhead low
+        '''
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        metadata = json.dumps(state or {}).encode()
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + struct.pack('<I', len(metadata)) + metadata)
+
+    def record(self, chunk, direction=b'R'):
+        '''Appends one chunk read from or written to the serial port
+        '''
+        now = time.monotonic()
+        with self.lock:
+            if self.file is None:
+                return
+            self.buffer.append(RECORD.pack(now, direction, len(chunk)))
+            self.buffer.append(bytes(chunk))
+            self.buffered += RECORD.size + len(chunk)
+            if self.buffered >= self.flush_bytes or now - self.last_flush >= self.flush_interval:
+                self._flush(now)
+
+    def _flush(self, now):
+        self.file.write(b''.join(self.buffer))
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = now
+
+    def close(self):
+        '''Writes pending records and closes file
+        '''
+        with self.lock:
+            if self.file is None:
+                return
+            self._flush(time.monotonic())
+            self.file.close()
+            self.file = None
+
+def read_capture(path):
+    '''Reads a capture file
+        :returns:
+            metadata dict and a generator of (host_time, direction, bytes) records
+    '''
+    f = open(path, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError('not a raw capture file: ' + path)
+    length = struct.unpack('<I', f.read(4))[0]
+    metadata = json.loads(f.read(length).decode())
+
+    def records():
+        with f:
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                host_time, direction, length = RECORD.unpack(head)
+                yield host_time, direction, f.read(length)
+
+    return metadata, records()
+
+class ReplaySerial:
+    def __init__(self, path, realtime=False):
+        '''Serial port stand in that returns the recorded reads of a capture file in order.
+           If realtime is set reads are paced by the recorded host timestamps
+        '''
+        self.path = path
+        self.realtime = realtime
+        self.metadata, self.records = read_capture(path)
+        self.pending = b''
+        self.eof = False
+        self.start = None
+
+    def read(self, n):
+        '''Returns the next recorded read.  A record longer than n is split across calls
+        '''
+        if not self.pending:
+            for host_time, direction, chunk in self.records:
+                if direction != b'R':
+                    continue
+                if self.realtime:
+                    if self.start is None:
+                        self.start = (time.monotonic(), host_time)
+                    delay = (host_time - self.start[1]) - (time.monotonic() - self.start[0])
+                    if delay > 0:
+                        time.sleep(delay)
+                if not chunk:
+                    return b''
+                self.pending = chunk
+                break
+            else:
+                self.eof = True
+                return b''
+        data = self.pending[:n]
+        self.pending = self.pending[n:]
+        return data
+
+    def write(self, data):
+        return len(data)
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.records.close()
+        self.eof = True
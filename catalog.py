@@ -0,0 +1,251 @@
+"""
+Catalog of the log files in the data directory for listFiles
+Created on 2026-10-19
+"""
+
+"""
+LogCatalog      - one metadata entry per log file, kept up to date from logger open/close events
+                  (storage.log_listeners) and a periodic rescan for files changed by anything else
+on_log_event    - logger callback, adds an open segment or records a finalized one
+rescan          - stats the directory, refreshes only entries whose size or mtime changed
+list            - sorted, filtered page of entries, all of them unless a limit is given
+
+Entries hold name, size, mtime, start (epoch seconds), duration (seconds), samples, packetType,
+sampleRate, deviceId, session and open.  Open entries are segments a logger is still writing, which
+exist only as .part files until closed, so list leaves them out unless asked for them.  Metadata of segments comes from their session manifest,
+CSV logs without one are summarized once through the log_reader index, binary logs
+(binary_storage.py) only from their logger events.  The catalog is saved to
+data/.catalog.json so a restart only rescans files that changed.
+"""
+
+import json
+import os
+import threading
+import tornado.ioloop
+from tornado.ioloop import PeriodicCallback
+
+LOG_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.csv.lz4', '.log.bin')
+SORT_KEYS = ['name', 'size', 'mtime', 'start', 'duration', 'samples', 'packetType', 'sampleRate', 'deviceId']
+FILTER_KEYS = ['deviceId', 'packetType', 'sampleRate', 'session']
+CATALOG_VERSION = 1
+
+class LogCatalog:
+    def __init__(self, directory='data', reader=None):
+        '''Create catalog of directory, reader is the log_reader.LogReader used to summarize files
+           without a manifest
+        '''
+        self.directory = directory
+        self.reader = reader
+        self.path = os.path.join(directory, '.catalog.json')
+        self.entries = {}
+        self.manifests = {}         # manifest name -> (mtime, { segment name : metadata })
+        self.version = 0
+        self.saved = 0
+        self.sorted = {}            # (sort key, version) -> names in ascending order
+        self.lock = threading.Lock()
+        self.scanning = False
+        self.callback = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if saved.get('version') == CATALOG_VERSION:
+            # files open in the previous run were finalized or abandoned, the rescan settles which
+            self.entries = { e['name'] : dict(e, open=False) for e in saved['files'] }
+
+    def save(self):
+        '''Atomically replaces data/.catalog.json if the catalog changed since it was last saved
+        '''
+        with self.lock:
+            if self.saved == self.version:
+                return
+            version = self.version
+            files = list(self.entries.values())
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({ 'version' : CATALOG_VERSION, 'files' : files }, f)
+        os.replace(tmp, self.path)
+        self.saved = version
+
+    def start(self, interval=30000):
+        '''Rescans now and every interval milliseconds on a worker thread of the current IOLoop
+        '''
+        self.schedule_rescan()
+        self.callback = PeriodicCallback(self.schedule_rescan, interval)
+        self.callback.start()
+
+    def stop(self):
+        if self.callback is not None:
+            self.callback.stop()
+
+    def schedule_rescan(self):
+        if self.scanning:
+            return
+        self.scanning = True
+        future = tornado.ioloop.IOLoop.current().run_in_executor(None, self.rescan)
+        future.add_done_callback(self.rescan_done)
+
+    def rescan_done(self, future):
+        self.scanning = False
+        if future.exception() is not None:
+            print('log catalog rescan failed: ' + str(future.exception()))
+
+    def put(self, name, entry):
+        '''Replaces the entry of name, caller holds the lock
+        '''
+        self.entries[name] = entry
+        self.version += 1
+
+    def on_log_event(self, event, name, info):
+        '''Logger callback, event is open when a segment is created, close when it is finalized
+           and discard when an empty segment is removed.  info holds the segment metadata
+        '''
+        with self.lock:
+            if event == 'discard':
+                if self.entries.pop(name, None) is not None:
+                    self.version += 1
+                return
+            entry = self.entries.get(name, {})
+            entry = dict(entry, name=name, open=(event == 'open'), packetType=info.get('packetType'),
+                         sampleRate=info.get('sampleRate'), deviceId=info.get('deviceId'), session=info.get('session'),
+                         start=info.get('start'), samples=info.get('samples', 0), duration=duration(info))
+            if event == 'close':
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return
+                entry['size'] = stat.st_size
+                entry['mtime'] = stat.st_mtime
+            else:
+                entry.setdefault('size', 0)
+                entry.setdefault('mtime', info.get('start'))
+            self.put(name, entry)
+
+    def rescan(self):
+        '''Brings the catalog in line with the directory.  Unchanged files cost one stat each
+        '''
+        seen = set()
+        changed = []
+        with os.scandir(self.directory) as it:
+            for f in it:
+                if not f.name.endswith(LOG_EXTENSIONS) or not f.is_file():
+                    continue
+                seen.add(f.name)
+                stat = f.stat()
+                entry = self.entries.get(f.name)
+                if entry is None or entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime:
+                    changed.append((f.name, stat))
+        for name, stat in changed:
+            entry = self.describe(name, stat)
+            with self.lock:
+                current = self.entries.get(name)
+                if current is not None and current.get('open'):
+                    continue        # the logger owns entries of segments it is writing
+                self.put(name, entry)
+        with self.lock:
+            for name in [n for n, e in self.entries.items() if n not in seen and not e.get('open')]:
+                del self.entries[name]
+                self.version += 1
+        self.save()
+
+    def describe(self, name, stat):
+        '''Metadata of a file found by a rescan, from its session manifest if it has one
+        '''
+        entry = { 'name' : name, 'size' : stat.st_size, 'mtime' : stat.st_mtime, 'open' : False, 'start' : None, 'duration' : None,
+                  'samples' : None, 'packetType' : None, 'sampleRate' : None, 'deviceId' : None, 'session' : None }
+        segment = self.manifest_segment(name)
+        if segment is not None:
+            entry.update((k, segment.get(k)) for k in ['start', 'samples', 'packetType', 'sampleRate', 'deviceId', 'session'])
+            entry['duration'] = duration(segment)
+        elif self.reader is not None and not name.endswith('.log.bin'):
+            try:
+                idx = self.reader.index(name)
+            except (IOError, OSError, ValueError, EOFError):
+                return entry
+            entry['samples'] = idx['rows']
+            if idx['blocks'] and idx['timeColumn'] is not None:
+                entry['duration'] = idx['blocks'][-1][3] - idx['blocks'][0][2]
+        return entry
+
+    def manifest_segment(self, name):
+        '''Segment metadata of name from data/<session>.manifest.json, None for files written without one
+        '''
+        session = name.rsplit('_', 1)[0]
+        manifest = session + '.manifest.json'
+        path = os.path.join(self.directory, manifest)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self.manifests.get(manifest)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(path) as f:
+                    m = json.load(f)
+            except (IOError, OSError, ValueError):
+                return None
+            common = { 'packetType' : m.get('packetType'), 'sampleRate' : m.get('sampleRate'), 'session' : m.get('session') }
+            cached = (mtime, { s['name'] : dict(common, **s) for s in m.get('segments', []) })
+            self.manifests[manifest] = cached
+        return cached[1].get(name)
+
+    def order(self, sort):
+        '''Names sorted ascending by sort, cached until the catalog changes.  Missing values sort last
+        '''
+        key = (sort, self.version)
+        names = self.sorted.get(key)
+        if names is None:
+            entries = self.entries
+            if sort == 'name':
+                names = sorted(entries)
+            else:
+                names = sorted(entries, key=lambda n: sort_value(entries[n].get(sort)) + (n,))
+            self.sorted = { key : names }
+        return names
+
+    def list(self, offset=0, limit=None, sort='mtime', descending=True, filters=None, match=None, include_open=False):
+        '''Page of catalog entries
+            :param limit:
+                most entries returned, None for all
+            :param filters:
+                dict of FILTER_KEYS to required value
+            :param match:
+                substring the file name must contain
+            :param include_open:
+                also list segments still being written, flagged open
+            :returns:
+                dict with total number of matching files, offset and the files of the page
+        '''
+        if sort not in SORT_KEYS:
+            sort = 'mtime'
+        filters = dict((k, v) for k, v in (filters or {}).items() if k in FILTER_KEYS)
+        with self.lock:
+            names = self.order(sort)
+            if descending:
+                names = names[::-1]
+            if filters or match or not include_open:
+                entries = self.entries
+                names = [n for n in names if (include_open or not entries[n].get('open')) and (not match or match in n) and
+                         all(entries[n].get(k) == v for k, v in filters.items())]
+            page = [dict(self.entries[n]) for n in names[offset:None if limit is None else offset + limit]]
+        return { 'total' : len(names), 'offset' : offset, 'files' : page }
+
+def sort_value(value):
+    '''Sort key of an entry value: missing values last, and numbers and strings apart so a packetType of 0
+       (left by a disconnect) never compares with 'S1'
+    '''
+    return (value is None, isinstance(value, str), value if value is not None else 0)
+
+def duration(info):
+    '''Seconds covered by a segment, from sample times when the packet has them
+    '''
+    if info.get('firstTime') is not None and info.get('lastTime') is not None:
+        return info['lastTime'] - info['firstTime']
+    if info.get('start') is not None and info.get('end') is not None:
+        return info['end'] - info['start']
+    return None
@@ -0,0 +1,59 @@
+"""
+Per device command executor for blocking imu380 driver calls
+Created on 2026-10-19
+"""
+
+"""
+DeviceCommandExecutor   - runs driver commands (get/read/set/write fields, restore_odr, set_quiet,
+                          logging) for one device on a dedicated thread, one at a time, so the
+                          tornado IOLoop never blocks on the serial port
+run                     - coroutine, awaits a command with a timeout
+
+A command that times out keeps running on the device thread, later commands wait behind it.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+class CommandTimeout(Exception):
+    pass
+
+class DeviceCommandExecutor:
+    def __init__(self, imu, timeout=10.0):
+        '''Create executor for imu, timeout is the default number of seconds run waits for a command
+        '''
+        self.imu = imu
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        '''Queues fn(*args) behind earlier commands for this device
+            :returns:
+                concurrent.futures.Future
+        '''
+        with self.lock:
+            self.pending += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self.finished)
+        return future
+
+    def finished(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, timeout=None):
+        '''Runs fn(*args) on the device thread and returns its result
+            :raises CommandTimeout:
+                if the command did not finish within timeout seconds
+        '''
+        future = asyncio.wrap_future(self.submit(fn, *args))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise CommandTimeout('{0} timed out after {1:.1f}s'.format(getattr(fn, '__name__', 'command'), timeout or self.timeout))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,152 @@
+"""
+Streaming compression for log sinks
+Created on 2026-10-19
+"""
+
+"""
+open_writer     - returns a plain text file or a CompressedWriter for the codec
+CompressedWriter- text file stand in that compresses fixed size blocks on a worker thread
+available_codecs- codecs usable in this environment, gzip is always available, zstd and lz4 need
+                  the zstandard and lz4 packages
+"""
+
+import os
+import queue
+import threading
+import zlib
+
+EXTENSIONS = { 'gzip' : '.gz', 'zstd' : '.zst', 'lz4' : '.lz4' }
+DEFAULT_LEVELS = { 'gzip' : 6, 'zstd' : 3, 'lz4' : 0 }
+BLOCK_SIZE = 256 * 1024
+
+def available_codecs():
+    codecs = ['gzip']
+    try:
+        import zstandard
+        codecs.append('zstd')
+    except ImportError:
+        pass
+    try:
+        import lz4.frame
+        codecs.append('lz4')
+    except ImportError:
+        pass
+    return codecs
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31 writes a gzip header and trailer so output is readable by gzip.open
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+class ZstdCompressor:
+    def __init__(self, level):
+        import zstandard
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+class Lz4Compressor:
+    def __init__(self, level):
+        import lz4.frame
+        self.compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self.header = self.compressor.begin()
+
+    def compress(self, data):
+        out = self.header + self.compressor.compress(data)
+        self.header = b''
+        return out
+
+    def flush(self):
+        return self.header + self.compressor.flush()
+
+COMPRESSORS = { 'gzip' : GzipCompressor, 'zstd' : ZstdCompressor, 'lz4' : Lz4Compressor }
+
+class CompressedWriter:
+    def __init__(self, path, codec='gzip', level=None, block_size=BLOCK_SIZE, max_pending=8):
+        '''Create compressed file.  Written text is collected into blocks of block_size bytes which are
+           compressed and written by a worker thread, so the caller only pays for the string join
+        '''
+        if codec not in COMPRESSORS:
+            raise ValueError('unknown codec ' + str(codec))
+        self.compressor = COMPRESSORS[codec](DEFAULT_LEVELS[codec] if level is None else level)
+        self.file = open(path, 'wb')
+        self.block_size = block_size
+        self.rows = []
+        self.buffered = 0
+        self.raw_bytes = 0
+        self.queue = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, text):
+        self.rows.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.block_size:
+            self.hand_off()
+
+    def hand_off(self):
+        if self.rows:
+            block = ''.join(self.rows).encode()
+            self.raw_bytes += len(block)
+            self.queue.put(block)
+            self.rows = []
+            self.buffered = 0
+
+    def run(self):
+        while True:
+            block = self.queue.get()
+            try:
+                if block is None:
+                    self.file.write(self.compressor.flush())
+                elif block:
+                    self.file.write(self.compressor.compress(block))
+                self.file.flush()
+            except Exception as err:
+                self.error = err
+            self.queue.task_done()
+            if block is None:
+                return
+
+    def flush(self):
+        '''Hands the partial block to the worker and waits until everything queued is written.
+           The compressed stream stays open, it is only complete after close
+        '''
+        self.hand_off()
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        '''Writes the end of the compressed stream, syncs and closes the file
+        '''
+        if self.file.closed:
+            return
+        self.hand_off()
+        self.queue.put(None)
+        self.thread.join()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+def open_writer(path, codec=None, level=None, block_size=BLOCK_SIZE):
+    '''Opens a log file for writing text, compressed when codec is set
+    '''
+    if not codec:
+        return open(path, 'w')
+    return CompressedWriter(path, codec, level, block_size)
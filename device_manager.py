@@ -5,7 +5,11 @@ Created 04/26/2018
 """
 
 """
-
+DeviceManager   - keeps every connected imu380 device, each collecting packets on its own thread
+start           - scans serial ports every 2 seconds, autobauds new ports and drops disconnected devices
+add_simulated   - adds simulated devices (simulator.py) with distinct serial numbers
+add_replay      - adds a device replaying a raw capture in a loop
+listeners       - callables(event, imu) told when a device is added or removed
 """
 
 import serial
@@ -22,18 +26,85 @@ class DeviceManager:
         '''Initialize and then start ports search and autobaud process
         '''
         self.imus = []
+        self.listeners = []
+        self.lock = threading.Lock()
     
     def start(self):
+        '''Discovery loop, run this in a thread
+        '''
         while 1:
-            ports = self.find_ports()
+            self.prune()
+            with self.lock:
+                in_use = set(getattr(imu, 'port', None) for imu in self.imus)
+            ports = [port for port in self.find_ports(in_use) if port not in in_use]
             for port in ports:
                 print(port)
                 imu = imu380.GrabIMU380Data(ws=True)
                 imu.port = port
-                imu.autobaud([port])
-                print('no success')            
+                if imu.autobaud([port]):
+                    if not imu.stream_mode and imu.odr_setting:
+                        imu.restore_odr()
+                    self.run(imu, imu.collect)
+                else:
+                    print('no success')
+            time.sleep(2)
+
+    def add(self, imu):
+        with self.lock:
+            self.imus.append(imu)
+        self.notify('added', imu)
+
+    def remove(self, imu):
+        with self.lock:
+            if imu not in self.imus:
+                return
+            self.imus.remove(imu)
+        self.notify('removed', imu)
+
+    def notify(self, event, imu):
+        for listener in self.listeners:
+            try:
+                listener(event, imu)
+            except Exception as err:
+                print('device listener failed: ' + str(err))
+
+    def prune(self):
+        '''Removes serial devices whose collection loop ended
+        '''
+        with self.lock:
+            gone = [imu for imu in self.imus if getattr(imu, 'port', None) and not imu.connected]
+        for imu in gone:
+            self.remove(imu)
+
+    def run(self, imu, target, *args):
+        '''Starts target(*args) on a thread for imu and adds imu once it is connected
+        '''
+        threading.Thread(target=target, args=args, daemon=True).start()
+        while not imu.connected:
+            time.sleep(0.05)
+        self.add(imu)
+        return imu
+
+    def add_simulated(self, count=1, packet_type='S1', odr_setting=1):
+        for i in range(count):
+            imu = imu380.GrabIMU380Data(ws=True)
+            self.run(imu, imu.simulate, packet_type, odr_setting, 1808400000 + len(self.imus))
+
+    def add_replay(self, path):
+        imu = imu380.GrabIMU380Data(ws=True)
+        def replay_forever():
+            while True:
+                imu.replay(path, True)
+        return self.run(imu, replay_forever)
+
+    def get(self, device_id):
+        with self.lock:
+            for imu in self.imus:
+                if imu.device_id == device_id:
+                    return imu
+        return None
 
-    def find_ports(self):
+    def find_ports(self, skip=()):
         ''' Lists serial port names. Code from
             https://stackoverflow.com/questions/12090503/listing-available-com-ports-with-python
             Successfully tested on Windows 8.1 x64, Windows 10 x64, Mac OS X 10.9.x / 10.10.x / 10.11.x and Ubuntu 14.04 / 14.10 / 15.04 / 15.10 with both Python 2 and Python 3.
@@ -55,6 +126,8 @@ class DeviceManager:
 
         result = []
         for port in ports:
+            if port in skip:
+                continue
             try:
                 print('Trying: ' + port)
                 s = serial.Serial(port)
@@ -0,0 +1,132 @@
+"""
+Websocket sample encodings negotiated at connect time with ?encoding=json|packed|msgpack
+Created on 2026-10-19
+"""
+
+"""
+JsonEncoding    - default, { messageType : event, data : { newOutput : {...} } } text frames, batches
+                  of every sample since the last tick are sent as
+                  { messageType : event, data : { newOutputBatch : { seq : [], samples : [], gaps : [[after, missed]] } } }
+PackedEncoding  - binary frames of little endian values, U1 schema id then one value per field.
+                  time is F8, counters/ITOW/BIT are U4, everything else F4.  A JSON text message
+                  { messageType : schema, data : { schemaId, fields, format } } describing the
+                  layout is sent once per connection before the first frame using it.  At most
+                  MAX_SCHEMAS field sets have an id, the least recently used id is given to a new
+                  field set, so a consumer keeps the schema message last sent per id and sends again
+                  when it changes
+                  Batches are U1 0, U2 sample count, U4 samples missed before the first one, then
+                  per sample U4 sequence number followed by its packed frame.  Anything but a dict of
+                  fields (an unknown packet type decodes to None, F1 replies to an int) is skipped
+MsgpackEncoding - binary frames holding the JSON message structure packed with msgpack,
+                  only offered when the msgpack package is installed
+get_encoding    - encoding instance by name, falls back to json
+"""
+
+import collections
+import json
+import struct
+
+INT_FIELDS = ['BITstatus', 'GPSITOW', 'counter', 'timeITOW', 'iTOW']
+BATCH_HEADER = struct.Struct('<BHI')
+SEQ = struct.Struct('<I')
+MAX_SCHEMAS = 255       # schema ids 1 to 255 fit the U1, 0 starts a batch
+
+def batch_message(samples, missed):
+    '''JSON structure of a batch of (sequence number, data) samples
+    '''
+    gaps = [[samples[0][0] - missed - 1, missed]] if missed else []
+    return { 'messageType' : 'event', 'data' : { 'newOutputBatch' : { 'seq' : [seq for seq, d in samples], 
+                                                                     'samples' : [d for seq, d in samples], 'gaps' : gaps }}}
+
+class JsonEncoding:
+    name = 'json'
+    binary = False
+
+    def encode(self, data):
+        return json.dumps({ 'messageType' : 'event',  'data' : { 'newOutput' : data }}).encode()
+
+    def encode_batch(self, samples, missed):
+        return json.dumps(batch_message(samples, missed)).encode()
+
+    def schema(self, data):
+        return None
+
+class PackedEncoding:
+    name = 'packed'
+    binary = True
+
+    def __init__(self):
+        self.schemas = collections.OrderedDict()    # field tuple -> layout, least recently used first
+
+    def layout(self, data):
+        '''Returns (schema id, struct, schema message) for the field set of data, created on first use
+           with a new id or, once MAX_SCHEMAS are in use, the id of the least recently used field set
+        '''
+        fields = tuple(data.keys())
+        layout = self.schemas.get(fields)
+        if layout is not None:
+            self.schemas.move_to_end(fields)
+        else:
+            if len(self.schemas) < MAX_SCHEMAS:
+                schema_id = len(self.schemas) + 1
+            else:
+                schema_id = self.schemas.popitem(last=False)[1][0]
+            fmt = '<B' + ''.join('d' if k == 'time' else 'I' if k in INT_FIELDS else 'f' for k in fields)
+            message = json.dumps({ 'messageType' : 'schema', 'data' : { 'schemaId' : schema_id, 'fields' : list(fields), 'format' : fmt }}).encode()
+            layout = (schema_id, struct.Struct(fmt), message)
+            self.schemas[fields] = layout
+        return layout
+
+    def encode(self, data):
+        schema_id, packer, message = self.layout(data)
+        return packer.pack(schema_id, *data.values())
+
+    def encode_batch(self, samples, missed):
+        samples = [(seq, data) for seq, data in samples if isinstance(data, dict)]
+        frames = [BATCH_HEADER.pack(0, len(samples), missed)]
+        for seq, data in samples:
+            frames.append(SEQ.pack(seq))
+            frames.append(self.encode(data))
+        return b''.join(frames)
+
+    def schema(self, data):
+        '''Returns (schema id, schema message) a client must have received before frames of data, None
+           when data is not a decoded sample
+        '''
+        if not isinstance(data, dict):
+            return None
+        schema_id, packer, message = self.layout(data)
+        return schema_id, message
+
+class MsgpackEncoding:
+    name = 'msgpack'
+    binary = True
+
+    def __init__(self):
+        import msgpack
+        self.packb = msgpack.packb
+
+    def encode(self, data):
+        return self.packb({ 'messageType' : 'event',  'data' : { 'newOutput' : data }})
+
+    def encode_batch(self, samples, missed):
+        return self.packb(batch_message(samples, missed))
+
+    def schema(self, data):
+        return None
+
+ENCODINGS = { 'json' : JsonEncoding, 'packed' : PackedEncoding, 'msgpack' : MsgpackEncoding }
+instances = {}
+
+def get_encoding(name):
+    '''Shared encoding instance for name, json if name is unknown or its package is missing
+    '''
+    if name not in instances:
+        try:
+            instances[name] = ENCODINGS[name]()
+        except (KeyError, ImportError):
+            return get_encoding('json')
+    return instances[name]
+
+def available_encodings():
+    return [name for name in ENCODINGS if get_encoding(name).name == name]
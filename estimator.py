@@ -0,0 +1,146 @@
+"""
+Attitude estimator for S0/S1 streams, a complementary filter on gyro attitude from quat.Quat
+Created on 2026-10-19
+"""
+
+"""
+Estimator       - pipeline stage (imu.add_stage) adding rollAngle, pitchAngle and yawAngle in degrees
+                  to every S0/S1 sample
+estimate        - the same filter over whole columns of a log, see log_reader.read_columns, a scalar
+                  loop costing about as much per sample as the stage
+reference       - roll and pitch from the accelerometers, tilt compensated magnetic yaw from the
+                  magnetometers (reference_arrays for numpy arrays)
+
+Gyro rates are integrated by quat.Quat from the attitude given by the reference angles of the first
+sample.  After every gyro step the attitude is pulled toward the reference angles and the result is
+fed back into the quaternion
+
+    angle[n] = gyro[n] + (1 - a) (reference[n] - gyro[n]),   a = tau / (tau + dt)
+
+gyro[n] being the angles of the corrected attitude of the previous sample advanced by the gyro rates.
+This is the usual complementary filter, angle = a (angle + gyro increment) + (1 - a) reference, so a
+gyro bias b leaves a bounded error of about b tau instead of an attitude drifting away.  Roll and
+pitch are not corrected while |accel| is more than accel_gate g from 1 g, and yaw is only corrected
+when magnetometers are present (S0).  A sample whose time goes backwards or jumps more than max_gap
+seconds (ODR restored, device reconnected) starts the filter again.
+
+The recursion is closed through the quaternion, so estimate cannot solve it in whole array steps.
+It computes the reference angles and accel gate of every sample with numpy and then runs the
+stage's update on CHUNK samples at a time converted to plain floats.  That matches the stage exactly
+but saves only the per sample dict handling, about 1.2x over the stage.
+"""
+
+import math
+import quat
+
+G = 9.80665
+FIELDS = ['rollAngle', 'pitchAngle', 'yawAngle']
+CHUNK = 4096        # samples estimate converts to floats at a time
+
+def wrap(angle):
+    '''Angle in radians wrapped to [-pi, pi)
+    '''
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+def reference(accel, mag=None):
+    '''Roll and pitch from accelerometers in m/s^2 (specific force, z reads -1 g when level), tilt
+       compensated yaw from magnetometers if given, else 0
+        :returns:
+            roll, pitch, yaw in radians
+    '''
+    fx, fy, fz = accel
+    roll = math.atan2(-fy, -fz)
+    pitch = math.atan2(fx, math.sqrt(fy * fy + fz * fz))
+    if mag is None:
+        return roll, pitch, 0.0
+    mx, my, mz = mag
+    sr, cr = math.sin(roll), math.cos(roll)
+    sp, cp = math.sin(pitch), math.cos(pitch)
+    return roll, pitch, math.atan2(-(my * cr - mz * sr), mx * cp + (my * sr + mz * cr) * sp)
+
+def reference_arrays(accel, mag=None):
+    '''reference over arrays, returns an N x 3 array
+    '''
+    import numpy as np
+    fx, fy, fz = accel
+    roll = np.arctan2(-fy, -fz)
+    pitch = np.arctan2(fx, np.sqrt(fy * fy + fz * fz))
+    if mag is None:
+        return np.stack([roll, pitch, np.zeros_like(roll)], axis=1)
+    mx, my, mz = mag
+    sr, cr = np.sin(roll), np.cos(roll)
+    sp, cp = np.sin(pitch), np.cos(pitch)
+    return np.stack([roll, pitch, np.arctan2(-(my * cr - mz * sr), mx * cp + (my * sr + mz * cr) * sp)], axis=1)
+
+class Estimator:
+    name = 'estimator'
+
+    def __init__(self, tau=1.0, yaw_tau=5.0, accel_gate=0.1, max_gap=1.0):
+        '''tau and yaw_tau are the time constants in seconds of the roll/pitch and yaw corrections
+        '''
+        self.tau = tau
+        self.yaw_tau = yaw_tau
+        self.accel_gate = accel_gate
+        self.max_gap = max_gap
+        self.quat = None
+        self.time = None
+
+    def reset(self):
+        self.quat = None
+
+    def update(self, t, rates, ref, level, yaw):
+        '''One filter step: rates in rad/s, ref the reference angles in radians, level true when roll and
+           pitch may be corrected, yaw when yaw may be
+            :returns:
+                roll, pitch, yaw in radians
+        '''
+        dt = t - self.time if self.quat is not None else 0.0
+        self.time = t
+        if self.quat is None or dt <= 0.0 or dt > self.max_gap:
+            self.quat = quat.Quat()
+            self.quat.q = quat.from_euler(list(ref))
+            return self.quat.to_euler()
+        self.quat.update_quat({ 'wx' : rates[0], 'wy' : rates[1], 'wz' : rates[2] }, dt)
+        angles = self.quat.to_euler()
+        if not (level or yaw):
+            return angles
+        gain = dt / (self.tau + dt) if level else 0.0
+        gains = [gain, gain, dt / (self.yaw_tau + dt) if yaw else 0.0]
+        angles = [g + k * wrap(r - g) for g, r, k in zip(angles, ref, gains)]
+        # feed the correction back, the next gyro step starts from the corrected attitude
+        self.quat.q = quat.from_euler(angles)
+        return angles
+
+    def __call__(self, data):
+        '''Adds rollAngle, pitchAngle, yawAngle (degrees) to a sample holding S0/S1 rates and accels
+        '''
+        if 'xRate' not in data or 'xAccel' not in data:
+            return
+        accel = [data['xAccel'], data['yAccel'], data['zAccel']]
+        mag = [data['xMag'], data['yMag'], data['zMag']] if 'xMag' in data else None
+        level = abs(math.sqrt(accel[0] ** 2 + accel[1] ** 2 + accel[2] ** 2) / G - 1.0) <= self.accel_gate
+        angles = self.update(data['time'], [math.radians(data['xRate']), math.radians(data['yRate']), math.radians(data['zRate'])],
+                             reference(accel, mag), level, mag is not None)
+        for name, angle in zip(FIELDS, angles):
+            data[name] = math.degrees(wrap(angle))
+
+def estimate(columns, tau=1.0, yaw_tau=5.0, accel_gate=0.1, max_gap=1.0):
+    '''Runs the Estimator filter over whole columns (time, x/y/zAccel, x/y/zRate, optionally x/y/zMag)
+        :returns:
+            dict of rollAngle, pitchAngle, yawAngle arrays in degrees, equal to the stage's output
+    '''
+    import numpy as np
+    t = np.asarray(columns['time'], dtype=float)
+    accel = [np.asarray(columns[k], dtype=float) for k in ['xAccel', 'yAccel', 'zAccel']]
+    rates = np.radians(np.stack([columns[k] for k in ['xRate', 'yRate', 'zRate']], axis=1))
+    mag = [np.asarray(columns[k], dtype=float) for k in ['xMag', 'yMag', 'zMag']] if 'xMag' in columns else None
+    ref = reference_arrays(accel, mag)
+    level = np.abs(np.sqrt(accel[0] ** 2 + accel[1] ** 2 + accel[2] ** 2) / G - 1.0) <= accel_gate
+    stage = Estimator(tau, yaw_tau, accel_gate, max_gap)
+    yaw = mag is not None
+    angles = np.empty((len(t), 3))
+    for start in range(0, len(t), CHUNK):
+        end = start + CHUNK
+        angles[start:end] = [stage.update(*sample, yaw) for sample in zip(t[start:end].tolist(), rates[start:end].tolist(),
+                                                                             ref[start:end].tolist(), level[start:end].tolist())]
+    return dict(zip(FIELDS, np.degrees((angles + np.pi) % (2 * np.pi) - np.pi).T))
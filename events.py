@@ -0,0 +1,183 @@
+"""
+Event detection on decoded samples, threshold predicates with pre-trigger capture
+Created on 2026-10-19
+"""
+
+"""
+Threshold       - predicate on one field, or the vector magnitude of several, above and/or below a limit
+load            - detector configuration file, JSON of pre, post, maxDuration and predicates
+predicates      - Threshold predicates of a loaded configuration
+EventDetector   - pipeline stage (imu.add_stage) evaluating the predicates on every sample, keeping the
+                  last pre seconds of samples and saving pre + post seconds around each event
+
+{ "pre" : 2.0, "post" : 1.0, "maxDuration" : 60.0,
+  "predicates" : [ { "name" : "shock", "fields" : ["xAccel", "yAccel", "zAccel"], "above" : 29.4 },
+                   { "name" : "spin", "fields" : ["zRate"], "above" : 200, "below" : -200 } ] }
+
+On the first sample that trips a predicate the listeners get a triggered event on the reader thread,
+with latencyUs, the time from reading the frame (imu.frame_time) to the trigger.  Triggers within the
+post window join the event, up to maxDuration seconds after the first trigger: an event still
+triggering then is closed with truncated set and the detector rearms, so a predicate that stays true
+is saved in maxDuration pieces instead of capturing forever.  When the window closes the samples are handed to a writer thread,
+written to data/event-<date>-<serial number>-<name>.csv in the CSV log format and the listeners get
+the saved event with the file name, so the reader never waits on the disk.
+"""
+
+import collections
+import datetime
+import json
+import math
+import os
+import queue
+import threading
+import time
+import storage
+from encoding import INT_FIELDS
+
+class Threshold:
+    def __init__(self, name, fields, above=None, below=None):
+        '''Trips when the value, fields[0] or the magnitude of all fields, is over above or under below
+        '''
+        self.name = name
+        self.fields = fields
+        self.above = above
+        self.below = below
+
+    def __call__(self, data):
+        '''The value if the predicate trips, else None
+        '''
+        fields = self.fields
+        if fields[0] not in data:
+            return None
+        if len(fields) == 1:
+            value = data[fields[0]]
+        else:
+            value = math.sqrt(sum(data[f] * data[f] for f in fields))
+        if (self.above is not None and value > self.above) or (self.below is not None and value < self.below):
+            return value
+        return None
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def predicates(config):
+    return [Threshold(p['name'], p['fields'], p.get('above'), p.get('below')) for p in config.get('predicates', [])]
+
+class EventDetector:
+    name = 'events'
+
+    def __init__(self, imu, predicates, pre=1.0, post=1.0, directory='data', max_duration=60.0):
+        '''pre and post are the seconds saved before the first and after the last trigger of an event,
+           max_duration the most seconds after the first trigger an event is captured for
+        '''
+        self.imu = imu
+        self.predicates = predicates
+        self.pre = pre
+        self.post = post
+        self.max_duration = max_duration
+        self.directory = directory
+        self.listeners = []
+        self.ring = collections.deque()     # samples of the last pre seconds
+        self.event = None                   # the event being captured
+        self.samples = None                 # its samples
+        self.count = 0
+        self.latency = [0, 0.0, 0.0]        # triggers, sum and max of latencyUs
+        self.writes = queue.Queue()
+        self.writer = None
+
+    def __call__(self, data):
+        t = data['time']
+        ring = self.ring
+        if ring and t < ring[-1]['time']:
+            # time restarted, the samples before are a different time base
+            ring.clear()
+            if self.event is not None:
+                self.finish()
+        ring.append(data)
+        while t - ring[0]['time'] > self.pre:
+            ring.popleft()
+        if self.event is not None:
+            self.samples.append(data)
+        for predicate in self.predicates:
+            value = predicate(data)
+            if value is not None:
+                self.trigger(predicate, value, t)
+        if self.event is not None and t >= self.event['end']:
+            self.finish()
+
+    def trigger(self, predicate, value, t):
+        event = self.event
+        if event is not None:
+            event['triggers'] += 1
+            event['end'] = min(t + self.post, event['time'] + self.max_duration)
+            event['truncated'] = t + self.post > event['end']
+            if predicate.name not in event['names']:
+                event['names'].append(predicate.name)
+            if abs(value) > abs(event['peak']):
+                event['peak'] = value
+            return
+        latency = 1e6 * (time.perf_counter() - self.imu.frame_time) if self.imu.frame_time else None
+        self.count += 1
+        if latency is not None:
+            self.latency[0] += 1
+            self.latency[1] += latency
+            self.latency[2] = max(self.latency[2], latency)
+        self.event = { 'id' : self.count, 'state' : 'triggered', 'deviceId' : self.imu.device_id, 'name' : predicate.name,
+                       'names' : [predicate.name], 'value' : value, 'peak' : value, 'time' : t, 'hostTime' : time.time(),
+                       'latencyUs' : latency, 'triggers' : 1, 'end' : t + min(self.post, self.max_duration), 'truncated' : False }
+        self.samples = list(self.ring)
+        self.notify(dict(self.event, names=list(self.event['names'])))
+
+    def finish(self):
+        '''Hands the captured event to the writer thread
+        '''
+        event = dict(self.event, state='saved')
+        samples = self.samples
+        self.event = None
+        self.samples = None
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.run, daemon=True)
+            self.writer.start()
+        self.writes.put((event, samples))
+
+    def run(self):
+        '''Writer thread
+        '''
+        while True:
+            event, samples = self.writes.get()
+            try:
+                event.update(self.write(event, samples))
+            except (IOError, OSError) as err:
+                event.update(state='failed', error=str(err))
+            self.notify(event)
+
+    def write(self, event, samples):
+        '''Writes samples as CSV, .part until complete, and tells storage.log_listeners about the file
+        '''
+        stamp = datetime.datetime.fromtimestamp(event['hostTime']).strftime('%Y_%m_%d_%H_%M_%S_%f')
+        name = 'event-' + stamp + '-' + str(event['deviceId']).split(' ')[0] + '-' + event['name'] + '.csv'
+        path = os.path.join(self.directory, name)
+        fields = list(samples[0])
+        with open(path + '.part', 'w') as f:
+            f.write(','.join(fields) + '\n')
+            for data in samples:
+                f.write(','.join('{0:d}'.format(data[k]) if k in INT_FIELDS else '{0:3.5f}'.format(data[k]) for k in fields) + '\n')
+        os.replace(path + '.part', path)
+        info = { 'deviceId' : event['deviceId'], 'packetType' : self.imu.packet_type, 'session' : name[:-4], 'start' : event['hostTime'],
+                 'samples' : len(samples), 'firstTime' : samples[0]['time'], 'lastTime' : samples[-1]['time'] }
+        storage.notify('close', name, info)
+        return { 'file' : name, 'samples' : len(samples), 'start' : samples[0]['time'], 'stop' : samples[-1]['time'] }
+
+    def notify(self, event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as err:
+                print('event listener failed: ' + str(err))
+
+    def status(self):
+        '''Events detected and trigger latency from frame arrival in microseconds
+        '''
+        n, total, peak = self.latency
+        return { 'events' : self.count, 'capturing' : self.event is not None, 'meanLatencyUs' : total / n if n else None, 'maxLatencyUs' : peak if n else None }
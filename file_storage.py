@@ -5,26 +5,67 @@ import time
 import uuid
 import datetime
 import json
-import requests
 import threading
+import upload
+import compress
+import storage
 
 # need to find something python3 compatible  
 # import urllib2
 
-from azure.storage.blob import AppendBlobService
-from azure.storage.blob import ContentSettings
+# segments are finalized and a new one opened once either limit is reached, 0 disables the limit
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_MAX_SECONDS = 3600
+
+uploader = None     # shared cloud upload queue, created on first use
+
+def get_uploader():
+    '''Returns the shared Azure upload queue, resuming uploads pending from a previous run
+    '''
+    global uploader
+    if uploader is None:
+        uploader = upload.UploadQueue(upload.AzureAppendBlobBackend(), on_complete=record_to_ansplatform)
+        uploader.start()
+    return uploader
+
+def record_to_ansplatform(path, blob, record):
+    '''Registers an uploaded segment with ansplatform, record is saved with the upload so this also
+       runs for uploads resumed after a restart
+    '''
+    if not record or not record.get('access_token'):
+        return
+    import requests
+    data = dict(record['data'], url=blob)
+    url = "https://ans-platform.azurewebsites.net/api/datafiles/replaceOrCreate"
+    data_json = json.dumps(data)
+    headers = {'Content-type': 'application/json', 'Authorization' : record['access_token'] }
+    response = requests.post(url, data=data_json, headers=headers)
+    response = response.json()
+    print(response)
 
 class LogIMU380Data:
     
-    def __init__(self, imu, user):
-        '''Initialize and create a CSV file
+    def __init__(self, imu, user, max_bytes=SEGMENT_MAX_BYTES, max_seconds=SEGMENT_MAX_SECONDS, compression=None, level=None, block_size=compress.BLOCK_SIZE, upload=True):
+        '''Initialize and create the first CSV segment of a logging session.  Segments are written
+           as data/<session>_NNN.csv.part and renamed to .csv when finalized, each finalized segment
+           is recorded in data/<session>.manifest.json.  compression selects a codec from compress.py,
+           compressed segments are named .csv.gz/.csv.zst/.csv.lz4.  With upload set finalized segments
+           are queued for Azure, the uploader is only created when the first segment is finalized
         '''
-        self.name = 'data-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '.csv'
-        self.file = open('data/' + self.name, 'w')
+        # the serial number keeps sessions of devices started in the same second apart
+        self.session = 'data-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '-' + imu.device_id.split(" ")[0]
+        self.name = ''
+        self.file = None
+        self.lock = threading.Lock()
+        self.header = ''
         self.first_row = 0
         self.user = user
-        if self.user['fileName'] == '':
-            self.user['fileName'] = self.name
+        self.max_bytes = int(user.get('maxBytes', max_bytes))
+        self.max_seconds = float(user.get('maxSeconds', max_seconds))
+        self.compression = user.get('compression', compression)
+        self.level = user.get('compressionLevel', level)
+        self.block_size = block_size
+        self.upload = upload
         # decode converts out of byte array
         self.sn = imu.device_id.split(" ")[0]
         self.pn = imu.device_id.split(" ")[1]
@@ -34,18 +75,70 @@ class LogIMU380Data:
         self.imu_properties = imu.imu_properties
         odr_rates = { 0: 'Quiet', 1 : '100Hz', 2 : '50Hz', 4 : '25Hz'  }
         self.sample_rate = odr_rates[self.odr_setting]
+        self.manifest = { 'session' : self.session, 'deviceId' : self.device_id, 'packetType' : self.packet_type,
+                          'sampleRate' : self.sample_rate, 'compression' : self.compression, 'closed' : False, 'segments' : [] }
+        self.open_segment()
+        if self.user['fileName'] == '':
+            self.user['fileName'] = self.name
+
+    def open_segment(self):
+        '''Opens the next segment of the session as a .part file
+        '''
+        extension = '.csv' + compress.EXTENSIONS.get(self.compression, '')
+        self.segment = { 'name' : '{0}_{1:03d}{2}'.format(self.session, len(self.manifest['segments']), extension), 'deviceId' : self.device_id,
+                         'start' : None, 'end' : None, 'firstTime' : None, 'lastTime' : None, 'samples' : 0, 'bytes' : 0 }
+        self.name = self.segment['name']
+        self.file = compress.open_writer('data/' + self.name + '.part', self.compression, self.level, self.block_size)
+        self.opened = time.time()
+        storage.notify('open', self.name, self.segment_info())
+
+    def segment_info(self):
+        '''Metadata of the current segment for log listeners
+        '''
+        return dict(self.segment, session=self.session, packetType=self.packet_type, sampleRate=self.sample_rate, start=self.segment['start'] or self.opened)
+
+    def finalize_segment(self):
+        '''Flushes the current segment to disk, renames it to its final name and records it in the manifest.
+           Empty segments are discarded
+        '''
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        if self.segment['samples']:
+            self.segment['fileBytes'] = os.path.getsize('data/' + self.name + '.part')
+            os.replace('data/' + self.name + '.part', 'data/' + self.name)
+            self.manifest['segments'].append(self.segment)
+            if self.upload:
+                self.write_to_azure(self.segment['name'])
+            event = 'close'
+        else:
+            os.remove('data/' + self.name + '.part')
+            event = 'discard'
+        self.write_manifest()
+        storage.notify(event, self.name, self.segment_info())
+
+    def write_manifest(self):
+        '''Atomically replaces the session manifest
+        '''
+        path = 'data/' + self.session + '.manifest.json'
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(path + '.tmp', path)
 
     def log(self, data, odr_setting): 
-        '''Write row of CSV file based on data received.  Uses dictionary keys for column titles
+        '''Write row of CSV file based on data received.  Uses dictionary keys for column titles.
+           Rotates to a new segment when the size or duration limit is reached
         '''
         if not self.first_row:
             self.first_row = 1
             labels = ''.join('{0:s},'.format(key) for key in data)
             labels = labels[:-1]
-            header = labels + '\n'
+            self.header = labels + '\n'
         else:
             self.first_row += 1
-            header = ''
         
         str = ''
         for key in data:
@@ -55,40 +148,39 @@ class LogIMU380Data:
                 str += '{0:3.5f},'.format(data[key])
         str = str[:-1]
         str = str + '\n'
-        self.file.write(header+str)
-
-    def write_to_azure(self):
-        # check for internet 
-        # if not self.internet_on(): 
-        #    return False
-
-        # record file to cloud
-        self.append_blob_service = AppendBlobService(account_name='navview', account_key='+roYuNmQbtLvq2Tn227ELmb6s1hzavh0qVQwhLORkUpM0DN7gxFc4j+DF/rEla1EsTN2goHEA1J92moOM/lfxg==', protocol='http')
-        self.append_blob_service.create_blob(container_name='data', blob_name=self.name,  content_settings=ContentSettings(content_type='text/plain'))
-        f = open("data/" + self.name,"r")
-        self.append_blob_service.append_blob_from_text('data',self.name, f.read())
-
-        # TODO: check if success
-
-        # record record to ansplatform
-        self.record_to_ansplatform()
 
+        with self.lock:
+            if self.file is None:
+                return
+            now = time.time()
+            if self.segment['samples'] and ((self.max_bytes and self.segment['bytes'] + len(str) > self.max_bytes) or
+                                            (self.max_seconds and now - self.opened >= self.max_seconds)):
+                self.finalize_segment()
+                self.open_segment()
+            if not self.segment['samples']:
+                self.file.write(self.header)
+                self.segment['bytes'] += len(self.header)
+                self.segment['start'] = now
+                self.segment['firstTime'] = data.get('time')
+            self.file.write(str)
+            self.segment['bytes'] += len(str)
+            self.segment['samples'] += 1
+            self.segment['end'] = now
+            self.segment['lastTime'] = data.get('time')
 
-    def record_to_ansplatform(self):
-        data = { "pn" : self.pn, "sn": self.sn, "fileName" : self.user['fileName'],  "url" : self.name, "imuProperties" : json.dumps(self.imu_properties),
-                 "sampleRate" : self.sample_rate, "packetType" : self.packet_type, "userId" : self.user['id'] }
-        url = "https://ans-platform.azurewebsites.net/api/datafiles/replaceOrCreate"
-        data_json = json.dumps(data)
-        headers = {'Content-type': 'application/json', 'Authorization' : self.user['access_token'] }
-        response = requests.post(url, data=data_json, headers=headers)
-        response = response.json()
-        print(response)
-       
-        # clean up
-        self.file.close()
-        self.name = ''
-
-        return  #ends thread
+    def write_to_azure(self, name):
+        '''Queues a finalized segment for upload, the upload runs in the background upload thread.
+           Without Azure credentials the segment is only kept locally
+        '''
+        record = { 'access_token' : self.user.get('access_token'),
+                   'data' : { "pn" : self.pn, "sn": self.sn, "fileName" : self.user['fileName'], "imuProperties" : json.dumps(self.imu_properties),
+                              "sampleRate" : self.sample_rate, "packetType" : self.packet_type, "userId" : self.user.get('id') } }
+        try:
+            queue = get_uploader()
+        except ValueError as err:
+            print('segment ' + name + ' not uploaded: ' + str(err))
+            return
+        queue.submit('data/' + name, name, meta=record)
 
     def internet_on(self):
         try:
@@ -98,5 +190,11 @@ class LogIMU380Data:
             return False
 
     def close(self):
+        '''Finalizes the last segment and closes the manifest
+        '''
         time.sleep(0.1)
-        threading.Thread(target=self.write_to_azure).start()
+        with self.lock:
+            self.finalize_segment()
+            self.manifest['closed'] = True
+            self.write_manifest()
+        self.name = ''
@@ -9,6 +9,7 @@ Created on 2017-10-01
 WS Master Connection 
 connect         - finds device, gets device_id/odr_setting, and loops
                 - run this in thread otherwise blocking
+simulate        - same as connect against a simulated device, see simulator.py
 disconnect      - ends loop
 
 Device Discovery
@@ -20,6 +21,11 @@ Logging
 start_log
 stop_log
 
+Raw Capture
+start_capture   - tee every serial read/write to a capture file with host timestamps
+stop_capture
+replay          - feed a capture file back through the packet decoder
+
 Control EEPROM Config Fields
 get_fields
 set_fields
@@ -39,12 +45,19 @@ restore_odr     - restores unit to whatever odr_setting is
 
 Data Functions
 get_latest
+get_since       - every sample after a sequence number cursor, from a short ring of recent samples
 get_packet
 get_id_str
 get_bit_status
 parse_packet
 calc_crc
 
+Pipeline
+add_stage       - callable run on every decoded stream sample before logging, e.g. estimator.Estimator
+remove_stage
+process         - runs the stages on a decoded sample, then logs it
+stage_status    - samples and CPU microseconds per sample of each stage
+
 Serial          - a tiny layer on top of Pyserial to handle exceptions as means of device detection
 open
 close
@@ -63,9 +76,13 @@ import string
 import quat
 import time
 import sys
-import file_storage
+import storage
 import collections
 import glob
+import datetime
+import capture
+import threading
+import itertools
 
 class GrabIMU380Data:
     def __init__(self, ws=False):
@@ -84,6 +101,14 @@ class GrabIMU380Data:
         self.packet_type = 0        # expected type of packet
         self.elapsed_time_sec = 0   # an accurate estimate of elapsed time in ODR mode using IMU timer data
         self.data = {}              # placeholder imu measurements of last converted packeted
+        self.capture = None         # raw serial capture instance, see start_capture
+        self.samples = collections.deque(maxlen=1000)  # (sequence number, data) of recent stream samples
+        self.sample_seq = 0         # sequence number of newest sample in samples
+        self.samples_lock = threading.Lock()
+        self.stages = []            # callables run on every decoded stream sample before it is logged, see add_stage
+        self.stage_costs = {}       # stage name -> [samples, seconds]
+        self.frame_time = 0.0       # time.perf_counter() when the frame being decoded was read, for stage latencies
+        self.port = None            # serial port name when the device belongs to device_manager.DeviceManager
        
     def find_device(self):
         ''' Finds active ports and then autobauds units, repeats every 2 seconds
@@ -180,12 +205,68 @@ class GrabIMU380Data:
             return self.data
         else: 
             return { 'error' : 'not streaming' }
+
+    def get_since(self, cursor):
+        '''Get every stream sample newer than sequence number cursor
+            :returns:
+                list of (sequence number, data) and count of samples after cursor that already left the ring
+        '''
+        with self.samples_lock:
+            if not self.samples or cursor >= self.sample_seq:
+                return [], 0
+            oldest = self.samples[0][0]
+            start = max(0, cursor + 1 - oldest)
+            return list(itertools.islice(self.samples, start, None)), max(0, oldest - cursor - 1)
+
+    def push_sample(self, data):
+        '''Appends a decoded stream sample to the ring with the next sequence number, replies and unknown
+           packet types that did not decode to a dict are not samples
+        '''
+        if not isinstance(data, dict):
+            return
+        with self.samples_lock:
+            self.sample_seq += 1
+            self.samples.append((self.sample_seq, data))
     
+    def add_stage(self, stage, index=None):
+        '''Adds a pipeline stage, a callable(data) that may add or change fields of each decoded stream
+           sample.  Stages run in list order on the reader thread, index inserts instead of appending
+        '''
+        stages = list(self.stages)
+        stages.insert(len(stages) if index is None else index, stage)
+        self.stages = stages
+
+    def remove_stage(self, stage):
+        self.stages = [s for s in self.stages if s is not stage]
+
+    def process(self, data):
+        '''Runs the pipeline stages on a decoded stream sample, then logs it if logging is on
+        '''
+        for stage in self.stages:
+            name = getattr(stage, 'name', type(stage).__name__)
+            start = time.perf_counter()
+            try:
+                stage(data)
+            except Exception as err:
+                print('stage ' + name + ' failed: ' + str(err))
+            cost = self.stage_costs.setdefault(name, [0, 0.0])
+            cost[0] += 1
+            cost[1] += time.perf_counter() - start
+        if self.logging == 1 and self.logger is not None:
+            self.logger.log(data, self.odr_setting) 
+        return data
+
+    def stage_status(self):
+        '''Per stage sample count and mean CPU microseconds per sample
+        '''
+        return { name : { 'samples' : n, 'usPerSample' : 1e6 * seconds / n if n else 0.0 } for name, (n, seconds) in self.stage_costs.items() }
+
     def start_log(self, data):
-        '''Creates file or cloud logger.  Autostarts log activity if ws (websocket) set to false
+        '''Creates file or cloud logger, data['storage'] names the backend (see storage.py, default cloud).
+           Autostarts log activity if ws (websocket) set to false
         '''
+        self.logger = storage.open_logger(data.get('storage'), self, data)
         self.logging = 1
-        self.logger = file_storage.LogIMU380Data(self,data)
         if self.ws == False and self.odr_setting != 0:
             self.connect()
     
@@ -196,6 +277,45 @@ class GrabIMU380Data:
         self.logger.close()
         self.logger = None
 
+    def start_capture(self, path=None):
+        '''Starts teeing raw serial traffic to a capture file, default data/capture-<timestamp>.bin
+            :returns:
+                path of capture file
+        '''
+        if path is None:
+            path = 'data/capture-' + datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '.bin'
+        state = { 'deviceId' : self.device_id, 'odrSetting' : self.odr_setting, 'streamMode' : self.stream_mode, 
+                  'synced' : self.synced, 'packetType' : self.packet_type, 'packetSize' : self.packet_size }
+        self.capture = capture.RawCapture(path, state)
+        return path
+
+    def stop_capture(self):
+        '''Stops raw capture and flushes file
+        '''
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+    def replay(self, path, realtime=False):
+        '''Replays a raw capture through the stream decoder, restoring the driver state recorded
+           when the capture started.  Returns when the capture is exhausted
+        '''
+        self.ser = capture.ReplaySerial(path, realtime)
+        state = self.ser.metadata
+        self.device_id = state.get('deviceId', 0)
+        self.odr_setting = state.get('odrSetting', 0)
+        self.synced = state.get('synced', 0)
+        self.packet_type = state.get('packetType', 0)
+        self.packet_size = state.get('packetSize', 0)
+        self.elapsed_time_sec = 0
+        self.data = {}
+        self.connected = 1
+        self.stream_mode = 1
+        while not self.ser.eof:
+            self.get_packet()
+        self.ser.close()
+        self.connected = 0
+
     def ping_test(self):
         '''Executes ping test.  Not currently used
             :returns:
@@ -401,6 +521,24 @@ class GrabIMU380Data:
         else:
             print('no odr setting can connect')
             return
+        self.collect()
+
+    def simulate(self, packet_type='S1', odr_setting=1, serial_number=1808400123):
+        '''Connects to a simulated device instead of a serial port, then loops like connect
+        '''
+        import simulator
+        self.ser = simulator.SimulatedSerial(packet_type, odr_setting, serial_number)
+        self.device_id = self.get_id_str()
+        odr = self.read_fields([0x0001], 1)
+        if odr:
+            self.odr_setting = odr[0][1]
+        self.connected = 1
+        self.restore_odr()
+        self.collect()
+
+    def collect(self):
+        '''Gets and processes packets until disconnected
+        '''
         while self.odr_setting and self.connected:
             if self.stream_mode:
                 self.get_packet()
@@ -425,6 +563,7 @@ class GrabIMU380Data:
         if self.synced == 1:    
             # Read next packet of data based on expected packet size     
             S = self.read(self.packet_size + 7)
+            self.frame_time = time.perf_counter()
             
             if len(S) < 2:
                 # Read Failed
@@ -436,14 +575,15 @@ class GrabIMU380Data:
                 if self.calc_crc(S[2:S[4]+5]) == packet_crc: 
                     # 5 is offset of first payload byte, S[4]+5 is offset of last payload byte     
                     self.data = self.parse_packet(S[5:S[4]+5])     
+                    self.push_sample(self.data)
             else: 
                 # Get synced and then read next packet
-                self.sync()
-                self.get_packet()
+                if self.sync():
+                    self.get_packet()
         else:
             # Get synced and then read next packet
-            self.sync()
-            self.get_packet()
+            if self.sync():
+                self.get_packet()
 
     def sync(self,prev_byte = 0,bytes_read = 0):
         '''Syncs a 380 in Continuous / Stream mode.  Assumes longest packet is 40 bytes
@@ -473,7 +613,7 @@ class GrabIMU380Data:
             print(bytes_read)
             self.synced = 0
             if (bytes_read < 40):
-                self.sync(S[0], bytes_read)
+                return self.sync(S[0], bytes_read)
             else:
                 return False
     
@@ -638,7 +778,7 @@ class GrabIMU380Data:
 
     def parse_packet(self, payload, ws = False):
         '''Parses packet payload to engineering units based on packet type
-           Currently supports S0, S1, A1 packets.  Logs data if logging is on.
+           Currently supports S0, S1, A1 packets.  Stream samples go through process (stages, then log).
            Prints data if a GF/RF/SF/WF. Add A2, N0, N1 packet types.
         '''
         if self.packet_type == 'S0':
@@ -662,22 +802,22 @@ class GrabIMU380Data:
             
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                accel_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
   
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             mags = [0 for x in range(3)] 
             for i in range(3):
-                mag_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                mag_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 mags[i] = (2 * mag_int16) / math.pow(2,16) 
 
             temps = [0 for x in range(4)] 
             for i in range(4):
-                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65535 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
+                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65536 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
                 temps[i] = (200 * temp_int16) / math.pow(2,16)
         
             # Counter Value
@@ -698,10 +838,7 @@ class GrabIMU380Data:
                      ('yRate' , gyros[1]), ('zRate', gyros[2]), ('xMag', mags[0]), ('yMag', mags[1]), ('zMag', mags[2]), ('xRateTemp', temps[0]), \
                      ('yRateTemp', temps[1]), ('zRateTemp', temps[2]), ('boardTemp', temps[3]), ('GPSITOW', itow), ('BITstatus', bit )])
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'F1':
             '''F1 Payload Contents
@@ -739,17 +876,17 @@ class GrabIMU380Data:
 
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                accel_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
  
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             temps = [0 for x in range(4)] 
             for i in range(4):
-                temp_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                temp_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 temps[i] = (200 * temp_int16) / math.pow(2,16)
         
             # Counter Value
@@ -770,10 +907,7 @@ class GrabIMU380Data:
                      ('yRateTemp', temps[1]), ('zRateTemp', temps[2]), ('boardTemp', temps[3]), ('counter', count), ('BITstatus', bit )])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
       
         elif self.packet_type == 'A1': 
             '''A1 Payload Contents
@@ -795,26 +929,26 @@ class GrabIMU380Data:
 
             angles = [0 for x in range(3)] 
             for i in range(3):
-                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 angles[i] = (360.0 * angle_int16) / math.pow(2,16) 
 
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
             
             mags = [0 for x in range(3)] 
             for i in range(3):
-                mag_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65535 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
+                mag_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65536 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
                 mags[i] = (2 * mag_int16) / math.pow(2,16) 
 
   
-            temp_int16 = (256 * payload[2*i+24] + payload[2*i+25]) - 65535 if 256 * payload[2*i+24] + payload[2*i+25] > 32767  else  256 * payload[2*i+24] + payload[2*i+25]
+            temp_int16 = (256 * payload[24] + payload[25]) - 65536 if 256 * payload[24] + payload[25] > 32767  else  256 * payload[24] + payload[25]
             temp = (200 * temp_int16) / math.pow(2,16)
         
             # Counter Value
@@ -837,10 +971,7 @@ class GrabIMU380Data:
                     ('timeITOW', itow), ('BITstatus', bit )])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'A2': 
             '''A2 Payload Contents
@@ -861,22 +992,22 @@ class GrabIMU380Data:
 
             angles = [0 for x in range(3)] 
             for i in range(3):
-                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 angles[i] = (360.0 * angle_int16) / math.pow(2,16) 
 
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
             
             temp = [0 for x in range(3)] 
             for i in range(3):
-                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65535 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
+                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65536 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
                 temp[i] = (200 * temp_int16) / math.pow(2,16)
         
             # Counter Value
@@ -899,10 +1030,7 @@ class GrabIMU380Data:
                     ('timeITOW', itow), ('BITstatus', bit )])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'A3': 
             '''A3 Payload Contents
@@ -923,22 +1051,22 @@ class GrabIMU380Data:
 
             angles = [0 for x in range(3)] 
             for i in range(3):
-                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 angles[i] = (360.0 * angle_int16) / math.pow(2,16) 
 
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
             
             temp = [0 for x in range(3)] 
             for i in range(3):
-                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65535 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
+                temp_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65536 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
                 temp[i] = (200 * temp_int16) / math.pow(2,16)
         
             # Counter Value
@@ -954,10 +1082,7 @@ class GrabIMU380Data:
                     ('timeITOW', itow), ('BITstatus', bit )])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'N0': 
             '''N0 Payload Contents
@@ -978,48 +1103,47 @@ class GrabIMU380Data:
 
             angles = [0 for x in range(3)] 
             for i in range(3):
-                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 angles[i] = (360.0 * angle_int16) / math.pow(2,16) 
 
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             vel = [0 for x in range(3)] 
             for i in range(3):
-                vel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                vel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 vel[i] = (512 * vel_int16) / math.pow(2,16)
             
             tude = [0 for x in range(3)] 
             for i in range(2):
-                tude_int32 = (16777216 * payload[2*i+18] + 65536 * payload[2*i+19] + 256 * payload[2*i+20] + payload[21]) - 2147483648 if 16777216 * payload[2*i+18] + 65536 *  payload[2*i+19] + 256 * payload[2*i+20] + payload[21] > 2147483647  else  16777216 * payload[2*i+18] + 65536 * payload[2*i+19] + 256 * payload[2*i+20] + payload[21]
+                tude_uint32 = 16777216 * payload[4*i+18] + 65536 * payload[4*i+19] + 256 * payload[4*i+20] + payload[4*i+21]
+                tude_int32 = tude_uint32 - 4294967296 if tude_uint32 > 2147483647 else tude_uint32
                 tude[i] = (360.0  * tude_int32) / math.pow(2,32)
        
             # altitude
-            tude_int16 = 256 * payload[26] + payload[27];
-            tude[2] = (16384 * tude_int16) / math.pow(2,16); 
+            tude_int16 = (256 * payload[26] + payload[27]) - 65536 if 256 * payload[26] + payload[27] > 32767  else  256 * payload[26] + payload[27]
+            tude[2] = (16384 * tude_int16) / math.pow(2,16)
            
             # Counter Value
-            itow = 256 * payload[28] + payload[29]   
+            itow = 256 * payload[28] + payload[29]
+            self.advance_itow(itow)
 
             # BIT Value
             bit = 256 * payload[30] + payload[31]         
 
-            data = collections.OrderedDict([('rollAngle', angles[0]),('pitchAngle', angles[1]),('yawAngleMag', angles[2]), \
-                    ('xRateCorrected' , gyros[0]), ('yRateCorrected' , gyros[1]), ('zRateCOrrected', gyros[2]), \
+            data = collections.OrderedDict([('time', self.elapsed_time_sec), ('rollAngle', angles[0]),('pitchAngle', angles[1]),('yawAngleMag', angles[2]), \
+                    ('xRateCorrected' , gyros[0]), ('yRateCorrected' , gyros[1]), ('zRateCorrected', gyros[2]), \
                     ( 'nVel', vel[0]), ('eVel', vel[1]), ('dVel', vel[2]), \
                     ( 'longitude', tude[0]), ('latitude', tude[1]), ('altitude', tude[2]), \
                     ('iTOW', itow), ('BITstatus', bit )])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'N1': 
-            '''N0 Payload Contents
+            '''N1 Payload Contents
                 0	rollAngle	I2	2*pi/2^16 [360 deg/2^16]	Radians [deg]	Roll angle
                 2	pitchAngle	I2	2*pi/2^16 [360 deg/2^16]	Radians [deg]	Pitch angle
                 4	yawAngleMag	I2	2*pi/2^16 [360 deg/2^16]	Radians [deg]	Yaw angle (magnetic north)
@@ -1040,50 +1164,49 @@ class GrabIMU380Data:
 
             angles = [0 for x in range(3)] 
             for i in range(3):
-                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65535 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
+                angle_int16 = (256 * payload[2*i] + payload[2*i+1]) - 65536 if 256 * payload[2*i] + payload[2*i+1] > 32767  else  256 * payload[2*i] + payload[2*i+1]
                 angles[i] = (360.0 * angle_int16) / math.pow(2,16) 
 
             gyros = [0 for x in range(3)] 
             for i in range(3):
-                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65535 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
+                gyro_int16 = (256 * payload[2*i+6] + payload[2*i+7]) - 65536 if 256 * payload[2*i+6] + payload[2*i+7] > 32767  else  256 * payload[2*i+6] + payload[2*i+7]
                 gyros[i] = (1260 * gyro_int16) / math.pow(2,16) 
 
             accels = [0 for x in range(3)] 
             for i in range(3):
-                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65535 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
+                accel_int16 = (256 * payload[2*i+12] + payload[2*i+13]) - 65536 if 256 * payload[2*i+12] + payload[2*i+13] > 32767  else  256 * payload[2*i+12] + payload[2*i+13]
                 accels[i] = (9.80665 * 20 * accel_int16) / math.pow(2,16)
             vel = [0 for x in range(3)] 
             for i in range(3):
-                vel_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65535 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
+                vel_int16 = (256 * payload[2*i+18] + payload[2*i+19]) - 65536 if 256 * payload[2*i+18] + payload[2*i+19] > 32767  else  256 * payload[2*i+18] + payload[2*i+19]
                 vel[i] = (512 * vel_int16) / math.pow(2,16)
             
             tude = [0 for x in range(3)] 
             for i in range(2):
-                tude_int32 = (16777216 * payload[2*i+24] + 65536 * payload[2*i+25] + 256 * payload[2*i+26] + payload[27]) - 2147483648 if 16777216 * payload[2*i+24] + 65536 *  payload[2*i+25] + 256 * payload[2*i+26] + payload[27] > 2147483647  else  16777216 * payload[2*i+24] + 65536 * payload[2*i+25] + 256 * payload[2*i+26] + payload[27]
+                tude_uint32 = 16777216 * payload[4*i+24] + 65536 * payload[4*i+25] + 256 * payload[4*i+26] + payload[4*i+27]
+                tude_int32 = tude_uint32 - 4294967296 if tude_uint32 > 2147483647 else tude_uint32
                 tude[i] = (360.0 * tude_int32) / math.pow(2,32)
        
             # altitude
-            tude_int16 = 256 * payload[32] + payload[33];
-            tude[2] = (16384 * tude_int16) / math.pow(2,16); 
+            tude_int16 = (256 * payload[32] + payload[33]) - 65536 if 256 * payload[32] + payload[33] > 32767  else  256 * payload[32] + payload[33]
+            tude[2] = (16384 * tude_int16) / math.pow(2,16)
            
-            temp_int16 = (256 * payload[2*i+34] + payload[2*i+35]) - 65535 if 256 * payload[2*i+34] + payload[2*i+35] > 32767  else  256 * payload[2*i+34] + payload[2*i+35]
+            temp_int16 = (256 * payload[34] + payload[35]) - 65536 if 256 * payload[34] + payload[35] > 32767  else  256 * payload[34] + payload[35]
             temp = (200 * temp_int16) / math.pow(2,16)
 
             # Counter Value
-            itow = 256 * payload[28] + payload[29]   
+            itow = 256 * payload[36] + payload[37]
+            self.advance_itow(itow)
 
-            data = collections.OrderedDict([('rollAngle', angles[0]),('pitchAngle', angles[1]),('yawAngleMag', angles[2]), \
-                    ('xRateCorrected' , gyros[0]), ('yRateCorrected' , gyros[1]), ('zRateCOrrected', gyros[2]), \
+            data = collections.OrderedDict([('time', self.elapsed_time_sec), ('rollAngle', angles[0]),('pitchAngle', angles[1]),('yawAngleMag', angles[2]), \
+                    ('xRateCorrected' , gyros[0]), ('yRateCorrected' , gyros[1]), ('zRateCorrected', gyros[2]), \
                     ( 'xAccel', accels[0]), ('yAccel', accels[1]), ('zAccel', accels[2]), \
                     ( 'nVel', vel[0]), ('eVel', vel[1]), ('dVel', vel[2]), \
                     ( 'longitude', tude[0]), ('latitude', tude[1]), ('altitude', tude[2]), \
                     ('xRateTemp', temp), ('iTOW', itow)])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
             
         elif self.packet_type == 'T0':
             '''T0 Payload Contents
@@ -1152,10 +1275,7 @@ class GrabIMU380Data:
                    ('software status', softwareStatus), ('sensor status', sensorStatus)])
 
 
-            if self.logging == 1 and self.logger is not None:
-                self.logger.log(data, self.odr_setting) 
-            
-            return data
+            return self.process(data)
 
         elif self.packet_type == 'SF':
             n = payload[0]
@@ -1208,6 +1328,12 @@ class GrabIMU380Data:
             print('ID String: {0} {1}'.format(sn,payload[4:].decode()))
             return '{0} {1}'.format(sn,payload[4:].decode())
 
+    def advance_itow(self, itow):
+        '''Advances elapsed_time_sec by the milliseconds since the previous N0/N1 iTOW, its lower 2 bytes
+        '''
+        if 'iTOW' in self.data:
+            self.elapsed_time_sec += ((itow - self.data['iTOW']) % 65536) / 1000.0
+
     def calc_crc(self,payload):
         '''Calculates CRC per 380 manual
         '''
@@ -1238,9 +1364,9 @@ class GrabIMU380Data:
             bytes = self.ser.read(n)
         except:
         # except (OSError, serial.SerialException):
-            self.disconnect()    # sets connected to 0, and other related parameters to initial values
-            print('serial exception read') 
-            self.connect() 
+            self.lost('read')
+        if self.capture is not None:
+            self.capture.record(bytes)
         if bytes and len(bytes):
             return bytearray(bytes)
         else:
@@ -1248,22 +1374,29 @@ class GrabIMU380Data:
             return bytearray(bytes)
     
     def write(self,n):
+        if self.capture is not None:
+            self.capture.record(bytearray(n), b'W')
         try: 
             self.ser.write(n)
         except:
         # except (OSError, serial.SerialException):
-            self.disconnect()   # sets connected to 0, and other related parameters to initial values  
-            print('serial exception write')
-            self.connect() 
+            self.lost('write')
 
     def reset_buffer(self):
         try:
             self.ser.reset_input_buffer()
         except:
         #except (OSError, serial.SerialException):
-            self.disconnect()   # sets connected to 0, and other related parameters to initial values
-            print('serial exception reset')   
-            self.connect() 
+            self.lost('reset')
+
+    def lost(self, operation):
+        '''Handles a serial exception.  A device of device_manager (port set) ends its collect loop and is
+           rediscovered by the manager, which owns the port scan.  A standalone driver searches again
+        '''
+        self.disconnect()   # sets connected to 0, and other related parameters to initial values
+        print('serial exception ' + operation)
+        if self.port is None:
+            self.connect()
 
         
 
@@ -0,0 +1,292 @@
+"""
+Indexed reader for CSV logs written by file_storage
+Created on 2026-10-19
+"""
+
+"""
+LogReader       - caches a time index per log file, in memory and in data/.index/
+index           - build or incrementally extend the index of a file
+read_range      - rows with time between t0 and t1, as chunks of CSV text
+envelope        - N bucket min/max envelope of every column for plotting
+read_columns    - whole columns of a CSV or binary log as numpy arrays, for offline processing
+
+The index keeps one entry per BLOCK_ROWS rows: byte offset, row count, first/last time and the
+min/max of each column.  Range reads seek straight to the first needed block, envelopes over long
+ranges are answered from the block summaries without reading the file.  Files without a time
+column are indexed by row number.  Compressed logs are read through one decompressing stream per
+read, skipping forward to the first needed block instead of seeking, which their streams would emulate
+by decompressing from the start.
+"""
+
+import bisect
+import json
+import os
+import threading
+
+BLOCK_ROWS = 256
+COMPRESSED = ('.gz', '.zst', '.lz4')
+SKIP_BYTES = 1 << 20    # read size when skipping forward in a compressed log
+INDEX_VERSION = 1
+
+def open_log(path):
+    '''Opens a log file for binary reading, decompressing by extension
+    '''
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        import zstandard
+        return zstandard.open(path, 'rb')
+    if path.endswith('.lz4'):
+        import lz4.frame
+        return lz4.frame.open(path, 'rb')
+    return open(path, 'rb')
+
+def skip_to(f, path, offset):
+    '''Positions a file of open_log at offset, a seek for plain files.  A compressed stream is read
+       forward through its one decompressor
+    '''
+    if not path.endswith(COMPRESSED):
+        f.seek(offset)
+        return
+    remaining = offset
+    while remaining > 0:
+        data = f.read(min(remaining, SKIP_BYTES))
+        if not data:
+            return
+        remaining -= len(data)
+
+def parse_row(line):
+    return [float(x) for x in line.split(b',')]
+
+def read_columns(path, columns=None, t0=None, t1=None):
+    '''Reads a CSV log (plain or compressed) or a binary_storage .log.bin log into numpy arrays
+        :returns:
+            OrderedDict of column name -> float array, only columns if given, rows with t0 <= time <= t1
+    '''
+    import collections
+    import numpy as np
+    if path.endswith('.log.bin'):
+        import binary_storage
+        header, samples = binary_storage.read_log(path)
+        rows = list(samples)
+        names = columns or (list(rows[0].keys()) if rows else [])
+        result = collections.OrderedDict((name, np.array([r.get(name, np.nan) for r in rows], dtype=float)) for name in names)
+    else:
+        with open_log(path) as f:
+            names = f.readline().decode().strip().split(',')
+            text = f.read()
+        # drop a row still being written
+        lines = text[:text.rfind(b'\n') + 1].decode().splitlines()
+        wanted = columns or names
+        usecols = [names.index(name) for name in wanted]
+        values = np.loadtxt(lines, delimiter=',', usecols=usecols, ndmin=2) if lines else np.empty((0, len(usecols)))
+        result = collections.OrderedDict((name, values[:, i]) for i, name in enumerate(wanted))
+    if (t0 is not None or t1 is not None) and 'time' in result:
+        keep = np.ones(len(result['time']), dtype=bool)
+        if t0 is not None:
+            keep &= result['time'] >= t0
+        if t1 is not None:
+            keep &= result['time'] <= t1
+        for name in result:
+            result[name] = result[name][keep]
+    return result
+
+class LogReader:
+    def __init__(self, directory='data'):
+        self.directory = directory
+        self.index_directory = os.path.join(directory, '.index')
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def path(self, name):
+        '''Maps a client supplied file name into the log directory
+        '''
+        return os.path.join(self.directory, os.path.basename(name))
+
+    def index(self, name):
+        '''Returns index of a log file, building or extending it if the file changed since it was cached
+        '''
+        path = self.path(name)
+        stat = os.stat(path)
+        with self.lock:
+            idx = self.cache.get(path)
+        if idx is None:
+            idx = self.load_index(path)
+        if idx is not None and idx['size'] == stat.st_size and idx['mtime'] == stat.st_mtime:
+            return idx
+        # plain files are only ever appended to, so an index of a shorter version can be extended
+        if idx is None or idx['size'] > stat.st_size or path.endswith(COMPRESSED):
+            idx = None
+        idx = self.build_index(path, stat, idx)
+        with self.lock:
+            self.cache[path] = idx
+        self.save_index(path, idx)
+        return idx
+
+    def index_path(self, path):
+        return os.path.join(self.index_directory, os.path.basename(path) + '.json')
+
+    def load_index(self, path):
+        try:
+            with open(self.index_path(path)) as f:
+                idx = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if idx.get('version') != INDEX_VERSION:
+            return None
+        return idx
+
+    def save_index(self, path, idx):
+        if not os.path.isdir(self.index_directory):
+            os.makedirs(self.index_directory)
+        tmp = self.index_path(path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(idx, f)
+        os.replace(tmp, self.index_path(path))
+
+    def build_index(self, path, stat, idx=None):
+        '''Scans the file from the start, or from the last block of idx, summarizing every BLOCK_ROWS rows
+        '''
+        with open_log(path) as f:
+            if idx is None:
+                header = f.readline()
+                columns = header.decode().strip().split(',')
+                idx = { 'version' : INDEX_VERSION, 'columns' : columns, 'timeColumn' : columns.index('time') if 'time' in columns else None,
+                        'dataStart' : len(header), 'blocks' : [], 'rows' : 0 }
+                offset = len(header)
+            else:
+                # the last block may have been partial, rescan it
+                if idx['blocks']:
+                    last = idx['blocks'].pop()
+                    idx['rows'] -= last[1]
+                    offset = last[0]
+                else:
+                    offset = idx['dataStart']
+                f.seek(offset)
+            time_column = idx['timeColumn']
+            block = None
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break       # row still being written
+                try:
+                    values = parse_row(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                t = values[time_column] if time_column is not None else float(idx['rows'])
+                if block is None:
+                    block = [offset, 0, t, t, list(values), list(values)]
+                block[1] += 1
+                block[3] = t
+                mins = block[4]
+                maxs = block[5]
+                for i, v in enumerate(values):
+                    if v < mins[i]:
+                        mins[i] = v
+                    elif v > maxs[i]:
+                        maxs[i] = v
+                idx['rows'] += 1
+                offset += len(line)
+                if block[1] == BLOCK_ROWS:
+                    idx['blocks'].append(block)
+                    block = None
+            if block is not None:
+                idx['blocks'].append(block)
+        idx['dataEnd'] = offset
+        idx['size'] = stat.st_size
+        idx['mtime'] = stat.st_mtime
+        return idx
+
+    def first_block(self, idx, t0):
+        firsts = [b[2] for b in idx['blocks']]
+        return max(0, bisect.bisect_right(firsts, t0) - 1)
+
+    def rows(self, idx, name, t0=None, t1=None):
+        '''Generator of (time, raw line) for the rows with t0 <= time <= t1
+        '''
+        if not idx['blocks']:
+            return
+        start = self.first_block(idx, t0) if t0 is not None else 0
+        row = sum(b[1] for b in idx['blocks'][:start])
+        time_column = idx['timeColumn']
+        offset = idx['blocks'][start][0]
+        path = self.path(name)
+        with open_log(path) as f:
+            skip_to(f, path, offset)
+            for line in f:
+                if offset >= idx['dataEnd']:
+                    break
+                offset += len(line)
+                if time_column is not None:
+                    try:
+                        t = float(line.split(b',', time_column + 1)[time_column])
+                    except ValueError:
+                        continue
+                else:
+                    t = float(row)
+                row += 1
+                if t0 is not None and t < t0:
+                    continue
+                if t1 is not None and t > t1:
+                    break
+                yield t, line
+
+    def read_range(self, name, t0=None, t1=None, chunk_rows=2000):
+        '''Generator of CSV text chunks, header first, holding the rows with t0 <= time <= t1.
+           Reading starts at the first block that can contain t0 and stops after t1
+        '''
+        idx = self.index(name)
+        yield ','.join(idx['columns']) + '\n'
+        lines = []
+        for t, line in self.rows(idx, name, t0, t1):
+            lines.append(line)
+            if len(lines) == chunk_rows:
+                yield b''.join(lines).decode()
+                lines = []
+        if lines:
+            yield b''.join(lines).decode()
+
+    def envelope(self, name, points, t0=None, t1=None):
+        '''Min/max of every column in points equal time buckets between t0 and t1
+            :returns:
+                dict with columns, bucket start times, and per bucket min and max rows
+        '''
+        idx = self.index(name)
+        blocks = idx['blocks']
+        result = { 'columns' : idx['columns'], 'time' : [], 'min' : [], 'max' : [] }
+        if not blocks:
+            return result
+        t0 = blocks[0][2] if t0 is None else t0
+        t1 = blocks[-1][3] if t1 is None else t1
+        width = (t1 - t0) / float(points) if t1 > t0 else 1.0
+        buckets = {}
+
+        def add(t, mins, maxs):
+            k = min(points - 1, int((t - t0) / width))
+            if k not in buckets:
+                buckets[k] = [list(mins), list(maxs)]
+            else:
+                lo, hi = buckets[k]
+                for i in range(len(lo)):
+                    if mins[i] < lo[i]:
+                        lo[i] = mins[i]
+                    if maxs[i] > hi[i]:
+                        hi[i] = maxs[i]
+
+        start = self.first_block(idx, t0)
+        end = bisect.bisect_right([b[2] for b in blocks], t1)
+        if end - start > 4 * points:
+            # each bucket spans several blocks, the block summaries are enough
+            for b in blocks[start:end]:
+                if b[3] >= t0:
+                    add(max(b[2], t0), b[4], b[5])
+        else:
+            for t, line in self.rows(idx, name, t0, t1):
+                values = parse_row(line)
+                add(t, values, values)
+        for k in sorted(buckets):
+            result['time'].append(t0 + k * width)
+            result['min'].append(buckets[k][0])
+            result['max'].append(buckets[k][1])
+        return result
@@ -0,0 +1,172 @@
+"""
+Magnetometer hard and soft iron calibration from S0 samples collected while the device is rotated
+Created on 2026-10-19
+"""
+
+"""
+MagCollector    - pipeline stage (imu.add_stage(stage, 0), ahead of calibration.Calibration) binning
+                  raw x/y/zMag samples into cells of a 3D grid, one running mean per cell
+bin_samples     - the same binning over arrays of a log
+fit             - ellipsoid fit of binned samples: hard iron offset, soft iron matrix and fit quality
+fit_log         - fit of the mags of a CSV or binary log, see log_reader.read_columns
+to_calibration  - a fit as the mag parameters of calibration.py, to apply it live
+device_fields   - a fit as (field, value) pairs of the 380's hard/soft iron fields, for write_fields
+
+A device held still piles up samples at one orientation.  Binning by position keeps one mean per
+CELL gauss wide cell, so every orientation visited counts once and memory is bounded by the surface
+of the ellipsoid, at most MAX_BINS cells.
+
+The fit is the least squares quadric through the cell means
+    A x^2 + B y^2 + C z^2 + 2 D xy + 2 E xz + 2 F yz + 2 G x + 2 H y + 2 I z = 1
+solved as one (cells x 9) linear system.  With Q = [[A, D, E], [D, B, F], [E, F, C]] the hard iron
+offset is c = -Q^-1 [G, H, I] and the samples lie on (m - c)' S (m - c) = 1, S = Q / (1 + c' Q c).
+The soft iron matrix W = R S^(1/2), R the geometric mean radius, maps them onto a sphere of radius R,
+so corrected = W (raw - c), calibration.py's misalignment . (raw - bias).  Quality is the rms and max
+of |corrected| / R - 1 and the coverage, the fraction of 72 equal area direction sectors around c
+holding a cell.
+
+The 380 corrects the horizontal plane only, from configuration fields
+    0x0009, 0x000A  x, y hard iron bias     I2, 2 / 2^16 gauss
+    0x000B          soft iron ratio         U2, 2 / 2^16, minor over major axis of the horizontal ellipse
+    0x000E          soft iron angle         I2, 2 pi / 2^16 rad, of the major axis from x
+"""
+
+import math
+import threading
+
+CELL = 0.02         # gauss
+MAX_BINS = 20000
+HARD_IRON_FIELDS = [0x0009, 0x000A]
+SOFT_IRON_RATIO_FIELD = 0x000B
+SOFT_IRON_ANGLE_FIELD = 0x000E
+
+class MagCollector:
+    name = 'magcal'
+
+    def __init__(self, cell=CELL, max_bins=MAX_BINS):
+        self.cell = cell
+        self.max_bins = max_bins
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bins = {}          # cell index -> [sum x, sum y, sum z, count]
+            self.samples = 0
+
+    def __call__(self, data):
+        if 'xMag' not in data:
+            return
+        x, y, z = data['xMag'], data['yMag'], data['zMag']
+        key = (math.floor(x / self.cell), math.floor(y / self.cell), math.floor(z / self.cell))
+        with self.lock:
+            self.samples += 1
+            b = self.bins.get(key)
+            if b is None:
+                if len(self.bins) < self.max_bins:
+                    self.bins[key] = [x, y, z, 1]
+                return
+            b[0] += x
+            b[1] += y
+            b[2] += z
+            b[3] += 1
+
+    def points(self):
+        '''Mean of every cell, an N x 3 array
+        '''
+        import numpy as np
+        with self.lock:
+            values = list(self.bins.values())
+        if not values:
+            return np.zeros((0, 3))
+        b = np.array(values, dtype=float)
+        return b[:, :3] / b[:, 3:]
+
+    def status(self):
+        with self.lock:
+            return { 'samples' : self.samples, 'bins' : len(self.bins) }
+
+def bin_samples(mags, cell=CELL):
+    '''Cell means of an N x 3 array of mags
+    '''
+    import numpy as np
+    mags = np.asarray(mags, dtype=float)
+    cells, inverse = np.unique(np.floor(mags / cell).astype(np.int64), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(cells))
+    return np.stack([np.bincount(inverse, mags[:, i], len(cells)) for i in range(3)], axis=1) / counts[:, None]
+
+def coverage(points, center):
+    '''Fraction of 72 equal area sectors (12 azimuths x 6 bands of equal z) of directions about center hit
+    '''
+    import numpy as np
+    d = points - center
+    d = d / np.linalg.norm(d, axis=1)[:, None]
+    band = np.minimum(((d[:, 2] + 1.0) / 2.0 * 6).astype(int), 5)
+    sector = np.minimum(((np.arctan2(d[:, 1], d[:, 0]) + np.pi) / (2 * np.pi) * 12).astype(int), 11)
+    return len(np.unique(band * 12 + sector)) / 72.0
+
+def fit(points):
+    '''Ellipsoid fit of cell means
+        :returns:
+            dict of hardIron (3, gauss), softIron (3 x 3), fieldStrength (R, gauss), residualRms and
+            residualMax (fractions of R), coverage and bins
+    '''
+    import numpy as np
+    m = np.asarray(points, dtype=float)
+    if len(m) < 9:
+        raise ValueError('{0:d} bins, at least 9 are needed, keep rotating the device'.format(len(m)))
+    x, y, z = m[:, 0], m[:, 1], m[:, 2]
+    # centering first keeps the system well conditioned far from the origin
+    mean = m.mean(axis=0)
+    x, y, z = x - mean[0], y - mean[1], z - mean[2]
+    design = np.stack([x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z, 2 * x, 2 * y, 2 * z], axis=1)
+    p, residuals, rank, singular = np.linalg.lstsq(design, np.ones(len(m)), rcond=None)
+    Q = np.array([[p[0], p[3], p[4]], [p[3], p[1], p[5]], [p[4], p[5], p[2]]])
+    if rank < 9:
+        # e.g. turned about one axis only, the samples lie on a plane
+        raise ValueError('the bins do not determine an ellipsoid, rotate the device about every axis')
+    c = -np.linalg.solve(Q, p[6:9])
+    S = Q / (1.0 + c @ Q @ c)
+    eigenvalues, vectors = np.linalg.eigh(S)
+    if eigenvalues.min() <= 0:
+        raise ValueError('the bins do not determine an ellipsoid, rotate the device about every axis')
+    radius = float(np.prod(eigenvalues) ** (-1.0 / 6.0))
+    W = radius * (vectors * np.sqrt(eigenvalues)) @ vectors.T
+    center = c + mean
+    residual = np.linalg.norm((m - center) @ W.T, axis=1) / radius - 1.0
+    return { 'hardIron' : center.tolist(), 'softIron' : W.tolist(), 'fieldStrength' : radius,
+             'residualRms' : float(np.sqrt(np.mean(residual ** 2))), 'residualMax' : float(np.abs(residual).max()),
+             'coverage' : coverage(m, center), 'bins' : len(m) }
+
+def fit_log(path, t0=None, t1=None, cell=CELL):
+    import numpy as np
+    import log_reader
+    columns = log_reader.read_columns(path, ['time', 'xMag', 'yMag', 'zMag'], t0, t1)
+    return fit(bin_samples(np.stack([columns['xMag'], columns['yMag'], columns['zMag']], axis=1), cell))
+
+def to_calibration(result):
+    '''Mag parameters for calibration.Calibration, corrected = softIron . (raw - hardIron)
+    '''
+    return { 'bias' : list(result['hardIron']), 'misalignment' : [list(row) for row in result['softIron']] }
+
+def device_fields(result):
+    '''(field, value) pairs for imu.write_fields: x/y hard iron and the horizontal soft iron ratio and
+       angle of the fit
+    '''
+    import numpy as np
+    pairs = [(field, int(round(result['hardIron'][i] * 32768.0))) for i, field in enumerate(HARD_IRON_FIELDS)]
+    # the horizontal slice through the center is d' S2 d = 1, S2 the x/y block of S = W W / R^2, its
+    # axes are 1 / sqrt of the eigenvalues, the major one along the smallest
+    W = np.asarray(result['softIron'], dtype=float)
+    eigenvalues, vectors = np.linalg.eigh((W @ W)[:2, :2])
+    ratio = math.sqrt(eigenvalues[0] / eigenvalues[1])
+    angle = math.atan2(vectors[1, 0], vectors[0, 0])
+    # an axis has no direction, keep the angle in [-pi/2, pi/2)
+    angle = (angle + math.pi / 2) % math.pi - math.pi / 2
+    pairs.append((SOFT_IRON_ANGLE_FIELD, int(round(angle / (2 * math.pi) * 65536.0))))
+    for field, value in pairs:
+        if not -32768 <= value <= 32767:
+            raise ValueError('field {0:#06x} value {1:d} is out of range, the hard iron is over 1 gauss'.format(field, value))
+    pairs.insert(2, (SOFT_IRON_RATIO_FIELD, int(round(ratio * 32768.0))))
+    return pairs
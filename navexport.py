@@ -0,0 +1,385 @@
+"""
+Geodetic track export of N0/N1 navigation samples as GeoJSON, KML or CSV
+Created on 2026-10-19
+"""
+
+"""
+decode          - N0/N1 payloads (N x length bytes) to the columns parse_packet gives, all at once
+read_capture    - columns of every N0/N1 frame with a good CRC in a raw capture, see capture.py
+read_log        - navigation columns of a capture or of a CSV or binary log, see log_reader.read_columns
+to_ecef         - WGS-84 latitude, longitude (degrees) and altitude to earth centered earth fixed x, y, z
+to_enu          - ECEF points to east, north, up about an origin fix
+simplify        - Douglas-Peucker simplification of a track, a mask of the points kept
+track           - columns with fixes only, ECEF and ENU added, optionally simplified
+write_csv       - a track as CSV, chunk rows formatted at a time
+write_geojson   - a track as one GeoJSON LineString feature
+write_kml       - a track as one KML LineString placemark
+export          - track plus the writer picked by file extension
+TrackRecorder   - pipeline stage keeping the fixes of a live N0/N1 stream, every interval seconds, in
+                  preallocated chunks for export, the oldest chunk dropped past max_fixes
+
+Every step works on whole columns.  A capture is scanned for frame headers with array compares, the
+CRC of every candidate frame is computed a byte column at a time from a 256 entry table, and the good
+payloads are viewed as one big endian structured array, so no packet is parsed on its own.  Samples
+before the first fix have latitude and longitude 0 and are dropped.
+
+Douglas-Peucker runs over the ENU points, tolerance in meters of 3D distance.  Instead of recursing
+one segment at a time, every pass measures all points still undecided against the chord of the
+segment they lie in, keeps the farthest point of each segment farther than the tolerance, and drops
+the points of the other segments.  A pass is a handful of array operations over the remaining
+points and the passes are as many as the recursion would be deep, 18 for 1M points of a drive.
+"""
+
+import collections
+import json
+import os
+import threading
+
+# WGS-84
+SEMI_MAJOR = 6378137.0
+FLATTENING = 1.0 / 298.257223563
+E2 = FLATTENING * (2.0 - FLATTENING)
+
+# packet type -> (field, payload offset, big endian type, scale to output units)
+LAYOUTS = {
+    'N0' : [('rollAngle', 0, '>i2', 360.0 / 65536), ('pitchAngle', 2, '>i2', 360.0 / 65536), ('yawAngleMag', 4, '>i2', 360.0 / 65536),
+            ('xRateCorrected', 6, '>i2', 1260.0 / 65536), ('yRateCorrected', 8, '>i2', 1260.0 / 65536), ('zRateCorrected', 10, '>i2', 1260.0 / 65536),
+            ('nVel', 12, '>i2', 512.0 / 65536), ('eVel', 14, '>i2', 512.0 / 65536), ('dVel', 16, '>i2', 512.0 / 65536),
+            ('longitude', 18, '>i4', 360.0 / 4294967296), ('latitude', 22, '>i4', 360.0 / 4294967296), ('altitude', 26, '>i2', 16384.0 / 65536),
+            ('iTOW', 28, '>u2', 1), ('BITstatus', 30, '>u2', 1)],
+    'N1' : [('rollAngle', 0, '>i2', 360.0 / 65536), ('pitchAngle', 2, '>i2', 360.0 / 65536), ('yawAngleMag', 4, '>i2', 360.0 / 65536),
+            ('xRateCorrected', 6, '>i2', 1260.0 / 65536), ('yRateCorrected', 8, '>i2', 1260.0 / 65536), ('zRateCorrected', 10, '>i2', 1260.0 / 65536),
+            ('xAccel', 12, '>i2', 9.80665 * 20 / 65536), ('yAccel', 14, '>i2', 9.80665 * 20 / 65536), ('zAccel', 16, '>i2', 9.80665 * 20 / 65536),
+            ('nVel', 18, '>i2', 512.0 / 65536), ('eVel', 20, '>i2', 512.0 / 65536), ('dVel', 22, '>i2', 512.0 / 65536),
+            ('longitude', 24, '>i4', 360.0 / 4294967296), ('latitude', 28, '>i4', 360.0 / 4294967296), ('altitude', 32, '>i2', 16384.0 / 65536),
+            ('xRateTemp', 34, '>i2', 200.0 / 65536), ('iTOW', 36, '>u2', 1)],
+}
+PAYLOAD_LENGTHS = { 'N0' : 32, 'N1' : 38 }
+FIELDS = ['time', 'latitude', 'longitude', 'altitude', 'nVel', 'eVel', 'dVel']
+CHUNK = 4096        # rows per TrackRecorder chunk
+MAX_FIXES = 864000  # fixes a TrackRecorder keeps, a day at the default 0.1 s interval
+
+def decode(payloads, packet_type):
+    '''Decodes N0 or N1 payloads, an N x length uint8 array or a list of bytes
+        :returns:
+            OrderedDict of field -> float array, time in seconds from the first iTOW
+    '''
+    import numpy as np
+    layout = LAYOUTS[packet_type]
+    length = PAYLOAD_LENGTHS[packet_type]
+    if not isinstance(payloads, np.ndarray):
+        payloads = np.frombuffer(b''.join(bytes(p) for p in payloads), dtype=np.uint8)
+    payloads = np.ascontiguousarray(payloads, dtype=np.uint8).reshape(-1, length)
+    dtype = np.dtype({ 'names' : [f[0] for f in layout], 'offsets' : [f[1] for f in layout],
+                       'formats' : [f[2] for f in layout], 'itemsize' : length })
+    records = payloads.view(dtype).reshape(-1)
+    columns = collections.OrderedDict()
+    itow = records['iTOW'].astype(np.int64)
+    # iTOW is the lower 2 bytes of the milliseconds, as imu380.advance_itow
+    columns['time'] = np.concatenate([[0], np.cumsum(np.diff(itow) % 65536)]) / 1000.0 if len(itow) else np.zeros(0)
+    for name, offset, code, scale in layout:
+        columns[name] = records[name].astype(float) * scale
+    return columns
+
+def crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for i in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xffff)
+    return table
+
+def crc(rows):
+    '''CRC of each row of an N x M uint8 array, as imu380.calc_crc
+    '''
+    import numpy as np
+    table = np.array(crc_table(), dtype=np.uint16)
+    value = np.full(len(rows), 0x1D0F, dtype=np.uint16)
+    for column in rows.T:
+        value = (value << 8) ^ table[(value >> 8) ^ column]
+    return value
+
+def frames(data, packet_type):
+    '''Payloads of the frames of packet_type with a good CRC in a byte stream
+        :returns:
+            N x length uint8 array
+    '''
+    import numpy as np
+    length = PAYLOAD_LENGTHS[packet_type]
+    b = np.frombuffer(data, dtype=np.uint8)
+    size = length + 7
+    if len(b) < size:
+        return np.zeros((0, length), dtype=np.uint8)
+    head = b[:len(b) - size + 1]
+    t0, t1 = ord(packet_type[0]), ord(packet_type[1])
+    starts = np.flatnonzero((head == 0x55) & (b[1:len(head) + 1] == 0x55) & (b[2:len(head) + 2] == t0) &
+                            (b[3:len(head) + 3] == t1) & (b[4:len(head) + 4] == length))
+    rows = b[starts[:, None] + np.arange(size)]
+    good = crc(rows[:, 2:length + 5]) == rows[:, -2].astype(np.uint16) * 256 + rows[:, -1]
+    return rows[good, 5:length + 5]
+
+def read_capture(path, packet_type=None):
+    '''Decodes the N0/N1 frames a raw capture read from the device
+    '''
+    import capture
+    metadata, records = capture.read_capture(path)
+    packet_type = packet_type or metadata.get('packetType')
+    if packet_type not in LAYOUTS:
+        raise ValueError('{0} has {1} packets, N0 or N1 are needed'.format(os.path.basename(path), packet_type))
+    data = b''.join(chunk for host_time, direction, chunk in records if direction == b'R')
+    return decode(frames(data, packet_type), packet_type)
+
+def read_log(path, t0=None, t1=None):
+    '''FIELDS of a capture of N0/N1 packets or of a CSV or binary log of them
+    '''
+    import capture
+    import log_reader
+    with open(path, 'rb') as f:
+        is_capture = f.read(len(capture.MAGIC)) == capture.MAGIC
+    if is_capture:
+        columns = read_capture(path)
+        if t0 is not None or t1 is not None:
+            keep = (columns['time'] >= (t0 if t0 is not None else -float('inf'))) & (columns['time'] <= (t1 if t1 is not None else float('inf')))
+            columns = collections.OrderedDict((k, v[keep]) for k, v in columns.items())
+        return collections.OrderedDict((k, columns[k]) for k in FIELDS)
+    if path.endswith('.log.bin'):
+        return log_reader.read_columns(path, FIELDS, t0, t1)
+    with log_reader.open_log(path) as f:
+        names = f.readline().decode().strip().split(',')
+    if 'latitude' not in names:
+        raise ValueError(os.path.basename(path) + ' has no latitude, it is not a log of N0/N1 packets')
+    return log_reader.read_columns(path, [k for k in FIELDS if k in names], t0, t1)
+
+def to_ecef(latitude, longitude, altitude):
+    '''WGS-84 geodetic to ECEF meters, arrays of degrees and meters
+        :returns:
+            N x 3 array
+    '''
+    import numpy as np
+    phi = np.radians(latitude)
+    lam = np.radians(longitude)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    n = SEMI_MAJOR / np.sqrt(1.0 - E2 * sin_phi * sin_phi)
+    return np.stack([(n + altitude) * cos_phi * np.cos(lam), (n + altitude) * cos_phi * np.sin(lam),
+                     (n * (1.0 - E2) + altitude) * sin_phi], axis=-1)
+
+def to_enu(ecef, origin):
+    '''ECEF points (N x 3) to east, north, up meters about origin, a (latitude, longitude, altitude) fix
+    '''
+    import numpy as np
+    phi, lam = np.radians(origin[0]), np.radians(origin[1])
+    rotation = np.array([[-np.sin(lam), np.cos(lam), 0.0],
+                         [-np.sin(phi) * np.cos(lam), -np.sin(phi) * np.sin(lam), np.cos(phi)],
+                         [np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)]])
+    return (np.asarray(ecef) - to_ecef(*origin)) @ rotation.T
+
+def segment_distance(p, a, b):
+    '''Distance of each point of p from the segment a - b, all N x 3
+    '''
+    import numpy as np
+    ab = b - a
+    ap = p - a
+    length2 = np.einsum('ij,ij->i', ab, ab)
+    t = np.einsum('ij,ij->i', ap, ab) / np.where(length2 > 0, length2, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    d = ap - t[:, None] * ab
+    return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+def simplify(points, tolerance):
+    '''Douglas-Peucker over N x 3 points
+        :returns:
+            bool array, True for the points kept, always the first and last
+    '''
+    import numpy as np
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    x, y, z = [np.ascontiguousarray(points[:, i]) for i in range(3)]
+    # undecided points in order with the ends of the segment each lies in, so a segment's points are contiguous
+    active = np.arange(1, n - 1)
+    left = np.zeros(len(active), dtype=np.intp)
+    right = np.full(len(active), n - 1, dtype=np.intp)
+    while len(active):
+        first = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+        group = np.repeat(np.arange(len(first)), np.diff(np.r_[first, len(active)]))
+        # chord of every segment, then the squared distance of every point from its chord
+        a = left[first]
+        ax, ay, az = x[a], y[a], z[a]
+        bx, by, bz = x[right[first]] - ax, y[right[first]] - ay, z[right[first]] - az
+        length2 = bx * bx + by * by + bz * bz
+        scale = np.where(length2 > 0, 1.0 / np.where(length2 > 0, length2, 1.0), 0.0)
+        gx, gy, gz = bx[group], by[group], bz[group]
+        px, py, pz = x[active] - ax[group], y[active] - ay[group], z[active] - az[group]
+        t = np.clip((px * gx + py * gy + pz * gz) * scale[group], 0.0, 1.0)
+        px -= t * gx
+        py -= t * gy
+        pz -= t * gz
+        d = px * px + py * py + pz * pz
+        maxima = np.maximum.reduceat(d, first)
+        split = (maxima > tolerance * tolerance)[group]
+        # the first point at the maximum of every segment that is split
+        at = np.flatnonzero((d == maxima[group]) & split)
+        at = at[np.r_[True, group[at[1:]] != group[at[:-1]]]] if len(at) else at
+        keep[active[at]] = True
+        middle = np.zeros(len(first), dtype=np.intp)
+        middle[group[at]] = active[at]
+        middle = middle[group]
+        left = np.where(split & (active > middle), middle, left)
+        right = np.where(split & (active < middle), middle, right)
+        undecided = split & (active != middle)
+        active, left, right = active[undecided], left[undecided], right[undecided]
+    return keep
+
+def track(columns, tolerance=None, origin=None):
+    '''Fixes of columns (time, latitude, longitude, altitude, optionally velocities) with ECEF x, y, z and
+       east, north, up about origin, default the first fix, simplified to tolerance meters if given
+        :returns:
+            OrderedDict of arrays and the number of fixes before simplification
+    '''
+    import numpy as np
+    fix = (columns['latitude'] != 0) | (columns['longitude'] != 0)
+    result = collections.OrderedDict((k, np.asarray(columns[k], dtype=float)[fix]) for k in FIELDS if k in columns)
+    fixes = len(result['latitude'])
+    if not fixes:
+        raise ValueError('no position fix in the samples')
+    if origin is None:
+        origin = (result['latitude'][0], result['longitude'][0], result['altitude'][0])
+    ecef = to_ecef(result['latitude'], result['longitude'], result['altitude'])
+    enu = to_enu(ecef, origin)
+    if tolerance:
+        keep = simplify(enu, tolerance)
+        result = collections.OrderedDict((k, v[keep]) for k, v in result.items())
+        ecef, enu = ecef[keep], enu[keep]
+    for i, k in enumerate(['ecefX', 'ecefY', 'ecefZ']):
+        result[k] = ecef[:, i]
+    for i, k in enumerate(['east', 'north', 'up']):
+        result[k] = enu[:, i]
+    return result, fixes
+
+FORMATS = { 'time' : '%.3f', 'latitude' : '%.8f', 'longitude' : '%.8f', 'altitude' : '%.2f' }
+
+def write_csv(path, columns, chunk=65536):
+    '''Writes a track as CSV, chunk rows formatted at a time
+    '''
+    import numpy as np
+    names = list(columns)
+    values = np.stack([columns[k] for k in names], axis=1)
+    formats = ','.join(FORMATS.get(k, '%.3f') for k in names)
+    with open(path + '.part', 'w') as f:
+        f.write(','.join(names) + '\n')
+        for start in range(0, len(values), chunk):
+            np.savetxt(f, values[start:start + chunk], fmt=formats)
+    os.replace(path + '.part', path)
+
+def coordinates(columns, row_format, separator, chunk=65536):
+    '''lon, lat, alt of every row formatted by row_format, as a generator of text chunks
+    '''
+    import io
+    import numpy as np
+    values = np.stack([columns['longitude'], columns['latitude'], columns['altitude']], axis=1)
+    for start in range(0, len(values), chunk):
+        text = io.StringIO()
+        np.savetxt(text, values[start:start + chunk], fmt=row_format, newline=separator)
+        yield (separator if start else '') + text.getvalue()[:-len(separator)]
+
+def write_geojson(path, columns, properties=None):
+    '''One LineString feature, coordinates [longitude, latitude, altitude] to 1e-7 degree (about 1 cm)
+    '''
+    properties = dict(properties or {}, points=len(columns['latitude']))
+    if 'time' in columns:
+        properties.update(start=float(columns['time'][0]), end=float(columns['time'][-1]))
+    # the coordinates are written in chunks between the rest of the document
+    head, tail = json.dumps({ 'type' : 'FeatureCollection', 'features' : [{ 'type' : 'Feature', 'properties' : properties,
+                                                                          'geometry' : { 'type' : 'LineString', 'coordinates' : '@' }}]}).split('"@"')
+    with open(path + '.part', 'w') as f:
+        f.write(head + '[')
+        for text in coordinates(columns, '[%.7f,%.7f,%.2f]', ','):
+            f.write(text)
+        f.write(']' + tail)
+    os.replace(path + '.part', path)
+
+def write_kml(path, columns, name='track'):
+    from xml.sax.saxutils import escape
+    with open(path + '.part', 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+                '<Placemark><name>{0}</name><LineString><altitudeMode>absolute</altitudeMode><coordinates>\n'.format(escape(name)))
+        for text in coordinates(columns, '%.7f,%.7f,%.2f', '\n'):
+            f.write(text)
+        f.write('\n</coordinates></LineString></Placemark>\n</Document>\n</kml>\n')
+    os.replace(path + '.part', path)
+
+def export(columns, path, tolerance=None, properties=None):
+    '''Writes the track of columns to path, GeoJSON, KML or CSV by its extension (.geojson/.json, .kml, .csv)
+        :returns:
+            dict of file, fixes, points written and tolerance
+    '''
+    result, fixes = track(columns, tolerance)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.geojson', '.json'):
+        write_geojson(path, result, dict(properties or {}, tolerance=tolerance))
+    elif extension == '.kml':
+        write_kml(path, result, os.path.splitext(os.path.basename(path))[0])
+    elif extension == '.csv':
+        write_csv(path, result)
+    else:
+        raise ValueError('unknown track format ' + extension + ', use .geojson, .kml or .csv')
+    return { 'file' : os.path.basename(path), 'fixes' : fixes, 'points' : len(result['latitude']), 'tolerance' : tolerance }
+
+class TrackRecorder:
+    name = 'navtrack'
+
+    def __init__(self, interval=0.1, max_fixes=MAX_FIXES):
+        '''Pipeline stage keeping a fix every interval seconds of sample time, 0 for every sample, and
+           at most max_fixes rounded up to whole chunks, the oldest chunk going when a new one is needed
+        '''
+        self.interval = interval
+        self.max_chunks = max(1, -(-max_fixes // CHUNK))
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        import numpy as np
+        with self.lock:
+            self.chunks = [np.zeros((CHUNK, len(FIELDS)))]
+            self.count = 0          # rows in the last chunk
+            self.dropped = 0        # fixes dropped with the oldest chunks
+            self.next = None        # sample time of the next fix kept
+
+    def __call__(self, data):
+        if 'latitude' not in data or (data['latitude'] == 0 and data['longitude'] == 0):
+            return
+        t = data['time']
+        if self.next is not None and self.next - self.interval <= t < self.next:
+            return
+        # a microsecond of slack, sample times are sums of millisecond steps
+        self.next = t + self.interval - 1e-6
+        with self.lock:
+            if self.count == CHUNK:
+                if len(self.chunks) == self.max_chunks:
+                    # reuse the oldest chunk
+                    self.chunks.append(self.chunks.pop(0))
+                    self.dropped += CHUNK
+                else:
+                    import numpy as np
+                    self.chunks.append(np.zeros((CHUNK, len(FIELDS))))
+                self.count = 0
+            self.chunks[-1][self.count] = [data.get(k, 0.0) for k in FIELDS]
+            self.count += 1
+
+    def columns(self):
+        '''Copy of the fixes kept, an OrderedDict of FIELDS arrays
+        '''
+        import numpy as np
+        with self.lock:
+            values = np.concatenate(self.chunks[:-1] + [self.chunks[-1][:self.count]])
+        return collections.OrderedDict((k, values[:, i]) for i, k in enumerate(FIELDS))
+
+    def status(self):
+        with self.lock:
+            return { 'fixes' : CHUNK * (len(self.chunks) - 1) + self.count, 'interval' : self.interval,
+                     'maxFixes' : CHUNK * self.max_chunks, 'dropped' : self.dropped }
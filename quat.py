@@ -1,5 +1,7 @@
 import math
 
+BLOCK = 128         # samples per block of the integrate scan
+
 class Quat:
     def __init__(self):
         self.q = [1.0, 0.0, 0.0, 0.0]
@@ -45,17 +47,27 @@ class Quat:
 
         qMag = math.sqrt(tmpq[0] * tmpq[0] + tmpq[1] * tmpq[1] + tmpq[2] * tmpq[2] + tmpq[3] * tmpq[3])
         
-        if qMag == 0.0:
-            pass
-        elif self.q[0] < 0.0:
+        # keep the scalar part positive, q and -q are the same rotation
+        if tmpq[0] < 0.0:
             qMag = -1*qMag
         
-        if qMag > 0.0: 
+        if qMag != 0.0: 
             self.q[0] = tmpq[0]/qMag
             self.q[1] = tmpq[1]/qMag
             self.q[2] = tmpq[2]/qMag        
             self.q[3] = tmpq[3]/qMag
 
+    def update_quats(self, rates, dt):
+        '''Integrates N samples at once, rates is N x 3 (wx, wy, wz) and dt a scalar or N per sample
+           intervals.  Continues from and updates self.q
+            :returns:
+                N x 4 numpy array of the quaternion after each sample
+        '''
+        history = integrate(rates, dt, self.q)
+        if len(history):
+            self.q = [float(v) for v in history[-1]]
+        return history
+
     def to_matrix4(self):
         w = self.q[0]
         x = self.q[1]
@@ -118,16 +130,189 @@ class Quat:
             thetaZ = math.atan2(mtx[2][0], mtx[0][0])
             thetaY = 0.0
 
-        hdgDegrees = 57.29 * thetaY
-        pitchDegrees = 57.29 * thetaX
-        rollDegrees = 57.29 * thetaZ
+        hdgDegrees = math.degrees(thetaY)
+        pitchDegrees = math.degrees(thetaX)
+        rollDegrees = math.degrees(thetaZ)
 
         print('{0:2.3f},{1:2.3f},{2:2.3f}'.format(hdgDegrees,pitchDegrees,rollDegrees))
     
     def print_euler(self):
-        
-        eroll  = 57.29 * math.atan2(2.0 * (self.q[3] * self.q[2] + self.q[0] * self.q[1]) , 1.0 - 2.0 * (self.q[1] * self.q[1] + self.q[2] * self.q[2]))
-        epitch = 57.29 * math.asin(2.0 * (self.q[2] * self.q[0] - self.q[3] * self.q[1]))
-        eyaw   = 57.29 * math.atan2(2.0 * (self.q[3] * self.q[0] + self.q[1] * self.q[2]) , - 1.0 + 2.0 * (self.q[0] * self.q[0] + self.q[1] * self.q[1]))
-
+        eroll, epitch, eyaw = [math.degrees(angle) for angle in self.to_euler()]
         print('{0:2.3f},{1:2.3f},{2:2.3f}'.format(eroll,epitch,eyaw))
+
+    def to_euler(self):
+        '''Roll, pitch, yaw in radians, see to_euler
+        '''
+        return to_euler(self.q)
+
+    def to_dcm(self):
+        '''Body to NED direction cosine matrix, see to_dcm
+        '''
+        return to_dcm(self.q)
+
+def single(q):
+    '''True for one quaternion or angle triple given as a plain list or tuple, which the conversions
+       below do with math and return as lists.  Anything else is treated as a numpy array with the
+       components on the last axis (last two for matrices) and converted in one vectorized pass
+    '''
+    return not hasattr(q, 'shape') and not hasattr(q[0], '__len__')
+
+def to_dcm(q):
+    '''Body to NED direction cosine matrix of quaternion [w, x, y, z], the transpose of to_matrix4's
+       upper left 3 x 3
+        :returns:
+            3 x 3 nested lists, or an (..., 3, 3) array for an (..., 4) array of quaternions
+    '''
+    if single(q):
+        w, x, y, z = q
+        return [[1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - w * z), 2.0 * (x * z + w * y)],
+                [2.0 * (x * y + w * z), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - w * x)],
+                [2.0 * (x * z - w * y), 2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)]]
+    import numpy as np
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    return np.stack([np.stack([1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - w * z), 2.0 * (x * z + w * y)], axis=-1),
+                     np.stack([2.0 * (x * y + w * z), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - w * x)], axis=-1),
+                     np.stack([2.0 * (x * z - w * y), 2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)], axis=-1)], axis=-2)
+
+def from_dcm(m):
+    '''Quaternion with positive scalar part of a body to NED direction cosine matrix.  Solves for the
+       largest of w, x, y, z first (Shepperd) so no division gets close to zero
+        :returns:
+            [w, x, y, z], or an (..., 4) array for an (..., 3, 3) array of matrices
+    '''
+    if not hasattr(m, 'shape') and single(m[0]):
+        trace = m[0][0] + m[1][1] + m[2][2]
+        largest = max(range(4), key=lambda k: [trace, m[0][0], m[1][1], m[2][2]][k])
+        if largest == 0:
+            w = 0.5 * math.sqrt(max(0.0, 1.0 + trace))
+            q = [w, (m[2][1] - m[1][2]) / (4 * w), (m[0][2] - m[2][0]) / (4 * w), (m[1][0] - m[0][1]) / (4 * w)]
+        elif largest == 1:
+            x = 0.5 * math.sqrt(max(0.0, 1.0 + 2.0 * m[0][0] - trace))
+            q = [(m[2][1] - m[1][2]) / (4 * x), x, (m[0][1] + m[1][0]) / (4 * x), (m[0][2] + m[2][0]) / (4 * x)]
+        elif largest == 2:
+            y = 0.5 * math.sqrt(max(0.0, 1.0 + 2.0 * m[1][1] - trace))
+            q = [(m[0][2] - m[2][0]) / (4 * y), (m[0][1] + m[1][0]) / (4 * y), y, (m[1][2] + m[2][1]) / (4 * y)]
+        else:
+            z = 0.5 * math.sqrt(max(0.0, 1.0 + 2.0 * m[2][2] - trace))
+            q = [(m[1][0] - m[0][1]) / (4 * z), (m[0][2] + m[2][0]) / (4 * z), (m[1][2] + m[2][1]) / (4 * z), z]
+        return q if q[0] >= 0.0 else [-v for v in q]
+    import numpy as np
+    m = np.asarray(m, dtype=float)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+    trace = m00 + m11 + m22
+    # candidates solved from each of w, x, y, z, each scaled by 4 times that component
+    candidates = np.stack([np.stack([1.0 + trace, m21 - m12, m02 - m20, m10 - m01], axis=-1),
+                           np.stack([m21 - m12, 1.0 + 2.0 * m00 - trace, m01 + m10, m02 + m20], axis=-1),
+                           np.stack([m02 - m20, m01 + m10, 1.0 + 2.0 * m11 - trace, m12 + m21], axis=-1),
+                           np.stack([m10 - m01, m02 + m20, m12 + m21, 1.0 + 2.0 * m22 - trace], axis=-1)])
+    largest = np.argmax(np.stack([trace, m00, m11, m22]), axis=0)
+    q = np.take_along_axis(candidates, largest[None, ..., None], axis=0)[0]
+    q /= np.sqrt(np.sum(q * q, axis=-1, keepdims=True))
+    q[q[..., 0] < 0.0] *= -1
+    return q
+
+def to_euler(q):
+    '''Roll, pitch, yaw in radians (z-y-x rotation order) of quaternion [w, x, y, z], the exact form of
+       Quat.print_euler's angles
+        :returns:
+            [roll, pitch, yaw], or an (..., 3) array for an (..., 4) array of quaternions
+    '''
+    if single(q):
+        w, x, y, z = q
+        return [math.atan2(2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)),
+                math.asin(max(-1.0, min(1.0, 2.0 * (w * y - x * z)))),
+                math.atan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))]
+    import numpy as np
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    return np.stack([np.arctan2(2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)),
+                     np.arcsin(np.clip(2.0 * (w * y - x * z), -1.0, 1.0)),
+                     np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))], axis=-1)
+
+def from_euler(angles):
+    '''Quaternion with positive scalar part of [roll, pitch, yaw] in radians
+        :returns:
+            [w, x, y, z], or an (..., 4) array for an (..., 3) array of angles
+    '''
+    if single(angles):
+        cr, sr = math.cos(0.5 * angles[0]), math.sin(0.5 * angles[0])
+        cp, sp = math.cos(0.5 * angles[1]), math.sin(0.5 * angles[1])
+        cy, sy = math.cos(0.5 * angles[2]), math.sin(0.5 * angles[2])
+        q = [cr * cp * cy + sr * sp * sy, sr * cp * cy - cr * sp * sy, cr * sp * cy + sr * cp * sy, cr * cp * sy - sr * sp * cy]
+        return q if q[0] >= 0.0 else [-v for v in q]
+    import numpy as np
+    roll, pitch, yaw = np.moveaxis(0.5 * np.asarray(angles, dtype=float), -1, 0)
+    cr, sr, cp, sp, cy, sy = np.cos(roll), np.sin(roll), np.cos(pitch), np.sin(pitch), np.cos(yaw), np.sin(yaw)
+    q = np.stack([cr * cp * cy + sr * sp * sy, sr * cp * cy - cr * sp * sy, cr * sp * cy + sr * cp * sy, cr * cp * sy - sr * sp * cy], axis=-1)
+    q[q[..., 0] < 0.0] *= -1
+    return q
+
+def increments(rates, dt):
+    '''Rotation quaternions of each sample, the same series approximation of sin(eta / 2) as update_quat
+        :returns:
+            N x 4 numpy array
+    '''
+    import numpy as np
+    rvec = np.asarray(rates, dtype=float).reshape(-1, 3) * np.broadcast_to(np.asarray(dt, dtype=float), (len(rates),))[:, None]
+    fetarad2 = np.einsum('ij,ij->i', rvec, rvec)
+    fetarad = np.sqrt(fetarad2)
+    sinhalfeta = np.where(fetarad2 < 0.02, fetarad * (0.5 - 0.02083333333 * fetarad2),
+                          np.where(fetarad2 < 0.06, fetarad * (0.5 - 0.02083333333 * fetarad2 + 0.0002604166667 * fetarad2 * fetarad2),
+                                   np.sin(0.5 * fetarad)))
+    ftmp = np.divide(sinhalfeta, fetarad, out=np.zeros_like(fetarad), where=fetarad != 0.0)
+    pq = np.empty((len(rvec), 4))
+    pq[:, 1:] = rvec * ftmp[:, None]
+    pq[:, 0] = np.sqrt(np.maximum(0.0, 1.0 - np.einsum('ij,ij->i', pq[:, 1:], pq[:, 1:])))
+    return pq
+
+def multiply(q, p):
+    '''Quaternion product q * p as in update_quat, components along the first axis so (4, ...) arrays
+       multiply element wise
+    '''
+    import numpy as np
+    q0, q1, q2, q3 = q
+    p0, p1, p2, p3 = p
+    return np.array([q0*p0 - q1*p1 - q2*p2 - q3*p3,
+                     q0*p1 + p0*q1 + q2*p3 - q3*p2,
+                     q0*p2 + p0*q2 + q3*p1 - q1*p3,
+                     q0*p3 + p0*q3 + q1*p2 - q2*p1])
+
+def scan(product):
+    '''Running product along the last axis of a (4, ..., N) array, in place, in log2(N) whole array steps.
+       After the step of width k every element holds the product of the 2k elements ending at it
+    '''
+    n = product.shape[-1]
+    k = 1
+    while k < n:
+        product[..., k:] = multiply(product[..., :-k], product[..., k:])
+        k *= 2
+    return product
+
+def integrate(rates, dt, q=(1.0, 0.0, 0.0, 0.0)):
+    '''Batch equivalent of calling update_quat once per sample starting from q
+        :returns:
+            N x 4 numpy array of the quaternion after each sample
+
+    Renormalizing only scales, so q after n samples is the running product q * p1 * ... * pn scaled
+    to unit length with a positive scalar part.  The running product is scanned within blocks of
+    BLOCK samples, the block totals are scanned, and each block is then premultiplied by the product
+    of everything before it.
+    '''
+    import numpy as np
+    p = increments(rates, dt)
+    n = len(p)
+    if n == 0:
+        return p
+    blocks = -(-n // BLOCK)
+    product = np.zeros((4, blocks * BLOCK))
+    product[0] = 1.0                    # identity pads the last block
+    product[:, :n] = p.T
+    product = scan(product.reshape(4, blocks, BLOCK))
+    carry = np.empty((4, blocks))
+    carry[:, 0] = q
+    carry[:, 1:] = multiply(np.asarray(q, dtype=float)[:, None], scan(product[:, :-1, -1].copy()))
+    product = multiply(carry[:, :, None], product).reshape(4, -1)[:, :n]
+    qMag = np.sqrt(np.einsum('ij,ij->j', product, product))
+    qMag[product[0] < 0.0] *= -1
+    return (product / qMag).T
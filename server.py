@@ -5,118 +5,581 @@ from tornado.ioloop import PeriodicCallback
 import tornado.web
 import json
 import time
-import cffi
 import math
-import imu380
+import device_manager
 import threading
+import collections
 import os
+import traceback
+import log_reader
+import catalog
+import storage
+import broadcast
+import encoding
+import commands
+import asyncio
+import argparse
+import estimator
+import stats
+import calibration
+import spectrum
+import events
+import alignment
+import magcal
+import navexport
 
 server_version = '0.1 Beta'
 
 callback_rate = 50
 
+# per client outbound queue, see broadcast.SendQueue for the policies
+send_queue_depth = 32
+send_queue_policy = 'drop_oldest'
+
+log_files = log_reader.LogReader('data')
+log_catalog = catalog.LogCatalog('data', log_files)
+catalog_rescan_rate = 30000
+
+# add estimator.Estimator roll/pitch/yaw to every device's S0/S1 samples, set by --estimator
+estimate_attitude = False
+# device -> calibration parameters applied before every other stage, loaded from --calibration
+calibrations = {}
+# add a spectrum.Spectrum vibration stage to every device, set by --spectrum
+vibration_spectra = False
+# events.EventDetector configuration for every device, loaded from --events
+event_config = None
+# alignment.Aligner merging every device onto the host clock, created by --align
+aligner = None
+align_flush_rate = 100
+# seconds between the fixes navexport.TrackRecorder keeps of every N0/N1 device, set by --track
+track_interval = None
+
+# device_id -> Device, in discovery order.  Only changed on the IOLoop
+devices = collections.OrderedDict()
+# clients connected before a device they can use was found -> requested device_id, None for any
+waiting = {}
+# requests answered without a device
+DEVICELESS_ACTIONS = ['listDevices', 'selectDevice', 'listFiles', 'loadFile', 'subscribe', 'allanDeviation', 'aligned', 'alignLogs', 'exportTrack']
+
+class Device:
+    def __init__(self, imu):
+        '''A device served to websocket clients, with its own broadcaster tick and command thread
+        '''
+        self.imu = imu
+        self.broadcaster = broadcast.Broadcaster(imu, callback_rate)
+        self.commands = commands.DeviceCommandExecutor(imu)
+        # an imu that reconnects keeps its stages
+        parameters = calibration.for_device(calibrations, imu.device_id)
+        if parameters and not any(isinstance(stage, calibration.Calibration) for stage in imu.stages):
+            imu.add_stage(calibration.Calibration(parameters), 0)
+        if estimate_attitude and not any(isinstance(stage, estimator.Estimator) for stage in imu.stages):
+            imu.add_stage(estimator.Estimator())
+        self.stats = next((stage for stage in imu.stages if isinstance(stage, stats.RunningStats)), None)
+        if self.stats is None:
+            self.stats = stats.RunningStats()
+            imu.add_stage(self.stats)
+        self.spectrum = next((stage for stage in imu.stages if isinstance(stage, spectrum.Spectrum)), None)
+        if self.spectrum is None and vibration_spectra:
+            self.spectrum = spectrum.Spectrum()
+            imu.add_stage(self.spectrum)
+        if self.spectrum is not None:
+            # published on the spectrum worker thread
+            self.spectrum.listeners[:] = [spectrum.SpectrumLog(imu), lambda result: loop.add_callback(self.publish_spectrum, result)]
+        self.events = next((stage for stage in imu.stages if isinstance(stage, events.EventDetector)), None)
+        if self.events is None and event_config is not None:
+            self.events = events.EventDetector(imu, events.predicates(event_config), event_config.get('pre', 1.0), event_config.get('post', 1.0),
+                                               max_duration=event_config.get('maxDuration', 60.0))
+            imu.add_stage(self.events)
+        if self.events is not None:
+            # told on the reader thread when an event triggers and on the writer thread once it is saved
+            self.events.listeners[:] = [lambda event: loop.add_callback(self.publish_event, event)]
+        # magcal.MagCollector of a magCalibration session and its latest fit
+        self.magcal = next((stage for stage in imu.stages if isinstance(stage, magcal.MagCollector)), None)
+        self.magcal_result = None
+        self.track = next((stage for stage in imu.stages if isinstance(stage, navexport.TrackRecorder)), None)
+        if self.track is None and track_interval is not None:
+            self.track = navexport.TrackRecorder(track_interval)
+            imu.add_stage(self.track)
+        if aligner is not None:
+            tap = aligner.tap(imu)
+            if tap not in imu.stages:
+                imu.add_stage(tap)
+
+    def status(self):
+        return { 'deviceId' : self.imu.device_id, 'packetType' : self.imu.packet_type, 'odrSetting' : self.imu.odr_setting,
+                 'connected' : self.imu.connected, 'logging' : self.imu.logging, 'clients' : len(self.broadcaster.clients),
+                 'stages' : self.imu.stage_status() }
+
+    def apply_mag_calibration(self, result):
+        '''Replaces the device's calibration stage with one correcting mags by result, keeping the collector
+           ahead of it on raw mags
+        '''
+        parameters = dict(calibration.for_device(calibrations, self.imu.device_id) or {}, mag=magcal.to_calibration(result))
+        for stage in [s for s in self.imu.stages if isinstance(s, (calibration.Calibration, magcal.MagCollector))]:
+            self.imu.remove_stage(stage)
+        self.imu.add_stage(calibration.Calibration(parameters), 0)
+        if self.magcal is not None:
+            self.imu.add_stage(self.magcal, 0)
+        return parameters
+
+    def publish_event(self, event):
+        '''Sends an event to every client of this device, on the IOLoop.  Events are never dropped by send queues
+        '''
+        message = json.dumps({ 'messageType' : 'event', 'data' : { 'detectedEvent' : event }})
+        for client in list(self.broadcaster.clients):
+            client.send(message, keep=True)
+
+    def publish_spectrum(self, result):
+        '''Sends a spectrum to the clients of this device that asked for spectra, on the IOLoop
+        '''
+        message = json.dumps({ 'messageType' : 'event', 'data' : { 'spectrum' : dict(result, deviceId=self.imu.device_id) }})
+        for client in list(self.broadcaster.clients):
+            if client.spectrum:
+                client.send(message)
+
+def device_event(event, imu):
+    '''device_manager listener, runs on the discovery thread so hands over to the IOLoop
+    '''
+    loop.add_callback(update_devices, event, imu)
+
+def update_devices(event, imu):
+    '''Creates or retires the Device of imu.  Clients of a removed device wait for it to come back
+    '''
+    if event == 'added':
+        device = Device(imu)
+        devices[imu.device_id] = device
+        for client, wanted in list(waiting.items()):
+            if wanted is None or wanted == imu.device_id:
+                client.attach_device(device)
+    elif event == 'removed':
+        # imu.disconnect() has already cleared device_id, find the entry by its imu
+        key = next((key for key, device in devices.items() if device.imu is imu), None)
+        if key is not None:
+            device = devices.pop(key)
+            device.commands.shutdown()
+            for client in list(device.broadcaster.clients):
+                client.detach_device()
+                waiting[client] = key
+
+def publish_aligned():
+    '''Sends the merged rows of every device since the last call to the clients that asked for them
+    '''
+    columns = aligner.flush()
+    if columns is None:
+        return
+    fields = list(columns)
+    rows = [[None if v != v else v for v in row] for row in zip(*[columns[k].tolist() for k in fields])]
+    message = json.dumps({ 'messageType' : 'event', 'data' : { 'aligned' : { 'fields' : fields, 'rows' : rows }}})
+    for device in list(devices.values()):
+        for client in list(device.broadcaster.clients):
+            if client.aligned:
+                client.send(message)
+
+def align_logs(names, rate, fields):
+    '''Writes the merge of logs to data/aligned-<date>.csv, returns the file name and row count
+    '''
+    columns = alignment.align_logs([log_files.path(name) for name in names], rate, fields)
+    name = 'aligned-' + time.strftime('%Y_%m_%d_%H_%M_%S') + '.csv'
+    alignment.write_csv(os.path.join('data', name), columns)
+    return name, len(columns['time'])
+
+def export_track(columns, label, extension, tolerance, properties):
+    '''Writes a track to data/track-<label>-<date>.<extension>, returns navexport.export's summary
+    '''
+    name = 'track-' + label + '-' + time.strftime('%Y_%m_%d_%H_%M_%S') + '.' + extension
+    return navexport.export(columns, os.path.join('data', name), tolerance, properties)
+
+def field_command(imu, command, fields):
+    '''Runs a GF/RF/SF/WF driver command and returns the device to streaming, on the device command thread
+    '''
+    data = command(fields, True)
+    imu.restore_odr()
+    return data
+
 class WSHandler(tornado.websocket.WebSocketHandler):
             
     def open(self):
         self.__time = 1
-        self.callback = PeriodicCallback(self.send_data, callback_rate)
-        self.callback.start()
+        self.streaming = True
+        # sample encoding is negotiated with ?encoding=json|packed|msgpack, json by default
+        self.encoding = encoding.get_encoding(self.get_argument('encoding', 'json'))
+        self.schemas = {}
+        # ?mode=all sends every sample since the previous tick in one batch, default latest sample only
+        self.mode = self.get_argument('mode', 'latest')
+        self.cursor = 0
+        # set by a subscribe request, see broadcast.Subscription
+        self.subscription = None
+        # set by a spectrum request, see Device.publish_spectrum
+        self.spectrum = False
+        # set by an aligned request, see publish_aligned
+        self.aligned = False
+        # ?policy= overrides how this client's send queue sheds load when it falls behind
+        policy = self.get_argument('policy', send_queue_policy)
+        self.queue = broadcast.SendQueue(self.write_message, self.close, send_queue_depth, policy if policy in broadcast.POLICIES else send_queue_policy)
+        # ?deviceId= picks the device, default the first one found
+        self.device = None
+        wanted = self.get_argument('deviceId', None)
+        device = devices.get(wanted) if wanted else next(iter(devices.values()), None)
+        if device is not None:
+            self.attach_device(device)
+        else:
+            waiting[self] = wanted
+
+    def attach_device(self, device):
+        '''Moves this client to the broadcaster of device.  Subscriptions belong to a broadcaster and are dropped
+        '''
+        self.detach_device()
+        waiting.pop(self, None)
+        self.device = device
+        self.cursor = device.imu.sample_seq
+        device.broadcaster.add(self)
+
+    def detach_device(self):
+        if self.device is not None:
+            self.device.broadcaster.remove(self)
+            self.device = None
         
-    def send_data(self):
-        if imu.connect and imu.stream_mode:
-            d = imu.get_latest()
-            print(imu.packet_type)
-            print(d)
-            self.write_message(json.dumps({ 'messageType' : 'event',  'data' : { 'newOutput' : d }}))
-
-    def on_message(self, message):
-        global imu
+    def send(self, message, binary=False, keep=False):
+        '''Queues an already encoded broadcast message, passing bytes skips per client encoding
+        '''
+        try:
+            self.queue.put(message, binary, keep)
+        except tornado.websocket.WebSocketClosedError:
+            self.detach_device()
+
+    async def on_message(self, message):
+        '''Handles ANS requests.  Device commands run on the device command executor and are awaited, so the
+           IOLoop keeps serving other clients.  Tornado delivers this client's next message once this returns
+        '''
         message = json.loads(message)
         # Except for a few exceptions stop the automatic message transmission if a message is received
-        if message['messageType'] != 'serverStatus' and list(message['data'].keys())[0] != 'startLog' and list(message['data'].keys())[0] != 'stopLog':
-            self.callback.stop()
-            time.sleep(1)
+        if message['messageType'] != 'serverStatus' and list(message['data'].keys())[0] not in ['startLog', 'stopLog', 'subscribe', 'listDevices', 'selectDevice', 'resetStats', 'spectrum', 'aligned', 'magCalibration']:
+            self.streaming = False
+            await asyncio.sleep(1)
+        try:
+            await self.handle_message(message)
+        except commands.CommandTimeout as err:
+            print(err)
+            self.reply_error(message, str(err))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+        except Exception as err:
+            # a driver or request error, e.g. an IndexError of set_fields on an empty response, still gets its answer
+            traceback.print_exc()
+            self.reply_error(message, type(err).__name__ + ': ' + str(err))
+
+    def reply_error(self, message, error):
+        try:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { list(message['data'].keys())[0] : None, "error" : error }}))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    async def handle_message(self, message):
+        device = self.device
+        if device is None and message['messageType'] == 'requestAction' and list(message['data'].keys())[0] not in DEVICELESS_ACTIONS:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { list(message['data'].keys())[0] : None, "error" : "no device" }}))
+            return
+        imu = device.imu if device is not None else None
         if message['messageType'] == 'serverStatus':
-            if imu.logging:
+            if imu is not None and imu.logging:
                 fileName = imu.logger.user['fileName']
             else:
                 fileName = ''
-            if imu.device_id:
+            if imu is not None and imu.device_id:
                 with open('imu.json') as json_data:
                     imu_properties = json.load(json_data)
                     imu.imu_properties = imu_properties
                 self.write_message(json.dumps({ 'messageType' : 'serverStatus', 'data' : { 'serverVersion' : server_version, 'serverUpdateRate' : callback_rate, 'packetType' : imu.packet_type,
-                                                                                            'deviceId' : imu.device_id, 'deviceProperties' : imu_properties, 'logging' : imu.logging, 'fileName' : fileName }}))
+                                                                                            'deviceId' : imu.device_id, 'deviceProperties' : imu_properties, 'logging' : imu.logging, 'fileName' : fileName,
+                                                                                            'encoding' : self.encoding.name, 'encodings' : encoding.available_encodings(),
+                                                                                            'sendQueue' : self.queue.metrics(), 'clients' : device.broadcaster.metrics(), 'devices' : list(devices),
+                                                                                            'stages' : imu.stage_status(), 'stats' : device.stats.snapshot(),
+                                                                                            'events' : device.events.status() if device.events else None,
+                                                                                            'alignment' : aligner.status() if aligner else None,
+                                                                                            'track' : device.track.status() if device.track else None }}))
             else:
                 self.write_message(json.dumps({ 'messageType' : 'serverStatus', 'data' : { 'serverVersion' : server_version, 'serverUpdateRate' : callback_rate,
-                                                                                            'deviceId' : imu.device_id, 'logging' : imu.logging, 'fileName' : fileName }}))
+                                                                                            'deviceId' : imu.device_id if imu else 0, 'logging' : imu.logging if imu else 0, 'fileName' : fileName,
+                                                                                            'encoding' : self.encoding.name, 'encodings' : encoding.available_encodings(),
+                                                                                            'sendQueue' : self.queue.metrics(), 'clients' : device.broadcaster.metrics() if device else [], 'devices' : list(devices) }}))
         elif message['messageType'] == 'requestAction':
             if list(message['data'].keys())[0] == 'getFields':
-                data = imu.get_fields(list(map(int,message['data']['getFields'].keys())), True)
+                data = await device.commands.run(field_command, imu, imu.get_fields, list(map(int,message['data']['getFields'].keys())))
                 print('get fields new')
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "getFields" : data }}))
                 print(data)
-                imu.restore_odr()
             elif list(message['data'].keys())[0] == 'readFields':
-                data = imu.read_fields(list(map(int,message['data']['readFields'].keys())), True)
+                data = await device.commands.run(field_command, imu, imu.read_fields, list(map(int,message['data']['readFields'].keys())))
                 print('read fields new')
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "readFields" : data }}))
                 print(data)
-                imu.restore_odr()
             elif list(message['data'].keys())[0] == 'setFields':
-                setData = zip(list(map(int,message['data']['setFields'].keys())), list(map(int,message['data']['setFields'].values())))
+                setData = list(zip(list(map(int,message['data']['setFields'].keys())), list(map(int,message['data']['setFields'].values()))))
                 print('set fields new')
                 print(setData)
-                data = imu.set_fields(setData, True)
+                data = await device.commands.run(field_command, imu, imu.set_fields, setData)
                 # should be improved to really use data readback in UART protocol, and cross check values set correctly
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "setFields" : setData }}))
-                imu.restore_odr()
             elif list(message['data'].keys())[0] == 'writeFields':
-                setData = zip(list(map(int,message['data']['writeFields'].keys())), list(map(int,message['data']['writeFields'].values())))
+                setData = list(zip(list(map(int,message['data']['writeFields'].keys())), list(map(int,message['data']['writeFields'].values()))))
                 print('write fields new')
                 print(setData)
-                data = imu.write_fields(setData, True)
+                data = await device.commands.run(field_command, imu, imu.write_fields, setData)
                 # should be improved to really use data readback in UART protocol, and cross check values set correctly
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "writeFields" : setData }}))
-                imu.restore_odr()
             elif list(message['data'].keys())[0] == 'startStream':
                 print('start stream')
-                imu.restore_odr()
-                self.callback.start()  
+                await device.commands.run(imu.restore_odr)
+                self.streaming = True
             elif list(message['data'].keys())[0] == 'stopStream':
-                imu.set_quiet()
+                await device.commands.run(imu.set_quiet)
             elif list(message['data'].keys())[0] == 'startLog' and imu.logging == 0: 
                 data = message['data']['startLog']
-                imu.start_log(data) 
+                await device.commands.run(imu.start_log, data)
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "logfile" : imu.logger.name }}))
             elif list(message['data'].keys())[0] == 'stopLog' and imu.logging == 1: 
-                imu.stop_log()                
+                await device.commands.run(imu.stop_log)
                 self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "logfile" : '' }}))
+            elif list(message['data'].keys())[0] == 'subscribe':
+                # { fields : [], rate : Hz, reduce : decimate|average }, an empty request unsubscribes
+                request = message['data']['subscribe'] or {}
+                try:
+                    if device is None:
+                        raise ValueError('no device')
+                    device.broadcaster.subscribe(self, request.get('fields'), request.get('rate', 0), request.get('reduce', 'decimate'))
+                    reply = { "fields" : request.get('fields'), "rate" : request.get('rate', 0), "reduce" : request.get('reduce', 'decimate') }
+                except (ValueError, TypeError) as err:
+                    reply = { "error" : str(err) }
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "subscribe" : reply }}))
+            elif list(message['data'].keys())[0] == 'listDevices':
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "listDevices" : [d.status() for d in devices.values()] }}))
+            elif list(message['data'].keys())[0] == 'selectDevice':
+                # { deviceId }, moves this client's stream to that device
+                wanted = message['data']['selectDevice'].get('deviceId')
+                if wanted in devices:
+                    self.attach_device(devices[wanted])
+                    self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "selectDevice" : wanted }}))
+                else:
+                    self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "selectDevice" : wanted, "error" : "unknown device" }}))
             elif list(message['data'].keys())[0] == 'listFiles':
-                logfiles = [f for f in os.listdir('data') if os.path.isfile(os.path.join('data', f)) and f.endswith(".csv")]
-                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "listFiles" : logfiles }}))
+                # optional { offset, limit, sort, descending, filters, match, includeOpen }, see catalog.LogCatalog.list.
+                # Without a limit every file is listed, as plain listFiles always did
+                request = message['data']['listFiles']
+                request = request if isinstance(request, dict) else {}
+                try:
+                    offset = max(0, int(request.get('offset', 0)))
+                    limit = int(request['limit']) if request.get('limit') is not None else None
+                except (TypeError, ValueError):
+                    self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "listFiles" : [], "error" : "offset and limit must be integers" }}))
+                    return
+                page = log_catalog.list(offset, limit, request.get('sort', 'mtime'), bool(request.get('descending', True)),
+                                        request.get('filters'), request.get('match'), bool(request.get('includeOpen', False)))
+                logfiles = [f['name'] for f in page['files']]
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "listFiles" : logfiles, "catalog" : page }}))
             elif list(message['data'].keys())[0] == 'loadFile':
                 print(message['data']['loadFile']['graph_id'])
-                f = open("data/" + message['data']['loadFile']['graph_id'],"r")
-                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "loadFile" :  f.read() }}))
+                tornado.ioloop.IOLoop.current().spawn_callback(self.load_file, message['data']['loadFile'])
+            elif list(message['data'].keys())[0] == 'resetStats':
+                device.stats.reset()
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "resetStats" : {} }}))
+            elif list(message['data'].keys())[0] == 'spectrum':
+                # true|false, spectra of the device's spectrum stage are sent as spectrum events
+                self.spectrum = bool(message['data']['spectrum'])
+                reply = { "spectrum" : self.spectrum }
+                if device.spectrum is None:
+                    reply["error"] = "no spectrum stage, start the server with --spectrum"
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : reply }))
+            elif list(message['data'].keys())[0] == 'aligned':
+                # true|false, rows merging every device (see --align) are sent as aligned events
+                self.aligned = bool(message['data']['aligned'])
+                reply = { "aligned" : self.aligned }
+                if aligner is None:
+                    reply["error"] = "no alignment, start the server with --align"
+                self.write_message(json.dumps({ "messageType" : "requestAction", "data" : reply }))
+            elif list(message['data'].keys())[0] == 'magCalibration':
+                await self.mag_calibration(device, message['data']['magCalibration'] or {})
+            elif list(message['data'].keys())[0] == 'alignLogs':
+                tornado.ioloop.IOLoop.current().spawn_callback(self.align_logs, message['data']['alignLogs'])
+            elif list(message['data'].keys())[0] == 'exportTrack':
+                tornado.ioloop.IOLoop.current().spawn_callback(self.export_track, device, message['data']['exportTrack'] or {})
+            elif list(message['data'].keys())[0] == 'allanDeviation':
+                tornado.ioloop.IOLoop.current().spawn_callback(self.allan_deviation, message['data']['allanDeviation'])
+
+
+    async def load_file(self, request):
+        '''Streams a log to the client.  With points set a min/max envelope is sent in one message, otherwise 
+           the rows between optional t0 and t1 are sent as CSV text chunks, the last one flagged done.
+           Each chunk waits for the previous write to flush so a large file never sits in server memory
+        '''
+        name = request['graph_id']
+        t0 = request.get('t0')
+        t1 = request.get('t1')
+        loop = tornado.ioloop.IOLoop.current()
+        try:
+            # building the index of a new file reads it once, keep that off the IOLoop
+            await loop.run_in_executor(None, log_files.index, name)
+            if request.get('points'):
+                envelope = await loop.run_in_executor(None, log_files.envelope, name, int(request['points']), t0, t1)
+                await self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "loadFile" : { "graph_id" : name, "envelope" : envelope }}}))
+                return
+            # every chunk is read on an executor thread, the generator is only ever advanced by one of them
+            chunks = log_files.read_range(name, t0, t1)
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            seq = 0
+            while chunk is not None:
+                following = await loop.run_in_executor(None, next, chunks, None)
+                await self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "loadFile" : chunk,
+                                                      "loadFileChunk" : { "graph_id" : name, "seq" : seq, "done" : following is None }}}))
+                chunk = following
+                seq += 1
+        except (IOError, OSError) as err:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "loadFile" : '', "error" : str(err) }}))
+        except tornado.websocket.WebSocketClosedError:
+            pass
 
+    async def allan_deviation(self, request):
+        '''{ graph_id, fields, optional t0, t1 } answered with stats.allan_log of those fields of the log,
+           computed off the IOLoop
+        '''
+        name = request.get('graph_id', '')
+        loop = tornado.ioloop.IOLoop.current()
+        try:
+            result = await loop.run_in_executor(None, stats.allan_log, log_files.path(name), request.get('fields', ['xRate', 'yRate', 'zRate']),
+                                                None, request.get('t0'), request.get('t1'))
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "allanDeviation" : { "graph_id" : name, "fields" : result }}}))
+        except (IOError, OSError, ValueError, KeyError) as err:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "allanDeviation" : { "graph_id" : name }, "error" : str(err) }}))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    async def mag_calibration(self, device, request):
+        '''{ action : start|status|fit|apply|write|stop }.  start collects raw mags from the device while it is
+           rotated, fit computes hard and soft iron off the IOLoop, apply corrects the stream with it and write
+           stores the horizontal part in the device (fields 0x0009, 0x000A, 0x000B, 0x000E)
+        '''
+        imu = device.imu
+        action = request.get('action', 'status')
+        reply = { 'action' : action }
+        try:
+            if action == 'start':
+                if device.magcal is None:
+                    device.magcal = magcal.MagCollector()
+                device.magcal.reset()
+                device.magcal_result = None
+                if device.magcal not in imu.stages:
+                    imu.add_stage(device.magcal, 0)
+            elif action == 'stop' and device.magcal is not None:
+                imu.remove_stage(device.magcal)
+                device.magcal = None
+            elif action in ['fit', 'apply', 'write']:
+                if action == 'fit' or device.magcal_result is None:
+                    if device.magcal is None:
+                        raise ValueError('no samples, start a magCalibration first')
+                    points = device.magcal.points()
+                    device.magcal_result = await tornado.ioloop.IOLoop.current().run_in_executor(None, magcal.fit, points)
+                if action == 'apply':
+                    reply['calibration'] = device.apply_mag_calibration(device.magcal_result)
+                elif action == 'write':
+                    pairs = magcal.device_fields(device.magcal_result)
+                    await device.commands.run(field_command, imu, imu.write_fields, pairs)
+                    reply['writeFields'] = pairs
+            reply['collector'] = device.magcal.status() if device.magcal is not None else None
+            reply['result'] = device.magcal_result
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "magCalibration" : reply }}))
+        except ValueError as err:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "magCalibration" : reply, "error" : str(err) }}))
+
+    async def align_logs(self, request):
+        '''{ files, optional rate, fields } answered with the name of the merged log written to data/,
+           computed off the IOLoop
+        '''
+        loop = tornado.ioloop.IOLoop.current()
+        try:
+            name, rows = await loop.run_in_executor(None, align_logs, request.get('files', []), float(request.get('rate', 100)), request.get('fields'))
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "alignLogs" : { "file" : name, "rows" : rows }}}))
+        except (IOError, OSError, ValueError, KeyError) as err:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "alignLogs" : { "files" : request.get('files', []) }, "error" : str(err) }}))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    async def export_track(self, device, request):
+        '''{ optional graph_id, format, tolerance, t0, t1 } answered with the name of the track written to data/.
+           The track is of the log graph_id, an N0/N1 log or capture, or else of the device's TrackRecorder
+        '''
+        name = request.get('graph_id')
+        extension = request.get('format', 'geojson')
+        tolerance = request.get('tolerance')
+        loop = tornado.ioloop.IOLoop.current()
+        try:
+            if name:
+                columns = await loop.run_in_executor(None, navexport.read_log, log_files.path(name), request.get('t0'), request.get('t1'))
+                label, properties = os.path.splitext(name)[0], { 'file' : name }
+            elif device is None or device.track is None:
+                raise ValueError('no graph_id and no live track, start the server with --track')
+            else:
+                columns = device.track.columns()
+                label, properties = str(device.imu.device_id).split(' ')[0], { 'deviceId' : device.imu.device_id }
+            result = await loop.run_in_executor(None, export_track, columns, label, extension, tolerance, properties)
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "exportTrack" : result }}))
+        except (IOError, OSError, ValueError, KeyError) as err:
+            self.write_message(json.dumps({ "messageType" : "requestAction", "data" : { "exportTrack" : { "graph_id" : name }, "error" : str(err) }}))
+        except tornado.websocket.WebSocketClosedError:
+            pass
 
     def on_close(self):
-        self.callback.stop()
+        waiting.pop(self, None)
+        self.detach_device()
 
     def check_origin(self, origin):
         return True
  
 if __name__ == "__main__":
-    # Create IMU
-    imu = imu380.GrabIMU380Data(ws=True)
-    # Place IMU in thread and ask it to connect itself 
-    threading.Thread(target=imu.connect).start()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--simulate', nargs='?', const='S1', choices=['S0', 'S1'], help='use simulated devices streaming this packet type')
+    parser.add_argument('--devices', type=int, default=1, help='number of simulated devices')
+    parser.add_argument('--odr', type=int, default=1, help='ODR setting of the simulated device')
+    parser.add_argument('--replay', help='replay a raw capture file (see capture.py) in a loop instead of a device')
+    parser.add_argument('--estimator', action='store_true', help='add roll/pitch/yaw from estimator.Estimator to S0/S1 streams')
+    parser.add_argument('--spectrum', action='store_true', help='add a spectrum.Spectrum vibration stage, spectra are logged and sent to clients asking for them')
+    parser.add_argument('--events', help='event detector configuration (predicates, pre and post seconds) for every device, see events.py')
+    parser.add_argument('--align', type=float, metavar='RATE', help='merge every device onto the host clock at RATE rows per second, see alignment.py')
+    parser.add_argument('--track', type=float, nargs='?', const=0.1, metavar='INTERVAL', help='keep a fix of every N0/N1 device each INTERVAL seconds (default 0.1) for exportTrack, see navexport.py')
+    parser.add_argument('--calibration', help='calibration file applied to the devices it lists, see calibration.py')
+    args = parser.parse_args()
+    estimate_attitude = args.estimator
+    vibration_spectra = args.spectrum
+    if args.events:
+        event_config = events.load(args.events)
+    if args.align:
+        aligner = alignment.Aligner(args.align)
+    track_interval = args.track
+    if args.calibration:
+        calibrations = calibration.load(args.calibration)
+
+    loop = tornado.ioloop.IOLoop.current()
+    # Device manager finds devices in a thread, each device gets a broadcaster tick and command thread (see Device)
+    manager = device_manager.DeviceManager(ws=True)
+    manager.listeners.append(device_event)
+    if args.replay:
+        threading.Thread(target=manager.add_replay, args=(args.replay,), daemon=True).start()
+    elif args.simulate:
+        threading.Thread(target=manager.add_simulated, args=(args.devices, args.simulate, args.odr), daemon=True).start()
+    else:
+        threading.Thread(target=manager.start).start()
     
+    # Log catalog follows the loggers and rescans data/ for files changed by anything else
+    storage.log_listeners.append(log_catalog.on_log_event)
+    log_catalog.start(catalog_rescan_rate)
+
+    # Merged rows of every device are flushed to clients every align_flush_rate ms
+    if aligner is not None:
+        PeriodicCallback(publish_aligned, align_flush_rate).start()
+
     # Set up Websocket server on Port 8000
-    # Port can be changed
+    # Port can be changed with --port
     application = tornado.web.Application([(r'/', WSHandler)])
     http_server = tornado.httpserver.HTTPServer(application)
-    http_server.listen(8000)
+    http_server.listen(args.port)
     tornado.ioloop.IOLoop.instance().start()
     
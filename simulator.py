@@ -0,0 +1,185 @@
+"""
+Simulated 380 device on a stand in serial port, for running server.py and load tests without hardware
+Created on 2026-10-19
+"""
+
+"""
+SimulatedSerial - pyserial like object (read, write, reset_input_buffer, close) that streams S0 or S1
+                  packets at the ODR held in field 0x0001, paced by the host clock, and answers
+                  GP (ID, T0), GF, RF, SF and WF commands from temporary and permanent field tables
+frame           - builds a 0x5555 packet with CRC
+
+Signals are a stationary unit turning slowly about z with sensor noise.  Field 0x0001 is the ODR
+(0 is quiet) and 0x0003 the stream packet type.  Unknown fields read as 0.
+"""
+
+import math
+import random
+import time
+
+ODR_RATES = { 0 : 0, 1 : 100, 2 : 50, 5 : 25, 10 : 20, 20 : 10, 25 : 5, 50 : 2 }
+PACKET_SIZES = { 'S0' : 30, 'S1' : 24 }
+
+def crc(payload):
+    '''CRC per 380 manual, same as GrabIMU380Data.calc_crc
+    '''
+    crc = 0x1D0F
+    for bytedata in payload:
+        crc = crc ^ (bytedata << 8)
+        for i in range(0, 8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc = crc << 1
+    return crc & 0xffff
+
+def frame(packet_type, payload):
+    body = bytearray(packet_type.encode()) + bytearray([len(payload)]) + bytearray(payload)
+    c = crc(body)
+    return bytes(bytearray([0x55, 0x55]) + body + bytearray([(c & 0xFF00) >> 8, c & 0x00FF]))
+
+def i2(value, scale):
+    '''Big endian two's complement I2 of value / scale, saturated
+    '''
+    n = max(-32768, min(32767, int(round(value / scale))))
+    return [(n >> 8) & 0xFF, n & 0xFF]
+
+def u2(n):
+    return [(n >> 8) & 0xFF, n & 0xFF]
+
+class SimulatedSerial:
+    def __init__(self, packet_type='S1', odr_setting=1, serial_number=1808400123, part_number='5020-0001-01', timeout=0.1, seed=None):
+        '''Create a device streaming packet_type at odr_setting, timeout is the read timeout in seconds
+        '''
+        self.timeout = timeout
+        self.serial_number = serial_number
+        self.part_number = part_number
+        self.random = random.Random(seed)
+        code = (ord(packet_type[0]) << 8) + ord(packet_type[1])
+        self.permanent = { 0x0001 : odr_setting, 0x0002 : 2, 0x0003 : code, 0x0004 : 0 }
+        self.fields = dict(self.permanent)
+        self.output = bytearray()
+        self.input = bytearray()
+        self.count = 0              # packets streamed since power up
+        self.next_due = None
+        self.heading = 0.0
+        self.is_open = True
+
+    @property
+    def packet_type(self):
+        code = self.fields.get(0x0003, 0)
+        packet_type = chr(code >> 8) + chr(code & 0xFF)
+        return packet_type if packet_type in PACKET_SIZES else 'S1'
+
+    @property
+    def rate(self):
+        return ODR_RATES.get(self.fields.get(0x0001, 0), 0)
+
+    def stream(self):
+        '''Appends every packet due by now to the output, at most one second of backlog
+        '''
+        rate = self.rate
+        if not rate:
+            self.next_due = None
+            return
+        now = time.monotonic()
+        if self.next_due is None or now - self.next_due > 1.0:
+            self.next_due = now
+        while self.next_due <= now:
+            self.output += self.packet()
+            self.next_due += 1.0 / rate
+
+    def packet(self):
+        rate = self.rate
+        t = self.count / float(rate)
+        self.count += 1
+        g = self.random.gauss
+        z_rate = 5.0 * math.sin(0.5 * t)
+        self.heading += math.radians(z_rate) / rate
+        accels = [0.01 * math.sin(0.2 * t) + g(0, 0.002), g(0, 0.002), -1.0 + g(0, 0.002)]
+        gyros = [g(0, 0.05), g(0, 0.05), z_rate + g(0, 0.05)]
+        temps = [30.0 + 0.01 * t, 30.2 + 0.01 * t, 29.9 + 0.01 * t, 31.0 + 0.01 * t]
+        # counter / ITOW advance 65535 per second, see parse_packet
+        counter = int(round(self.count * 65535.0 / rate)) & 0xFFFF
+        payload = []
+        for a in accels:
+            payload += i2(a, 20.0 / 65536)
+        for r in gyros:
+            payload += i2(r, 1260.0 / 65536)
+        if self.packet_type == 'S0':
+            for m in [0.25 * math.cos(self.heading), -0.25 * math.sin(self.heading), 0.4]:
+                payload += i2(m + g(0, 0.001), 2.0 / 65536)
+        for temp in temps:
+            payload += i2(temp, 200.0 / 65536)
+        payload += u2(counter) + u2(0)
+        return frame(self.packet_type, payload)
+
+    def read(self, n):
+        '''Returns n bytes, or fewer once timeout seconds passed, like a pyserial port
+        '''
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self.stream()
+            if len(self.output) >= n:
+                break
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait = deadline - now
+            if self.next_due is not None:
+                wait = min(wait, max(0.0, self.next_due - now))
+            time.sleep(wait)
+        data = bytes(self.output[:n])
+        del self.output[:n]
+        return data
+
+    def write(self, data):
+        '''Accepts bytes or a list of ints, answers every complete command
+        '''
+        data = bytearray(data)
+        self.input += data
+        while True:
+            start = self.input.find(b'\x55\x55')
+            if start < 0:
+                del self.input[:max(0, len(self.input) - 1)]
+                break
+            del self.input[:start]
+            if len(self.input) < 5 or len(self.input) < self.input[4] + 7:
+                break
+            length = self.input[4]
+            packet = self.input[:length + 7]
+            del self.input[:length + 7]
+            if crc(packet[2:length + 5]) == 256 * packet[-2] + packet[-1]:
+                self.command(packet[2:4].decode(), packet[5:length + 5])
+        return len(data)
+
+    def command(self, packet_type, payload):
+        if packet_type == 'GP':
+            if payload[:2] == b'ID':
+                sn = self.serial_number
+                self.output += frame('ID', [(sn >> 24) & 0xFF, (sn >> 16) & 0xFF, (sn >> 8) & 0xFF, sn & 0xFF] + list(self.part_number.encode()))
+            elif payload[:2] == b'T0':
+                self.output += frame('T0', [0] * 28)
+        elif packet_type in ['GF', 'RF']:
+            table = self.fields if packet_type == 'GF' else self.permanent
+            n = payload[0]
+            response = [n]
+            for i in range(n):
+                field = 256 * payload[2*i+1] + payload[2*i+2]
+                response += u2(field) + u2(table.get(field, 0))
+            self.output += frame(packet_type, response)
+        elif packet_type in ['SF', 'WF']:
+            table = self.fields if packet_type == 'SF' else self.permanent
+            n = payload[0]
+            response = [n]
+            for i in range(n):
+                field = 256 * payload[4*i+1] + payload[4*i+2]
+                table[field] = 256 * payload[4*i+3] + payload[4*i+4]
+                response += u2(field)
+            self.output += frame(packet_type, response)
+
+    def reset_input_buffer(self):
+        self.output = bytearray()
+
+    def close(self):
+        self.is_open = False
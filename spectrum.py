@@ -0,0 +1,195 @@
+"""
+Vibration spectra of decoded samples, Welch power spectral density over sliding windows
+Created on 2026-10-19
+"""
+
+"""
+Spectrum        - pipeline stage (imu.add_stage) copying channels into a preallocated ring, with a
+                  worker thread computing the Welch PSD and band energies of overlapping windows and
+                  publishing them every cadence seconds to its listeners
+SpectrumLog     - listener appending published spectra as JSON lines next to the imu's current log
+welch           - the same PSD over whole columns of a log at once
+
+Windows are window samples long and start every hop samples (50% overlap by default).  The reader
+thread only writes each sample into the ring and, every hop samples, copies the last window into a
+free slot of a small preallocated pool for the worker.  When every slot is busy the window is
+dropped and counted, the reader never waits.  The PSD is the mean of the last averages windows'
+Hann windowed periodograms, one sided, in units^2/Hz; band energies are the PSD integrated over each
+band, as RMS.
+"""
+
+import collections
+import json
+import queue
+import threading
+import time
+
+CHANNELS = ['xAccel', 'yAccel', 'zAccel', 'xRate', 'yRate', 'zRate']
+POOL = 4            # windows waiting for or being processed by the worker
+
+def hann(n):
+    import numpy as np
+    # periodic Hann, as scipy.signal.welch uses
+    return 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n) / n)
+
+def periodograms(segments, rate, window):
+    '''One sided PSD of each (..., window samples, channels) segment after removing its mean
+    '''
+    import numpy as np
+    w = hann(window)
+    x = segments - segments.mean(axis=-2, keepdims=True)
+    power = np.abs(np.fft.rfft(x * w[:, None], axis=-2)) ** 2 / (rate * np.dot(w, w))
+    # every bin but DC and Nyquist also holds the negative frequency power
+    power[..., 1:(window + 1) // 2, :] *= 2.0
+    return power
+
+def band_rms(psd, step, bands):
+    '''RMS of each (lo, hi) Hz band of a (bins, channels) PSD with bin spacing step
+    '''
+    import numpy as np
+    frequencies = np.arange(psd.shape[0]) * step
+    return [np.sqrt(psd[(frequencies >= lo) & (frequencies < hi)].sum(axis=0) * step) for lo, hi in bands]
+
+class Spectrum:
+    name = 'spectrum'
+
+    def __init__(self, channels=None, window=256, hop=None, averages=8, cadence=1.0, bands=None):
+        '''bands are (lo, hi) Hz pairs, cadence is seconds between published spectra
+        '''
+        import numpy as np
+        self.channels = channels or CHANNELS
+        self.window = window
+        self.hop = hop or window // 2
+        self.averages = averages
+        self.cadence = cadence
+        self.bands = bands or [(1.0, 5.0), (5.0, 20.0), (20.0, 50.0)]
+        self.listeners = []
+        # column 0 is time
+        self.ring = np.zeros((window, len(self.channels) + 1))
+        self.pool = np.zeros((POOL, window, len(self.channels) + 1))
+        self.free = queue.Queue()
+        for slot in range(POOL):
+            self.free.put(slot)
+        self.work = queue.Queue()
+        self.position = 0
+        self.filled = 0
+        self.since_hop = 0
+        self.dropped = 0
+        self.psds = collections.deque()
+        self.total = None
+        self.last_publish = 0.0
+        self.worker = None
+
+    def reset(self):
+        '''Forgets the samples in the ring, e.g. after the sample rate changed
+        '''
+        self.filled = 0
+        self.since_hop = 0
+
+    def __call__(self, data):
+        if self.channels[0] not in data:
+            return
+        self.ring[self.position] = [data['time']] + [data[k] for k in self.channels]
+        self.position = (self.position + 1) % self.window
+        self.filled += 1
+        self.since_hop += 1
+        if self.filled < self.window or self.since_hop < self.hop:
+            return
+        self.since_hop = 0
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        segment = self.pool[slot]
+        tail = self.window - self.position
+        segment[:tail] = self.ring[self.position:]
+        segment[tail:] = self.ring[:self.position]
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+        self.work.put(slot)
+
+    def run(self):
+        '''Worker thread, averages the periodograms of queued windows and publishes at the cadence
+        '''
+        import numpy as np
+        while True:
+            slot = self.work.get()
+            if slot is None:
+                return
+            segment = self.pool[slot]
+            span = segment[-1, 0] - segment[0, 0]
+            if span <= 0.0:
+                # time restarted inside the window
+                self.free.put(slot)
+                continue
+            rate = (self.window - 1) / span
+            psd = periodograms(segment[:, 1:], rate, self.window)
+            self.free.put(slot)
+            # running sum of the last averages periodograms
+            if self.total is None:
+                self.total = np.zeros_like(psd)
+            self.total += psd
+            self.psds.append(psd)
+            if len(self.psds) > self.averages:
+                self.total -= self.psds.popleft()
+            now = time.time()
+            if now - self.last_publish < self.cadence:
+                continue
+            self.last_publish = now
+            mean = self.total / len(self.psds)
+            step = rate / self.window
+            result = { 'time' : float(segment[-1, 0]), 'sampleRate' : rate, 'frequencyStep' : step, 'windows' : len(self.psds),
+                       'dropped' : self.dropped, 'bands' : [list(band) for band in self.bands],
+                       'psd' : { k : mean[:, i].tolist() for i, k in enumerate(self.channels) },
+                       'bandRms' : { k : [float(b[i]) for b in band_rms(mean, step, self.bands)] for i, k in enumerate(self.channels) } }
+            for listener in self.listeners:
+                try:
+                    listener(result)
+                except Exception as err:
+                    print('spectrum listener failed: ' + str(err))
+
+    def close(self):
+        '''Stops the worker once it has processed the queued windows
+        '''
+        if self.worker is not None:
+            self.work.put(None)
+            self.worker.join()
+            self.worker = None
+
+class SpectrumLog:
+    def __init__(self, imu, directory='data'):
+        '''Appends spectra to <directory>/<session>.spectrum.jsonl while imu is logging
+        '''
+        self.imu = imu
+        self.directory = directory
+
+    def __call__(self, result):
+        logger = self.imu.logger
+        if not self.imu.logging or logger is None:
+            return
+        session = getattr(logger, 'session', None) or logger.name.split('.')[0]
+        with open(self.directory + '/' + session + '.spectrum.jsonl', 'a') as f:
+            f.write(json.dumps(result) + '\n')
+
+def welch(columns, channels=None, window=256, hop=None, rate=None):
+    '''Welch PSD of whole columns, every window of window samples starting each hop samples, averaged
+        :returns:
+            dict of sampleRate, frequencyStep, windows and psd (channel -> array)
+    '''
+    import numpy as np
+    channels = channels or [k for k in CHANNELS if k in columns]
+    hop = hop or window // 2
+    values = np.stack([np.asarray(columns[k], dtype=float) for k in channels], axis=1)
+    if rate is None:
+        steps = np.diff(np.asarray(columns['time'], dtype=float))
+        steps = steps[steps > 0]
+        rate = 1.0 / float(np.median(steps))
+    count = (len(values) - window) // hop + 1
+    if count < 1:
+        raise ValueError('fewer samples than one window')
+    segments = np.lib.stride_tricks.as_strided(values, (count, window, len(channels)),
+                                               (hop * values.strides[0], values.strides[0], values.strides[1]), writeable=False)
+    psd = periodograms(segments, rate, window).mean(axis=0)
+    return { 'sampleRate' : rate, 'frequencyStep' : rate / window, 'windows' : count, 'psd' : { k : psd[:, i] for i, k in enumerate(channels) } }
@@ -0,0 +1,119 @@
+"""
+Noise statistics of decoded samples, running per channel statistics and Allan deviation of logs
+Created on 2026-10-19
+"""
+
+"""
+RunningStats    - pipeline stage (imu.add_stage) keeping count, mean, variance, min and max of every
+                  float channel with Welford's method, O(1) per sample
+allan_deviation - overlapping Allan deviation of a sampled channel at log spaced averaging times
+allan_log       - allan_deviation of channels of a CSV or binary log, see log_reader.read_columns
+
+Welford's update keeps the mean and the sum of squared deviations M2, so the variance stays accurate
+over long runs where sum(x^2) - n mean^2 would cancel.  The Allan deviation is computed from the
+cumulative sum theta of the samples: for an averaging time of m samples every overlapping cluster
+difference is theta[k + 2m] - 2 theta[k + m] + theta[k], one vectorized pass over the data per m.
+"""
+
+import math
+import threading
+from encoding import INT_FIELDS
+
+class RunningStats:
+    name = 'stats'
+
+    def __init__(self, fields=None):
+        '''fields limits the channels, default every float field except time
+        '''
+        self.fields = fields
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.channels = {}          # field -> [count, mean, M2, min, max]
+
+    def __call__(self, data):
+        fields = self.fields or data
+        with self.lock:
+            channels = self.channels
+            for k in fields:
+                if k == 'time' or k in INT_FIELDS or k not in data:
+                    continue
+                x = data[k]
+                c = channels.get(k)
+                if c is None:
+                    channels[k] = [1, x, 0.0, x, x]
+                    continue
+                n = c[0] + 1
+                delta = x - c[1]
+                mean = c[1] + delta / n
+                c[0] = n
+                c[1] = mean
+                c[2] += delta * (x - mean)
+                if x < c[3]:
+                    c[3] = x
+                elif x > c[4]:
+                    c[4] = x
+
+    def snapshot(self):
+        '''Per channel count, mean, std (sample standard deviation), min and max
+        '''
+        with self.lock:
+            channels = [(k, list(c)) for k, c in self.channels.items()]
+        return { k : { 'count' : n, 'mean' : mean, 'std' : math.sqrt(m2 / (n - 1)) if n > 1 else 0.0, 'min' : lo, 'max' : hi }
+                 for k, (n, mean, m2, lo, hi) in channels }
+
+def cluster_sizes(n, per_decade=5):
+    '''Log spaced averaging sizes in samples, 1 up to n // 2 (the largest with two clusters)
+    '''
+    sizes = set()
+    top = max(0.0, math.log10(max(1, n // 2)))
+    for i in range(int(top * per_decade) + 1):
+        sizes.add(int(round(10 ** (i / float(per_decade)))))
+    return sorted(m for m in sizes if 1 <= m <= n // 2)
+
+def allan_deviation(values, rate, sizes=None):
+    '''Overlapping Allan deviation of values sampled at rate Hz
+        :returns:
+            dict of tau (seconds), adev (units of values) and clusters (number of overlapping
+            differences averaged) lists
+    '''
+    import numpy as np
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    sizes = cluster_sizes(n) if sizes is None else sizes
+    # subtracting the mean keeps theta small, its differences cancel it anyway
+    theta = np.empty(n + 1)
+    theta[0] = 0.0
+    np.cumsum(y - y.mean(), out=theta[1:])
+    buffer = np.empty(n)
+    result = { 'tau' : [], 'adev' : [], 'clusters' : [] }
+    for m in sizes:
+        count = n + 1 - 2 * m
+        if count < 1:
+            continue
+        d = buffer[:count]
+        np.subtract(theta[2 * m:], theta[m:n + 1 - m], out=d)
+        d -= theta[m:n + 1 - m]
+        d += theta[:count]
+        # theta sums samples, so the cluster difference is m times the difference of cluster means
+        avar = np.dot(d, d) / (2.0 * m * m * count)
+        result['tau'].append(m / float(rate))
+        result['adev'].append(math.sqrt(avar))
+        result['clusters'].append(count)
+    return result
+
+def allan_log(path, fields, rate=None, t0=None, t1=None):
+    '''allan_deviation of fields of a log, rate defaults to the median sample rate of the time column
+        :returns:
+            dict of field -> allan_deviation result
+    '''
+    import numpy as np
+    import log_reader
+    columns = log_reader.read_columns(path, ['time'] + [f for f in fields if f != 'time'], t0, t1)
+    if rate is None:
+        steps = np.diff(columns['time'])
+        steps = steps[steps > 0]
+        rate = 1.0 / float(np.median(steps)) if len(steps) else 1.0
+    return { f : allan_deviation(columns[f], rate) for f in fields if f != 'time' }
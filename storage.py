@@ -0,0 +1,54 @@
+"""
+Registry of log storage backends, a backend module is only imported the first time it is selected
+Created on 2026-10-19
+"""
+
+"""
+BACKENDS        - backend name -> (module, factory, keyword arguments)
+                  csv     - local CSV segments, file_storage.py
+                  cloud   - CSV segments uploaded to Azure as they are finalized, file_storage.py
+                  binary  - local packed binary log, binary_storage.py
+                  aceinna - single CSV spool streamed to an Azure append blob, aceinna_storage.py
+register        - add or replace a backend
+open_logger     - create a logger of the named backend for imu with the startLog request data
+log_listeners   - callables(event, name, info) told when a log file is opened, finalized (close)
+                  or discarded, see catalog.py
+
+A logger has name and user attributes, log(data, odr_setting) and close().
+"""
+
+import importlib
+
+DEFAULT_BACKEND = 'cloud'
+
+BACKENDS = { 'csv' : ('file_storage', 'LogIMU380Data', { 'upload' : False }),
+             'cloud' : ('file_storage', 'LogIMU380Data', {}),
+             'binary' : ('binary_storage', 'LogIMU380Data', {}),
+             'aceinna' : ('aceinna_storage', 'create', {}) }
+
+log_listeners = []
+
+def notify(event, name, info):
+    for listener in log_listeners:
+        try:
+            listener(event, name, info)
+        except Exception as err:
+            print('log listener failed: ' + str(err))
+
+def register(name, module, factory, **kwargs):
+    BACKENDS[name] = (module, factory, kwargs)
+
+def available_backends():
+    return list(BACKENDS)
+
+def get_factory(name):
+    '''Imports the backend module of name on first use
+        :raises KeyError:
+            if no backend is registered under name
+    '''
+    module, factory, kwargs = BACKENDS[name]
+    return getattr(importlib.import_module(module), factory), kwargs
+
+def open_logger(name, imu, user):
+    factory, kwargs = get_factory(name or DEFAULT_BACKEND)
+    return factory(imu, user, **kwargs)
@@ -0,0 +1,116 @@
+"""
+PackedEncoding tests, frames decoded back with the schema messages a client receives
+Created on 2026-10-19
+"""
+
+"""
+python -m unittest test_encoding
+"""
+
+import collections
+import itertools
+import json
+import struct
+import unittest
+import broadcast
+import encoding
+
+FIELDS = ['time', 'xAccel', 'yAccel', 'zAccel', 'counter', 'BITstatus']
+
+def sample(fields=FIELDS, t=1.5):
+    return collections.OrderedDict((k, t if k == 'time' else 7 if k in encoding.INT_FIELDS else -2.25) for k in fields)
+
+class Decoder:
+    '''Client side: keeps the latest schema of every id
+    '''
+    def __init__(self):
+        self.layouts = {}
+
+    def schema(self, message):
+        schema = json.loads(message.decode())['data']
+        self.layouts[schema['schemaId']] = (schema['fields'], struct.Struct(schema['format']))
+
+    def frame(self, frame):
+        fields, packer = self.layouts[frame[0]]
+        return collections.OrderedDict(zip(fields, packer.unpack(frame)[1:]))
+
+class Client:
+    streaming = True
+    subscription = None
+
+    def __init__(self):
+        self.schemas = {}
+        self.decoder = Decoder()
+        self.samples = []
+
+    def send(self, message, binary=False, keep=False):
+        if binary:
+            self.samples.append(self.decoder.frame(message))
+        else:
+            self.decoder.schema(message)
+
+class PackedEncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        packed = encoding.PackedEncoding()
+        data = sample()
+        schema_id, message = packed.schema(data)
+        self.assertEqual(schema_id, 1)
+        decoder = Decoder()
+        decoder.schema(message)
+        self.assertEqual(decoder.frame(packed.encode(data)), data)
+
+    def test_batch(self):
+        packed = encoding.PackedEncoding()
+        samples = [(10, sample(t=1.0)), (11, None), (12, 5), (13, sample(t=1.01))]
+        message = packed.encode_batch(samples, 3)
+        kind, count, missed = encoding.BATCH_HEADER.unpack_from(message)
+        self.assertEqual((kind, count, missed), (0, 2, 3))
+        decoder = Decoder()
+        decoder.schema(packed.schema(samples[0][1])[1])
+        size = packed.layout(samples[0][1])[1].size
+        offset = encoding.BATCH_HEADER.size
+        for seq, data in [samples[0], samples[3]]:
+            self.assertEqual(encoding.SEQ.unpack_from(message, offset)[0], seq)
+            offset += encoding.SEQ.size
+            self.assertEqual(decoder.frame(message[offset:offset + size]), data)
+            offset += size
+        self.assertEqual(offset, len(message))
+
+    def test_not_a_sample(self):
+        packed = encoding.PackedEncoding()
+        self.assertIsNone(packed.schema(None))
+        self.assertIsNone(packed.schema(5))
+
+    def test_schema_ids_recycled(self):
+        # every field order is a field set of its own, far more than a U1 schema id holds
+        packed = encoding.PackedEncoding()
+        decoder = Decoder()
+        for fields in itertools.permutations(FIELDS):
+            data = sample(fields)
+            schema_id, message = packed.schema(data)
+            self.assertTrue(1 <= schema_id <= encoding.MAX_SCHEMAS)
+            decoder.schema(message)
+            self.assertEqual(decoder.frame(packed.encode(data)), data)
+        self.assertEqual(len(packed.schemas), encoding.MAX_SCHEMAS)
+
+    def test_recycled_schema_sent_again(self):
+        packed = encoding.PackedEncoding()
+        broadcaster = broadcast.Broadcaster(None)
+        client = Client()
+        orders = list(itertools.permutations(FIELDS))[:encoding.MAX_SCHEMAS + 10]
+        for fields in orders:
+            data = sample(fields)
+            broadcaster.send([client], packed, [data], packed.encode(data))
+        self.assertEqual(client.samples, [sample(fields) for fields in orders])
+        self.assertEqual(len(client.schemas), encoding.MAX_SCHEMAS)
+
+    def test_subscription_field_order(self):
+        # asking for the same fields in another order shares the subscription and its schema
+        broadcaster = broadcast.Broadcaster(type('IMU', (), { 'sample_seq' : 0 })())
+        first, second = Client(), Client()
+        subscription = broadcaster.subscribe(first, ['zAccel', 'time', 'xAccel'])
+        self.assertIs(broadcaster.subscribe(second, ['xAccel', 'zAccel', 'time']), subscription)
+        self.assertEqual(list(subscription.select(sample())), ['time', 'xAccel', 'zAccel'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+parse_packet tests, signed fields of every stream packet type decoded from known payloads
+Created on 2026-10-19
+"""
+
+"""
+python -m unittest test_imu380
+"""
+
+import struct
+import unittest
+import imu380
+
+ACCEL = 9.80665 * 20 / 65536.0
+RATE = 1260 / 65536.0
+ANGLE = 360.0 / 65536.0
+MAG = 2 / 65536.0
+TEMP = 200 / 65536.0
+
+# payload length and the I2 fields, (name, byte offset, scale), of each packet type
+LAYOUTS = {
+    'S0' : (30, [('xAccel', 0, ACCEL), ('yAccel', 2, ACCEL), ('zAccel', 4, ACCEL), ('xRate', 6, RATE), ('yRate', 8, RATE), ('zRate', 10, RATE),
+                 ('xMag', 12, MAG), ('yMag', 14, MAG), ('zMag', 16, MAG),
+                 ('xRateTemp', 18, TEMP), ('yRateTemp', 20, TEMP), ('zRateTemp', 22, TEMP), ('boardTemp', 24, TEMP)]),
+    'S1' : (24, [('xAccel', 0, ACCEL), ('yAccel', 2, ACCEL), ('zAccel', 4, ACCEL), ('xRate', 6, RATE), ('yRate', 8, RATE), ('zRate', 10, RATE),
+                 ('xRateTemp', 12, TEMP), ('yRateTemp', 14, TEMP), ('zRateTemp', 16, TEMP), ('boardTemp', 18, TEMP)]),
+    'A1' : (32, [('rollAngle', 0, ANGLE), ('pitchAngle', 2, ANGLE), ('yawAngleMag', 4, ANGLE),
+                 ('xRateCorrected', 6, RATE), ('yRateCorrected', 8, RATE), ('zRateCorrected', 10, RATE),
+                 ('xAccel', 12, ACCEL), ('yAccel', 14, ACCEL), ('zAccel', 16, ACCEL), ('xMag', 18, MAG), ('yMag', 20, MAG), ('zMag', 22, MAG),
+                 ('xRateTemp', 24, TEMP)]),
+    'A2' : (30, [('rollAngle', 0, ANGLE), ('pitchAngle', 2, ANGLE), ('yawAngleMag', 4, ANGLE),
+                 ('xRateCorrected', 6, RATE), ('yRateCorrected', 8, RATE), ('zRateCorrected', 10, RATE),
+                 ('xAccel', 12, ACCEL), ('yAccel', 14, ACCEL), ('zAccel', 16, ACCEL),
+                 ('xRateTemp', 18, TEMP), ('yRateTemp', 20, TEMP), ('zRateTemp', 22, TEMP)]),
+    'A3' : (30, [('rollAngle', 0, ANGLE), ('pitchAngle', 2, ANGLE), ('yawAngleMag', 4, ANGLE),
+                 ('xRateScaled', 6, RATE), ('yRateScaled', 8, RATE), ('zRateScaled', 10, RATE),
+                 ('xAccel', 12, ACCEL), ('yAccel', 14, ACCEL), ('zAccel', 16, ACCEL),
+                 ('xRateTemp', 18, TEMP), ('yRateTemp', 20, TEMP), ('zRateTemp', 22, TEMP)]),
+}
+
+def decode(packet_type, payload):
+    imu = imu380.GrabIMU380Data()
+    imu.packet_type = packet_type
+    return imu.parse_packet(payload)
+
+class ParsePacketTest(unittest.TestCase):
+    def check(self, values):
+        for packet_type, (length, fields) in LAYOUTS.items():
+            payload = bytearray(range(length))      # the unsigned fields past the I2 ones get distinct bytes
+            for (name, offset, scale), value in zip(fields, values):
+                struct.pack_into('>h', payload, offset, value)
+            data = decode(packet_type, payload)
+            for (name, offset, scale), value in zip(fields, values):
+                self.assertAlmostEqual(data[name], value * scale, places=12, msg=packet_type + ' ' + name)
+
+    def test_negative(self):
+        self.check([-1 - 1021 * k for k in range(13)])
+
+    def test_extremes(self):
+        self.check([-32768, 32767, -1, 0, 1] * 3)
+
+    def test_a1_temperature(self):
+        # xRateTemp is bytes 24-25, timeITOW follows at 26
+        payload = bytearray(32)
+        struct.pack_into('>hIH', payload, 24, -300, 0x01020304, 5)
+        data = decode('A1', payload)
+        self.assertAlmostEqual(data['xRateTemp'], -300 * TEMP, places=12)
+        self.assertEqual(data['timeITOW'], 0x01020304)
+        self.assertEqual(data['BITstatus'], 5)
+
+if __name__ == "__main__":
+    unittest.main()
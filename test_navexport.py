@@ -0,0 +1,48 @@
+"""
+navexport tests, the batch N0/N1 decoder against parse_packet on the same payloads
+Created on 2026-10-19
+"""
+
+"""
+python -m unittest test_navexport
+"""
+
+import unittest
+import numpy as np
+import imu380
+import navexport
+
+class DecodeTest(unittest.TestCase):
+    def check(self, packet_type, payloads):
+        imu = imu380.GrabIMU380Data()
+        imu.packet_type = packet_type
+        rows = []
+        for p in payloads:
+            # as the read loop does, time advances from the previous imu.data
+            imu.data = imu.parse_packet(bytearray(p.tobytes()))
+            rows.append(imu.data)
+        columns = navexport.decode(payloads, packet_type)
+        self.assertEqual(list(columns), ['time'] + [f[0] for f in navexport.LAYOUTS[packet_type]])
+        for name, values in columns.items():
+            expected = np.array([row[name] for row in rows], dtype=float)
+            np.testing.assert_allclose(values, expected, rtol=1e-12, atol=1e-9, err_msg=packet_type + ' ' + name)
+
+    def payloads(self, packet_type, n=2000):
+        rng = np.random.default_rng(len(packet_type) + ord(packet_type[1]))
+        payloads = rng.integers(0, 256, (n, navexport.PAYLOAD_LENGTHS[packet_type]), dtype=np.uint8)
+        # every field at its most negative, -1 and most positive value
+        payloads[0] = 0x80
+        payloads[0, 1::2] = 0
+        payloads[1] = 0xff
+        payloads[2] = 0x7f
+        payloads[2, 1::2] = 0xff
+        return payloads
+
+    def test_n0(self):
+        self.check('N0', self.payloads('N0'))
+
+    def test_n1(self):
+        self.check('N1', self.payloads('N1'))
+
+if __name__ == "__main__":
+    unittest.main()
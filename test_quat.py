@@ -0,0 +1,68 @@
+"""
+quat tests, the batch integrate against update_quat one sample at a time
+Created on 2026-10-19
+"""
+
+"""
+python -m unittest test_quat
+"""
+
+import math
+import unittest
+import numpy as np
+import quat
+
+def update_quat_history(rates, dt, q):
+    '''update_quat once per sample, the quaternion after each
+    '''
+    state = quat.Quat()
+    state.q = list(q)
+    dts = np.broadcast_to(dt, (len(rates),))
+    history = []
+    for (wx, wy, wz), t in zip(rates.tolist(), dts.tolist()):
+        state.update_quat({ 'wx' : wx, 'wy' : wy, 'wz' : wz }, t)
+        history.append(list(state.q))
+    return np.array(history).reshape(-1, 4)
+
+class IntegrateTest(unittest.TestCase):
+    def test_matches_update_quat(self):
+        rng = np.random.default_rng(0)
+        n = 5 * quat.BLOCK + 17        # a partial last block
+        # rotation angles per sample from tiny to past both series branches of update_quat
+        rates = rng.normal(0, 1, (n, 3)) * np.repeat([0.01, 1.0, 20.0, 40.0, 100.0], -(-n // 5))[:n, None]
+        dt = rng.uniform(0.004, 0.006, n)
+        q = rng.normal(0, 1, 4)
+        q = q / np.linalg.norm(q) * np.sign(q[0])
+        expected = update_quat_history(rates, dt, q)
+        history = quat.integrate(rates, dt, q)
+        self.assertEqual(history.shape, (n, 4))
+        self.assertLess(np.abs(history - expected).max(), 1e-12)
+        self.assertTrue((history[:, 0] >= 0.0).all())
+
+    def test_scalar_dt_and_update_quats(self):
+        rng = np.random.default_rng(1)
+        rates = rng.normal(0, 2, (1000, 3))
+        state = quat.Quat()
+        first = state.update_quats(rates[:400], 0.01)
+        second = state.update_quats(rates[400:], 0.01)
+        expected = update_quat_history(rates, 0.01, [1.0, 0.0, 0.0, 0.0])
+        self.assertLess(np.abs(np.vstack([first, second]) - expected).max(), 1e-12)
+        self.assertLess(np.abs(np.array(state.q) - expected[-1]).max(), 1e-12)
+
+    def test_empty(self):
+        self.assertEqual(quat.integrate(np.zeros((0, 3)), 0.01).shape, (0, 4))
+
+    def test_past_180_degrees(self):
+        # 90 deg/s about z for 4 s: update_quat used to stop once the scalar part crossed zero at 180 deg
+        rate = math.radians(90.0)
+        rates = np.tile([0.0, 0.0, rate], (400, 1))
+        history = update_quat_history(rates, 0.01, [1.0, 0.0, 0.0, 0.0])
+        yaw = np.array([quat.to_euler(q)[2] for q in history.tolist()])
+        expected = (rate * 0.01 * np.arange(1, 401) + math.pi) % (2 * math.pi) - math.pi
+        difference = (yaw - expected + math.pi) % (2 * math.pi) - math.pi
+        self.assertLess(np.abs(difference).max(), 1e-9)
+        self.assertTrue((history[:, 0] >= 0.0).all())
+        self.assertLess(np.abs(quat.integrate(rates, 0.01) - history).max(), 1e-12)
+
+if __name__ == "__main__":
+    unittest.main()
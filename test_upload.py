@@ -0,0 +1,110 @@
+"""
+UploadQueue tests against MemoryBackend with injected failures
+Created on 2026-10-19
+"""
+
+"""
+python -m unittest test_upload
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+import upload
+
+class LostReplyBackend(upload.MemoryBackend):
+    def append(self, blob, block, offset):
+        '''Appends, then fails like a timed out request whose block did land
+        '''
+        upload.MemoryBackend.append(self, blob, block, offset)
+        if random.random() < 0.3:
+            raise IOError('injected lost reply')
+
+class DownBackend(upload.MemoryBackend):
+    def __init__(self, blocks):
+        '''Accepts blocks appends, then fails every append until up is set
+        '''
+        upload.MemoryBackend.__init__(self)
+        self.blocks = blocks
+        self.up = False
+
+    def append(self, blob, block, offset):
+        if not self.up:
+            if self.blocks == 0:
+                raise IOError('injected outage')
+            self.blocks -= 1
+        upload.MemoryBackend.append(self, blob, block, offset)
+
+class UploadQueueTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.directory = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.directory, '.uploads.json')
+        self.path = os.path.join(self.directory, 'log.csv')
+        self.content = os.urandom(64 * 1000 + 123)
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+        self.completed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_queue(self, backend, **kwargs):
+        queue = upload.UploadQueue(backend, self.state_path, block_size=1000, on_complete=lambda *args: self.completed.append(args),
+                                   backoff=0.0, **kwargs)
+        queue.start()
+        return queue
+
+    def wait(self, queue, timeout=10.0):
+        deadline = time.time() + timeout
+        while queue.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        queue.stop()
+
+    def test_injected_failures(self):
+        backend = upload.MemoryBackend(fail_rate=0.3)
+        queue = self.make_queue(backend, retries=20)
+        queue.submit(self.path, meta={ 'id' : 1 })
+        self.wait(queue)
+        self.assertEqual(bytes(backend.blobs['log.csv']), self.content)
+        self.assertEqual(self.completed, [(self.path, 'log.csv', { 'id' : 1 })])
+
+    def test_lost_replies(self):
+        backend = LostReplyBackend()
+        queue = self.make_queue(backend, retries=20)
+        queue.submit(self.path)
+        self.wait(queue)
+        self.assertEqual(bytes(backend.blobs['log.csv']), self.content)
+
+    def test_requeue_after_retries(self):
+        backend = DownBackend(10)
+        queue = self.make_queue(backend, retries=2, requeue_delay=0.05)
+        queue.submit(self.path)
+        time.sleep(0.3)
+        self.assertEqual(queue.pending(), 1)
+        self.assertEqual(len(backend.blobs['log.csv']), 10 * 1000)
+        backend.up = True
+        self.wait(queue)
+        self.assertEqual(queue.pending(), 0)
+        self.assertEqual(bytes(backend.blobs['log.csv']), self.content)
+
+    def test_resume_after_restart(self):
+        backend = DownBackend(20)
+        queue = self.make_queue(backend, retries=2, requeue_delay=60.0)
+        queue.submit(self.path)
+        queue.join()
+        queue.stop()
+        self.assertEqual(len(backend.blobs['log.csv']), 20 * 1000)
+        backend.up = True
+        # a new queue finds the job in the state file and carries on from the blob size
+        queue = self.make_queue(backend)
+        self.wait(queue)
+        self.assertEqual(bytes(backend.blobs['log.csv']), self.content)
+        self.assertEqual(len(self.completed), 1)
+        self.assertFalse(os.path.isfile(self.state_path) and '"log.csv"' in open(self.state_path).read())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+"""
+Background block uploader for log files
+Created on 2026-10-19
+"""
+
+"""
+UploadQueue     - background thread that appends files to append-only blob storage in fixed size blocks
+submit          - queue a file, may be called repeatedly on a growing file, final=True when it is complete
+
+Backends
+MemoryBackend           - in-process stand in used for tests and benchmarks
+AzureAppendBlobBackend  - Azure append blobs, azure SDK imported on first use, credentials from the
+                          AZURE_STORAGE_ACCOUNT and AZURE_STORAGE_KEY environment variables
+
+Progress is saved to a JSON state file after every block so pending uploads resume after a restart.
+Blobs are append only, so the backend's current blob size is used as the resume offset.  A failed
+append is retried with backoff, the blob size telling whether the failed attempt landed, and a job
+still failing after that is queued again after requeue_delay seconds, so uploads resume by
+themselves after an outage.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+BLOCK_SIZE = 4 * 1024 * 1024    # largest block accepted by an Azure append blob
+
+class MemoryBackend:
+    def __init__(self, fail_rate=0.0):
+        '''In-process append blob store.  fail_rate injects random append failures for testing retries
+        '''
+        self.blobs = {}
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+
+    def create(self, blob):
+        with self.lock:
+            self.blobs.setdefault(blob, bytearray())
+
+    def size(self, blob):
+        '''Returns current blob size or None if blob does not exist
+        '''
+        with self.lock:
+            if blob in self.blobs:
+                return len(self.blobs[blob])
+            return None
+
+    def append(self, blob, block, offset):
+        '''Appends block if blob is offset bytes long, otherwise raises like an append position condition
+        '''
+        if random.random() < self.fail_rate:
+            raise IOError('injected failure')
+        with self.lock:
+            if len(self.blobs[blob]) != offset:
+                raise IOError('append position mismatch')
+            self.blobs[blob] += block
+
+class AzureAppendBlobBackend:
+    def __init__(self, container='data', account_name=None, account_key=None):
+        '''account_name and account_key default to the AZURE_STORAGE_ACCOUNT and AZURE_STORAGE_KEY
+           environment variables, ValueError if neither gives them
+        '''
+        account_name = account_name or os.environ.get('AZURE_STORAGE_ACCOUNT')
+        account_key = account_key or os.environ.get('AZURE_STORAGE_KEY')
+        if not account_name or not account_key:
+            raise ValueError('no Azure storage credentials, set AZURE_STORAGE_ACCOUNT and AZURE_STORAGE_KEY')
+        from azure.storage.blob import AppendBlobService
+        from azure.storage.blob import ContentSettings
+        self.container = container
+        self.service = AppendBlobService(account_name=account_name, account_key=account_key, protocol='http')
+        self.content_settings = ContentSettings(content_type='text/plain')
+
+    def create(self, blob):
+        if not self.service.exists(self.container, blob):
+            self.service.create_blob(container_name=self.container, blob_name=blob, content_settings=self.content_settings)
+
+    def size(self, blob):
+        if not self.service.exists(self.container, blob):
+            return None
+        return self.service.get_blob_properties(self.container, blob).properties.content_length
+
+    def append(self, blob, block, offset):
+        # appendpos_condition makes a retried append fail instead of duplicating data
+        self.service.append_block(self.container, blob, block, appendpos_condition=offset)
+
+class UploadQueue:
+    def __init__(self, backend, state_path='data/.uploads.json', block_size=BLOCK_SIZE, on_complete=None,
+                 retries=6, backoff=1.0, max_backoff=60.0, requeue_delay=60.0):
+        '''Create queue, pending uploads found in state_path are queued again.
+           on_complete(path, blob, meta) is called from the upload thread when a final upload finishes
+        '''
+        self.backend = backend
+        self.state_path = state_path
+        self.block_size = block_size
+        self.on_complete = on_complete
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requeue_delay = requeue_delay
+        self.timers = set()         # threading.Timer of each failed job waiting to be queued again
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.queued = set()
+        self.state = {}
+        if os.path.isfile(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        for path in self.state:
+            self.queued.add(path)
+            self.queue.put(path)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, path, blob=None, final=True, meta=None):
+        '''Queue upload of path to blob, default blob is the file name.  Submitting the same path again
+           uploads whatever was appended since the previous pass
+        '''
+        with self.lock:
+            job = self.state.setdefault(path, { 'blob' : blob or os.path.basename(path), 'offset' : 0, 'final' : False, 'meta' : None })
+            job['final'] = job['final'] or final
+            if meta is not None:
+                job['meta'] = meta
+            self.save()
+            if path in self.queued:
+                return
+            self.queued.add(path)
+        self.queue.put(path)
+
+    def pending(self):
+        with self.lock:
+            return len(self.state)
+
+    def join(self):
+        '''Blocks until every queued pass has run
+        '''
+        self.queue.join()
+
+    def stop(self):
+        with self.lock:
+            timers = list(self.timers)
+            self.timers.clear()
+        for timer in timers:
+            timer.cancel()
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join()
+
+    def save(self):
+        '''Atomically replaces state file, lock must be held
+        '''
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def run(self):
+        while True:
+            path = self.queue.get()
+            if path is None:
+                self.queue.task_done()
+                return
+            with self.lock:
+                self.queued.discard(path)
+            try:
+                self.upload(path)
+            except Exception as err:
+                # the job stays in the state file, queued again after a delay
+                print('upload failed ' + path + ': ' + str(err) + ', again in {0:.0f}s'.format(self.requeue_delay))
+                self.requeue(path)
+            self.queue.task_done()
+
+    def requeue(self, path):
+        '''Queues path again after requeue_delay seconds unless it was submitted meanwhile
+        '''
+        def put():
+            with self.lock:
+                self.timers.discard(timer)
+                if path not in self.state or path in self.queued:
+                    return
+                self.queued.add(path)
+            self.queue.put(path)
+        timer = threading.Timer(self.requeue_delay, put)
+        timer.daemon = True
+        with self.lock:
+            self.timers.add(timer)
+        timer.start()
+
+    def upload(self, path):
+        '''Appends everything past the saved offset of path, one block in memory at a time
+        '''
+        with self.lock:
+            job = dict(self.state[path])
+        blob = job['blob']
+        offset = self.retry(self.prepare, blob)
+        with open(path, 'rb') as f:
+            while True:
+                f.seek(offset)
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                offset = self.retry(self.append, blob, block, offset, failed=True)
+                with self.lock:
+                    self.state[path]['offset'] = offset
+                    self.save()
+        with self.lock:
+            job = self.state[path]
+            if not job['final'] or offset < os.path.getsize(path):
+                return
+            del self.state[path]
+            self.save()
+        if self.on_complete is not None:
+            self.on_complete(path, blob, job['meta'])
+
+    def prepare(self, blob):
+        size = self.backend.size(blob)
+        if size is None:
+            self.backend.create(blob)
+            size = 0
+        return size
+
+    def append(self, blob, block, offset, failed=False):
+        '''Appends block.  When retrying after a failed attempt the stored blob size decides whether it
+           already landed, otherwise no size round trip is made
+        '''
+        if failed:
+            size = self.backend.size(blob)
+            if size == offset + len(block):
+                return size
+            if size != offset:
+                raise IOError('blob {0} is {1} bytes, expected {2}'.format(blob, size, offset))
+        self.backend.append(blob, block, offset)
+        return offset + len(block)
+
+    def retry(self, fn, *args, **retrying):
+        '''Calls fn(*args) with exponential backoff and jitter between attempts, attempts after a failure
+           with the retrying keyword arguments too
+        '''
+        for attempt in range(self.retries):
+            try:
+                return fn(*args, **(retrying if attempt else {}))
+            except Exception as err:
+                if attempt == self.retries - 1:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                print('upload retry in {0:.1f}s: {1}'.format(delay, err))
+                time.sleep(delay * (0.5 + random.random() / 2))